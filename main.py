@@ -29,6 +29,11 @@ if args.config:
 from src import config
 from src import logger
 from src import forwarder
+from src import liveness
+from src import strfix
+from src import timeseries
+from src import accounting
+from src import handoff
 from src.database import DatabaseManager
 from src.web import create_web_manager
 from src.ntrip import NTRIPCaster
@@ -65,7 +70,7 @@ NTRIP端口: {config.NTRIP_PORT:<8} Web管理端口: {config.WEB_PORT:<8}
     """
     print(banner)
 
-def check_environment():
+def check_environment(check_ports=True):
     """检查运行环境"""
     logger = logging.getLogger('main')
     
@@ -97,6 +102,11 @@ def check_environment():
             logger.error(f"{name}端口 {port} 已被占用")
             return False
     
+    if not check_ports:
+        # 平滑重启的新进程：端口仍由旧进程持有，监听socket由旧进程交接
+        logger.info("环境检查通过（平滑重启，跳过端口检查）")
+        return
+    
     ports_ok = True
     ports_ok &= check_port(config.NTRIP_PORT, "NTRIP")
     ports_ok &= check_port(config.WEB_PORT, "Web")
@@ -140,21 +150,46 @@ class ServiceManager:
             forwarder.start_forwarder()
             logger.log_system_event('数据转发器初始化完成')
             
+            # 启动挂载点存活巡检
+            liveness.start_monitor()
+            
+            # 启动挂载点时间序列采样
+            timeseries.start_recorder()
+            
+            # 启动用量计费写入线程
+            accounting.start_accounting()
+            
             # 3. RTCM解析现在集成在connection_manager中，无需单独启动
             logger.log_system_event('RTCM解析器集成完成')
             
-            # 4. 启动Web管理界面
-            self._start_web_interface()
+            # 平滑重启的新进程：从旧进程接收监听socket和在线连接
+            inherited = handoff.receive() if handoff.is_handoff_child() else None
+            
+            # 4. 启动Web管理界面（平滑重启时Web端口在旧进程退出后才能绑定）
+            if inherited is None:
+                self._start_web_interface()
             
             # 5. 启动NTRIP服务器（在单独线程中）
-            self.ntrip_caster = NTRIPCaster(self.db_manager)
+            self.ntrip_caster = NTRIPCaster(self.db_manager, inherited['listener'] if inherited else None)
             self.ntrip_thread = threading.Thread(target=self.ntrip_caster.start, daemon=True)
             self.ntrip_thread.start()
             time.sleep(1)  # 等待NTRIP服务器启动
             
+            if inherited is not None:
+                self.ntrip_caster.adopt(inherited['pending'], inherited['sessions'])
+                handoff.acknowledge(inherited)
+                if not handoff.wait_for_port(config.WEB_PORT):
+                    logger.log_warning(f'Web端口 {config.WEB_PORT} 仍被占用，继续等待旧进程退出')
+                    handoff.wait_for_port(config.WEB_PORT, config.HANDOFF_DRAIN_TIMEOUT + config.HANDOFF_TIMEOUT)
+                self._start_web_interface()
+            
             # 6. 注册信号处理
             signal.signal(signal.SIGINT, self._signal_handler)
             signal.signal(signal.SIGTERM, self._signal_handler)
+            if hasattr(signal, 'SIGUSR2'):
+                signal.signal(signal.SIGUSR2, self._restart_signal_handler)
+            if hasattr(signal, 'SIGHUP'):
+                signal.signal(signal.SIGHUP, self._reload_signal_handler)
             
             self.running = True
             logger.log_system_event(f'所有服务已启动 - NTRIP端口: {config.NTRIP_PORT}, Web端口: {config.WEB_PORT}')
@@ -248,6 +283,10 @@ class ServiceManager:
                 'network_bandwidth': network_bandwidth,
                 'ntrip_stats': ntrip_stats,
                 'conn_stats': conn_stats,
+                'liveness': liveness.get_liveness_stats(),
+                'str_fix': strfix.get_str_fix_stats(),
+                'timeseries': timeseries.get_timeseries_stats(),
+                'accounting': accounting.get_accounting_stats(),
                 'total_data_mb': total_data_mb
             }
             
@@ -293,7 +332,8 @@ class ServiceManager:
                     'users': stats.get('conn_stats', {}).get('users', {}),
                     'data_transfer': {
                         'total_bytes': stats.get('total_data_mb', 0) * 1024 * 1024
-                    }
+                    },
+                    'liveness': stats.get('liveness', {})
                 }
             return {}
         except Exception as e:
@@ -374,6 +414,32 @@ class ServiceManager:
         logger.log_system_event(f'收到信号 {signum}，开始关闭所有服务')
         self.stop_all_services()
     
+    def _restart_signal_handler(self, signum, frame):
+        """SIGUSR2：平滑重启"""
+        logger.log_system_event(f'收到信号 {signum}，开始平滑重启')
+        threading.Thread(target=self.graceful_restart, name='GracefulRestart', daemon=True).start()
+    
+    def _reload_signal_handler(self, signum, frame):
+        """SIGHUP：重新加载配置文件"""
+        threading.Thread(target=self.reload_config, args=('SIGHUP',), name='ConfigReload', daemon=True).start()
+    
+    def reload_config(self, source='api'):
+        """热加载配置文件，可热加载的配置项立即生效"""
+        success, message, result = config.reload_config(source)
+        if success:
+            logger.log_system_event(f'配置热加载完成: {message}')
+        else:
+            logger.log_error(f'配置热加载失败: {message}')
+        return success, message, result
+    
+    def graceful_restart(self):
+        """平滑重启：新进程接管所有连接后本进程退出；交接开始前失败时本进程继续运行"""
+        if not config.HANDOFF_ENABLED:
+            return False, '平滑重启未启用'
+        success, message = handoff.graceful_restart(self)
+        logger.log_error(f'平滑重启失败: {message}')
+        return success, message
+    
     def stop_all_services(self):
         """停止所有服务"""
         if self.stopping:
@@ -398,12 +464,21 @@ class ServiceManager:
                 except Exception as e:
                     logger.log_error(f'停止NTRIP服务器时出错: {e}')
         
+            # 停止存活巡检
+            liveness.stop_monitor()
+            
+            # 停止时间序列采样（持久化模式下刷新到文件）
+            timeseries.stop_recorder()
+            
             # 停止数据转发器
             try:
                 forwarder.stop_forwarder()
             except Exception as e:
                 logger.log_error(f'停止数据转发器时出错: {e}')
             
+            # 停止用量计费，写入最后一批会话记录
+            accounting.stop_accounting()
+            
             # 停止Web管理器
             if self.web_manager:
                 try:
@@ -438,7 +513,7 @@ def main():
         print_banner()
         
         # 检查环境
-        check_environment()
+        check_environment(check_ports=not handoff.is_handoff_child())
         
         # 初始化配置
         config.init_config()
@@ -17,6 +17,7 @@ from pyrtcm.exceptions import (
 from pyrtcm.rtcmhelpers import *
 from pyrtcm.rtcmmessage import RTCMMessage
 from pyrtcm.rtcmreader import RTCMReader
+from pyrtcm.rtcmscanner import RTCMFrame, scan_frames
 from pyrtcm.rtcmtypes_core import *
 from pyrtcm.rtcmtypes_get import *
 from pyrtcm.rtcmtypes_get_igs import *
@@ -13,6 +13,36 @@ from datetime import datetime, timedelta
 
 from pyrtcm.rtcmtypes_core import GNSSMAP, RTCM_DATA_FIELDS, SSR_SPHER_COEFFS
 
+try:
+    import numpy as _np
+except ImportError:  # pragma: no cover
+    _np = None
+
+CRC24Q_POLY = 0x1864CFB
+
+
+def _crc24q_table() -> tuple:
+    """
+    Build the 256-entry CRC24Q lookup table, one entry per
+    possible value of the top byte of the CRC register.
+
+    :return: table of 24-bit CRC values
+    :rtype: tuple
+    """
+
+    table = []
+    for i in range(256):
+        crc = i << 16
+        for _ in range(8):
+            crc <<= 1
+            if crc & 0x1000000:
+                crc ^= CRC24Q_POLY
+        table.append(crc & 0xFFFFFF)
+    return tuple(table)
+
+
+CRC24Q_TABLE = _crc24q_table()
+
 
 def att2idx(att: str) -> int:
     """
@@ -66,15 +96,52 @@ def calc_crc24q(message: bytes) -> int:
 
     """
 
-    poly = 0x1864CFB
+    table = CRC24Q_TABLE
     crc = 0
     for octet in message:
-        crc ^= octet << 16
-        for _ in range(8):
-            crc <<= 1
-            if crc & 0x1000000:
-                crc ^= poly
-    return crc & 0xFFFFFF
+        crc = ((crc << 8) & 0xFFFFFF) ^ table[(crc >> 16) ^ octet]
+    return crc
+
+
+def calc_crc24q_batch(messages: list, chunksize: int = 4096) -> list:
+    """
+    Perform CRC24Q cyclic redundancy check on many messages in one call,
+    e.g. when validating an archive or replaying a recorded stream.
+
+    If NumPy is available, messages are sorted by length, left-padded
+    with zeros (which do not alter a CRC24Q with zero initial value)
+    and processed a byte column at a time across each chunk. Otherwise
+    falls back to calc_crc24q for each message.
+
+    :param list messages: list of messages (bytes, bytearray or memoryview)
+    :param int chunksize: maximum number of messages processed together (4096)
+    :return: list of CRCs, or 0 for each valid message including its CRC
+    :rtype: list
+    """
+
+    if _np is None or len(messages) < 2:
+        return [calc_crc24q(message) for message in messages]
+
+    table = _np.array(CRC24Q_TABLE, dtype=_np.uint32)
+    lengths = _np.fromiter((len(m) for m in messages), dtype=_np.int64, count=len(messages))
+    order = _np.argsort(lengths, kind="stable")
+    crcs = _np.zeros(len(messages), dtype=_np.uint32)
+    for start in range(0, len(messages), chunksize):
+        idx = order[start : start + chunksize]
+        width = int(lengths[idx[-1]])
+        if width == 0:
+            continue
+        block = _np.zeros((len(idx), width), dtype=_np.uint8)
+        for row, i in enumerate(idx):
+            size = int(lengths[i])
+            if size:
+                block[row, width - size :] = _np.frombuffer(messages[i], dtype=_np.uint8)
+        block = _np.ascontiguousarray(block.T)
+        crc = _np.zeros(len(idx), dtype=_np.uint32)
+        for column in block:
+            crc = ((crc << 8) & 0xFFFFFF) ^ table[(crc >> 16) ^ column]
+        crcs[idx] = crc
+    return crcs.tolist()
 
 
 def crc2bytes(message: bytes) -> bytes:
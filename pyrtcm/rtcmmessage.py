@@ -35,16 +35,61 @@ from pyrtcm.rtcmtypes_get_igs import RTCM_PAYLOADS_GET_IGS
 from pyrtcm.rtcmtypes_get_msm import RTCM_PAYLOADS_GET_MSM
 
 BOOL = "B"
+# group index suffixes "_01", "_02" ... for lazily indexed attribute names
+SUFFIXES = tuple(f"_{i:02d}" for i in range(1000))
+# lazy mode: {id(group dict): (group dict, member layout)}, see _group_layout()
+_GROUP_LAYOUTS = {}
+
+
+def _group_layout(gdict: dict) -> tuple:
+    """
+    Get fixed layout of repeating group, if it has one.
+
+    A group has a fixed layout if all its members are single attributes
+    of fixed size which do not govern the layout of the rest of the
+    payload, so the offset of any member in any repeat can be calculated
+    directly.
+
+    :param dict gdict: group dictionary
+    :return: tuple of (((attribute name, relative offset), ...), group stride) or None
+    :rtype: tuple
+    """
+
+    entry = _GROUP_LAYOUTS.get(id(gdict))
+    if entry is None:
+        members = []
+        stride = 0
+        for anam, adef in gdict.items():
+            if (
+                isinstance(adef, tuple)  # nested or conditional group
+                or anam in SSR_COEFF
+                or anam in ("DF394", "DF395", "DF396")
+                or RTCM_DATA_FIELDS[anam][0] == STR
+            ):
+                members = None
+                break
+            members.append((anam, stride))
+            stride += RTCM_DATA_FIELDS[anam][1]
+        layout = None if members is None else (tuple(members), stride)
+        entry = _GROUP_LAYOUTS[id(gdict)] = (gdict, layout)
+    return entry[1]
 
 
 class RTCMMessage:
     """RTCM Message Class."""
 
-    def __init__(self, payload: bytes = None, labelmsm: int = 1):
+    def __init__(self, payload: bytes = None, labelmsm: int = 1, lazy: bool = False):
         """Constructor.
 
+        If lazy is True, the payload is not decoded on construction. On first
+        access to a payload attribute the payload definition is walked once
+        to record each attribute's bit offset, and individual attributes are
+        decoded (and cached) only when they are read. Attribute names and
+        values are the same as for an eagerly decoded message.
+
         :param bytes payload: message payload (mandatory)
         :param int labelmsm: MSM NSAT and NCELL attribute label (1 = RINEX, 2 = freq)
+        :param bool lazy: decode attributes on demand (False)
         :raises: RTCMMessageError
         """
 
@@ -60,10 +105,133 @@ class RTCMMessage:
         self._unknown = False
         self._satmap = None
         self._cellmap = None
-        self._do_attributes()
+        self._lazy = lazy
+        self._fields = None  # lazy mode: {attribute name: (name, bit offset, group index) or None if set}
+        self._groups = None  # lazy mode: {group attribute name: (bit offset, stride, group size)}
+        if not lazy:
+            self._do_attributes()
 
         self._immutable = True  # once initialised, object is immutable
 
+    def __getattr__(self, name):
+        """
+        Lazy mode: decode payload attribute on first access.
+
+        Only called if normal attribute lookup fails.
+
+        :param str name: attribute name
+        :return: attribute value
+        :rtype: object
+        :raises: AttributeError if message has no such attribute
+        """
+
+        if name[0] == "_" or not self.__dict__.get("_lazy"):
+            raise AttributeError(name)
+        if self._fields is None:
+            self._index_attributes()
+            if name in self.__dict__:  # decoded during the offset walk
+                return self.__dict__[name]
+        field = self._fields.get(name)
+        if field is not None:
+            val = self._decode_field(*field)
+            object.__setattr__(self, name, val)  # cache decoded value
+            return val
+        anam = self._group_field(name)
+        if anam is None:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            )
+        self._decode_group(anam)
+        return self.__dict__[name]
+
+    def _index_attributes(self):
+        """
+        Lazy mode: walk payload definition recording attribute offsets.
+
+        Attributes which govern the payload layout (group sizes, conditions,
+        MSM masks) are decoded as the walk reaches them.
+
+        :raises: RTCMTypeError
+        """
+
+        object.__setattr__(self, "_fields", {})
+        object.__setattr__(self, "_groups", {})
+        object.__setattr__(self, "_immutable", False)
+        try:
+            self._do_attributes()
+        finally:
+            object.__setattr__(self, "_immutable", True)
+
+    def _group_field(self, name: str) -> str:
+        """
+        Lazy mode: locate attribute in fixed layout repeating group.
+
+        :param str name: attribute name with group index suffix e.g. "DF405_03"
+        :return: attribute name without suffix e.g. "DF405", or None if not found
+        :rtype: str
+        """
+
+        anam, _, num = name.rpartition("_")
+        group = self._groups.get(anam)
+        if group is None or not num.isdigit():
+            return None
+        idx = int(num)
+        if not 0 < idx <= group[2] or name != f"{anam}_{idx:02d}":
+            return None
+        return anam
+
+    def _decode_group(self, anam: str):
+        """
+        Lazy mode: decode and cache all repeats of a fixed layout
+        repeating group attribute, e.g. DF405_01 to DF405_nn.
+
+        :param str anam: attribute name without group index suffix
+        """
+
+        offset, stride, gsiz = self._groups[anam]
+        atts = self.__dict__
+        for i in range(1, gsiz + 1):
+            atts[f"{anam}_{i:02d}"] = self._decode_field(anam, offset, i)
+            offset += stride
+
+    def _decode_field(self, anam: str, offset, idx: int) -> object:
+        """
+        Lazy mode: decode attribute value at recorded bit offset.
+
+        :param str anam: attribute name without group index suffix
+        :param offset: payload offset in bits (list of offsets for concatenated strings)
+        :param int idx: outermost group index (for PRN / cell attributes)
+        :return: attribute value
+        :rtype: object
+        """
+
+        atyp, asiz, ares, _ = RTCM_DATA_FIELDS[anam]
+        if atyp == PRN:
+            return self._satmap[idx]
+        if atyp == CELPRN:
+            return self._cellmap[idx][0]
+        if atyp == CELSIG:
+            return self._cellmap[idx][1]
+        if atyp == STR:
+            mask = (1 << asiz) - 1
+            chars = (self._payloadi >> (self._payblen - o - asiz) & mask for o in offset)
+            return "".join(chr(c) for c in chars if c)
+        bits = self._payloadi >> (self._payblen - offset - asiz) & ((1 << asiz) - 1)
+        msb = 1 << asiz - 1 if atyp in (INTS, INT) else 0
+        if atyp == INTS:  # int, MSB indicates sign
+            val = bits & msb - 1
+            if bits & msb:
+                val *= -1
+        elif atyp == CHA:
+            return chr(bits)
+        else:
+            val = bits
+        if atyp == INT and bits & msb:  # 2's compliment -ve int
+            val -= 1 << asiz
+        if ares not in (0, 1):  # apply any scaling factor
+            val *= ares
+        return val
+
     def _do_attributes(self):
         """
         Populate RTCMMessage attributes from payload.
@@ -171,6 +339,11 @@ class RTCMMessage:
             if anam == "IDF035":  # 4076_201 range is N-1
                 gsiz += 1
 
+        if self._fields is not None and not index:
+            layout = _group_layout(gdict)
+            if layout is not None:
+                return self._index_attribute_group(layout, offset, gsiz), index
+
         index.append(0)  # add a (nested) group index level
         # recursively process each group attribute,
         # incrementing the payload offset and index as we go
@@ -202,6 +375,9 @@ class RTCMMessage:
 
         # pylint: disable=invalid-name, line-too-long
 
+        if self._fields is not None and anam not in ("DF394", "DF395", "DF396"):
+            return self._index_attribute_single(anam, offset, index)
+
         # if attribute is part of a (nested) repeating group, suffix name with index
         anami = anam
         for i in index:  # one index for each nested level
@@ -262,18 +438,81 @@ class RTCMMessage:
 
         # set lengths of harmonic coefficient attributes for SSR messages
         if anam in SSR_COEFF:
-            base1, base2 = SSR_COEFF[anam]
-            i = index[0]
-            N = getattr(self, f"{base1}_{i:02d}") + 1
-            M = getattr(self, f"{base2}_{i:02d}") + 1
-            nc = int(((N + 1) * (N + 2) / 2) - ((N - M) * (N - M + 1) / 2))
-            ns = int(nc - (N + 1))
-            # ncs = (N + 1) * (N + 1) - (N - M) * (N - M + 1)
-            setattr(self, NHARMCOEFFC, nc)
-            setattr(self, NHARMCOEFFS, ns)
+            self._set_attribute_single_coeffs(anam, index)
 
         return offset
 
+    def _index_attribute_single(self, anam: str, offset: int, index: list) -> int:
+        """
+        Lazy mode: record attribute offset instead of decoding it.
+
+        :param str anam: attribute name
+        :param int offset: payload offset in bits
+        :param list index: repeating group index array
+        :return: offset
+        :rtype: int
+        """
+
+        fields = self._fields
+        atyp, asiz, _, _ = RTCM_DATA_FIELDS[anam]
+        if atyp == STR:  # concatenated string, one attribute for all characters
+            field = fields.get(anam)
+            if field is None:
+                fields[anam] = (anam, [offset], 0)
+            else:
+                field[1].append(offset)
+            return offset + asiz
+
+        anami = anam
+        for i in index:  # one index for each nested level
+            anami += SUFFIXES[i]
+        fields[anami] = (anam, offset, index[0] if index else 0)
+
+        # set lengths of harmonic coefficient attributes for SSR messages
+        if anam in SSR_COEFF:
+            self._set_attribute_single_coeffs(anam, index)
+
+        return offset + asiz
+
+    def _index_attribute_group(self, layout: tuple, offset: int, gsiz: int) -> int:
+        """
+        Lazy mode: record offsets of fixed layout repeating group
+        once for the whole group rather than once per attribute.
+
+        :param tuple layout: group layout from _group_layout()
+        :param int offset: payload offset in bits
+        :param int gsiz: number of repeats
+        :return: offset
+        :rtype: int
+        """
+
+        members, stride = layout
+        for anam, rel in members:
+            self._groups[anam] = (offset + rel, stride, gsiz)
+        # placeholder keeps the group's position in payload order, see _str_lazy()
+        self._fields[(offset, members)] = (members, gsiz)
+        return offset + stride * gsiz
+
+    def _set_attribute_single_coeffs(self, anam: str, index: list):
+        """
+        Set lengths of harmonic coefficient attributes for SSR messages.
+
+        :param str anam: attribute name
+        :param list index: repeating group index array
+        """
+
+        # pylint: disable=invalid-name
+
+        base1, base2 = SSR_COEFF[anam]
+        i = index[0]
+        N = getattr(self, f"{base1}_{i:02d}") + 1
+        M = getattr(self, f"{base2}_{i:02d}") + 1
+        nc = int(((N + 1) * (N + 2) / 2) - ((N - M) * (N - M + 1) / 2))
+        ns = int(nc - (N + 1))
+        # ncs = (N + 1) * (N + 1) - (N - M) * (N - M + 1)
+        setattr(self, NHARMCOEFFC, nc)
+        setattr(self, NHARMCOEFFS, ns)
+
     def _getsatcellmaps(self):
         """
         Map group indices to satellite PRN & signal ID values via
@@ -340,6 +579,9 @@ class RTCMMessage:
         :rtype: str
         """
 
+        if self._lazy:
+            return self._str_lazy()
+
         stg = f"<RTCM({self.identity}, "
         for i, att in enumerate(self.__dict__):
             if att[0] != "_":  # only show public attributes
@@ -356,6 +598,35 @@ class RTCMMessage:
 
         return stg
 
+    def _str_lazy(self) -> str:
+        """
+        Human readable representation of lazily decoded message,
+        decoding all attributes in payload order.
+
+        :return: human readable representation
+        :rtype: str
+        """
+
+        if self._fields is None:
+            self._index_attributes()
+        names = []
+        for att, field in self._fields.items():
+            if isinstance(att, tuple):  # fixed layout repeating group
+                members, gsiz = field
+                for i in range(1, gsiz + 1):
+                    names.extend(f"{anam}_{i:02d}" for anam, _ in members)
+            else:
+                names.append(att)
+        atts = []
+        for att in names:
+            val = getattr(self, att)
+            if isinstance(val, bytes):  # pragma: no cover
+                val = escapeall(val)
+            atts.append(f"{att}={val}")
+        if self._unknown:
+            atts.append("Not_Yet_Implemented")
+        return f"<RTCM({self.identity}, " + ", ".join(atts) + ")>"
+
     def __repr__(self) -> str:
         """
         Machine readable representation.
@@ -382,6 +653,10 @@ class RTCMMessage:
                 f"Object is immutable. Updates to {name} not permitted after initialisation."
             )
 
+        # lazy mode: attributes decoded during the offset walk keep their payload order
+        fields = self.__dict__.get("_fields")
+        if fields is not None and name[0] != "_":
+            fields.setdefault(name, None)
         super().__setattr__(name, value)
 
     def serialize(self) -> bytes:
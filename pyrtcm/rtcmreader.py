@@ -59,6 +59,7 @@ class RTCMReader:
         parsed: bool = True,
         errorhandler: object = None,
         encoding: int = ENCODE_NONE,
+        lazy: bool = False,
     ):  # pylint: disable=too-many-arguments
         """Constructor.
 
@@ -73,6 +74,7 @@ class RTCMReader:
         :param object errorhandler: error handling object or function (None)
         :param int encoding: encoding for socket stream \
             (0 = none, 1 = chunk, 2 = gzip, 4 = compress, 8 = deflate (can be OR'd)) (0)
+        :param bool lazy: decode message attributes on first access (False)
         :raises: RTCMStreamError (if mode is invalid)
         """
 
@@ -85,6 +87,7 @@ class RTCMReader:
         self._validate = validate
         self._labelmsm = labelmsm
         self._parsed = parsed
+        self._lazy = lazy
         self._logger = getLogger(__name__)
 
     def __iter__(self):
@@ -174,6 +177,7 @@ class RTCMReader:
                 raw_data,
                 validate=self._validate,
                 labelmsm=self._labelmsm,
+                lazy=self._lazy,
             )
         else:
             parsed_data = None
@@ -240,6 +244,7 @@ class RTCMReader:
         message: bytes,
         validate: int = VALCKSUM,
         labelmsm: int = 1,
+        lazy: bool = False,
     ) -> RTCMMessage:
         """
         Parse RTCM message to RTCMMessage object.
@@ -247,6 +252,7 @@ class RTCMReader:
         :param bytes message: RTCM raw message bytes
         :param int validate: 0 = don't validate CRC, 1 = validate CRC (1)
         :param int labelmsm: MSM NSAT and NCELL attribute label (1 = RINEX, 2 = freq)
+        :param bool lazy: decode message attributes on first access (False)
         :return: RTCMMessage object
         :rtype: RTCMMessage
         :raises: RTCMParseError (if data stream contains invalid data or unknown message type)
@@ -258,4 +264,4 @@ class RTCMReader:
                     f"RTCM3 message invalid - failed CRC: {message[-3:]}"
                 )
         payload = message[3:-3]
-        return RTCMMessage(payload=payload, labelmsm=labelmsm)
+        return RTCMMessage(payload=payload, labelmsm=labelmsm, lazy=lazy)
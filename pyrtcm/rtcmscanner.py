@@ -0,0 +1,196 @@
+"""
+RTCM3 frame scanner.
+
+Walks a buffer of RTCM3 transport frames and yields lightweight
+frame descriptors taken from the frame header and the first few
+payload bytes, without constructing RTCMMessage objects:
+
++--------+--------+---------+---------+------------+-------+---------+
+|  0xd3  | 000000 | length  |  type   | station id | epoch |   crc   |
++========+========+=========+=========+============+=======+=========+
+| 8 bits | 6 bits | 10 bits | 12 bits |  12 bits   |  ...  | 24 bits |
++--------+--------+---------+---------+------------+-------+---------+
+
+Station ID is reported for message types which carry DF003 directly
+after the message number; epoch time and the multiple message
+(synchronous GNSS) flag are reported for MSM and legacy observation
+messages. Garbage between frames is skipped by searching for the next
+preamble byte.
+
+Created on 19 Oct 2026
+
+:license: BSD 3-Clause
+"""
+
+from typing import Iterator, NamedTuple, Optional
+
+from pyrtcm.rtcmhelpers import calc_crc24q
+
+RTCM3_PREAMBLE = 0xD3
+RTCM3_HEADER = 3  # preamble, reserved bits and 10-bit payload length
+RTCM3_OVERHEAD = 6  # header + 24-bit CRC
+
+# message types carrying DF003 reference station ID after the message number
+STATION_MSGS = frozenset(
+    list(range(1001, 1014))
+    + [1029, 1033, 1230]
+    + list(range(1071, 1138))
+)
+# message types with a 30-bit epoch (DF004 / DF248 / DF427 etc. or DF416 + DF034)
+# at bit 24 followed by the multiple message bit at bit 54
+EPOCH30_MSGS = frozenset([1001, 1002, 1003, 1004] + list(range(1071, 1138)))
+# GLONASS legacy observations: 27-bit DF034 epoch at bit 24, sync flag at bit 51
+EPOCH27_MSGS = frozenset([1009, 1010, 1011, 1012])
+
+
+class RTCMFrame(NamedTuple):
+    """
+    RTCM3 frame descriptor.
+
+    For an incomplete (partial) frame at the end of the buffer, only
+    offset is guaranteed; fields which lie beyond the end of the
+    buffer are None.
+    """
+
+    offset: int  # offset of 0xd3 preamble in buffer
+    length: Optional[int]  # payload length in bytes (excluding header and CRC)
+    msgtype: Optional[int]  # message number (DF002)
+    station: Optional[int]  # reference station ID (DF003), if message type carries one
+    epoch: Optional[int]  # raw epoch time field, if MSM or legacy observation message
+    multiple: Optional[int]  # multiple message / synchronous GNSS flag, if present
+    complete: bool  # whether the whole frame including CRC is in the buffer
+
+    @property
+    def size(self) -> Optional[int]:
+        """
+        Total frame size including header and CRC.
+
+        :return: size in bytes, or None if length is unknown
+        :rtype: int
+        """
+
+        return None if self.length is None else self.length + RTCM3_OVERHEAD
+
+    @property
+    def end(self) -> Optional[int]:
+        """
+        Offset in buffer just past the end of the frame.
+
+        :return: offset, or None if length is unknown
+        :rtype: int
+        """
+
+        return None if self.length is None else self.offset + self.length + RTCM3_OVERHEAD
+
+
+def _header_fields(buf, pos: int, length: int, available: int) -> tuple:
+    """
+    Decode header fields from frame payload.
+
+    :param buf: buffer
+    :param int pos: offset of payload in buffer
+    :param int length: payload length
+    :param int available: number of payload bytes present in buffer
+    :return: tuple of (msgtype, station, epoch, multiple)
+    :rtype: tuple
+    """
+
+    if length < 2 or available < 2:
+        return None, None, None, None
+    msgtype = (buf[pos] << 4) | (buf[pos + 1] >> 4)
+    station = epoch = multiple = None
+    if msgtype in STATION_MSGS and length >= 3 and available >= 3:
+        station = ((buf[pos + 1] & 0x0F) << 8) | buf[pos + 2]
+        if length >= 7 and available >= 7:
+            if msgtype in EPOCH30_MSGS:
+                word = int.from_bytes(buf[pos + 3 : pos + 7], "big")
+                epoch = word >> 2
+                multiple = (word >> 1) & 1
+            elif msgtype in EPOCH27_MSGS:
+                word = int.from_bytes(buf[pos + 3 : pos + 7], "big")
+                epoch = word >> 5
+                multiple = (word >> 4) & 1
+    return msgtype, station, epoch, multiple
+
+
+def scan_frames(
+    buffer, start: int = 0, end: Optional[int] = None, validate: bool = False
+) -> Iterator[RTCMFrame]:
+    """
+    Scan buffer for RTCM3 frames and yield frame descriptors.
+
+    Bytes which are not part of a frame are skipped. If the buffer
+    ends part way through a frame, a final descriptor with
+    complete=False is yielded for it, so that a streaming caller
+    can keep buffer[frame.offset:] and scan again when more data
+    arrives.
+
+    :param buffer: bytes, bytearray or memoryview
+    :param int start: offset at which to start scanning (0)
+    :param int end: offset at which to stop scanning (None = end of buffer)
+    :param bool validate: if True, frames failing CRC24Q are skipped (False)
+    :return: iterator of RTCMFrame
+    :rtype: iterator
+    """
+
+    if isinstance(buffer, memoryview):
+        # memoryview has no find(); offsets are unchanged by the copy
+        buffer = buffer.tobytes()
+    if end is None:
+        end = len(buffer)
+    find = buffer.find
+    from_bytes = int.from_bytes
+    station_msgs = STATION_MSGS
+    epoch30_msgs = EPOCH30_MSGS
+    new = tuple.__new__  # skips NamedTuple.__new__ argument handling
+    frame = RTCMFrame
+    pos = start
+    while pos < end:
+        offset = find(b"\xd3", pos, end)
+        if offset < 0:
+            return
+        if offset + 1 < end and buffer[offset + 1] & 0xFC:
+            # reserved bits set, not a frame
+            pos = offset + 1
+            continue
+        if offset + RTCM3_HEADER > end:
+            yield frame(offset, None, None, None, None, None, False)
+            return
+        length = ((buffer[offset + 1] & 0x03) << 8) | buffer[offset + 2]
+        frame_end = offset + length + RTCM3_OVERHEAD
+        if frame_end > end:
+            yield frame(
+                offset,
+                length,
+                *_header_fields(buffer, offset + RTCM3_HEADER, length, end - offset - RTCM3_HEADER),
+                False,
+            )
+            return
+        if validate and calc_crc24q(buffer[offset:frame_end]):
+            pos = offset + 1
+            continue
+        pos = frame_end
+        # inline fast path for the common message types, see _header_fields
+        if length >= 7:
+            msgtype = (buffer[offset + 3] << 4) | (buffer[offset + 4] >> 4)
+            if msgtype in epoch30_msgs:
+                word = from_bytes(buffer[offset + 6 : offset + 10], "big")
+                yield new(
+                    frame,
+                    (
+                        offset,
+                        length,
+                        msgtype,
+                        ((buffer[offset + 4] & 0x0F) << 8) | buffer[offset + 5],
+                        word >> 2,
+                        (word >> 1) & 1,
+                        True,
+                    ),
+                )
+                continue
+            if msgtype not in station_msgs:
+                yield new(frame, (offset, length, msgtype, None, None, None, True))
+                continue
+        yield frame(
+            offset, length, *_header_fields(buffer, offset + RTCM3_HEADER, length, length), True
+        )
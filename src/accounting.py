@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+accounting.py - 用量计费模块
+功能：记录流动站会话（用户、挂载点、连接和断开时间、发送字节数）以及按小时、用户、挂载点汇总的用量。
+      连接管理器在登记、切换和移除会话时通知本模块，只更新内存中的累计值；后台线程每隔
+      ACCOUNTING_FLUSH_INTERVAL秒读取在线会话的发送字节数求差，把会话记录和小时汇总在一个事务中
+      批量写入数据库。广播线程的发送路径上没有任何数据库写入。
+      进程崩溃时最多丢失一个写入间隔的用量，下次启动时未断开的会话按最后写入时间记为断开。
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from . import config
+from . import connection
+from . import database
+from .logger import log_debug, log_info, log_warning, log_error
+
+HOUR = 3600
+# 报表的分组方式: 时间格式，None表示整个区间合计
+REPORT_GROUPS = {
+    'hour': '%Y-%m-%d %H:00',
+    'day': '%Y-%m-%d',
+    'month': '%Y-%m',
+    'total': None,
+}
+
+
+class _Tracked:
+    """在线会话已计入小时汇总的位置"""
+
+    __slots__ = ('bytes_sent', 'accounted_at', 'counted')
+
+    def __init__(self, bytes_sent, accounted_at):
+        self.bytes_sent = bytes_sent
+        self.accounted_at = accounted_at
+        self.counted = False  # 会话数是否已计入连接所在小时
+
+
+class UsageAccountant:
+    """内存汇总 + 后台批量写入（write-behind）
+
+    tracked记录每个在线会话已计入汇总的字节数和时间，buckets是尚未写入的小时汇总
+    {(小时起点, 用户名, 挂载点): [字节数, 在线秒数, 新会话数]}，closed是尚未写入的已断开会话记录。
+    写入失败时汇总和断开记录并回内存，下次重试；在线会话的记录每次都整体重写，不需要保留。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.tracked = {}  # {连接ID: _Tracked}
+        self.buckets = {}
+        self.closed = deque()
+        self.interval = config.ACCOUNTING_FLUSH_INTERVAL
+        self.max_pending = config.ACCOUNTING_MAX_PENDING
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.stats = {
+            'flushes': 0,
+            'errors': 0,
+            'dropped': 0,
+            'sessions_written': 0,
+            'buckets_written': 0,
+            'last_flush_ms': 0.0,
+            'last_flush_time': None,
+        }
+
+    # ---------- 连接管理器回调（只更新内存） ----------
+
+    def session_opened(self, session):
+        """登记新会话"""
+        if not config.ACCOUNTING_ENABLED:
+            return
+        with self.lock:
+            self.tracked[session.connection_id] = _Tracked(session.bytes_sent, session.connected_at)
+
+    def session_resumed(self, session):
+        """平滑重启接管的会话：旧进程已计入交接前的用量和会话数，从恢复后的累计值继续计"""
+        with self.lock:
+            entry = self.tracked.get(session.connection_id)
+            if entry is not None:
+                entry.bytes_sent = session.bytes_sent
+                entry.accounted_at = time.time()
+                entry.counted = True
+
+    def session_moved(self, session):
+        """会话切换挂载点前调用，把之前的用量记到原挂载点"""
+        with self.lock:
+            entry = self.tracked.get(session.connection_id)
+            if entry is not None:
+                self._accrue(session, entry, time.time())
+
+    def session_closed(self, session):
+        """会话断开：计入最后一段用量，生成会话记录等待写入"""
+        now = time.time()
+        with self.lock:
+            # 未登记或已由stop()结束的会话不重复记录
+            entry = self.tracked.pop(session.connection_id, None)
+            if entry is None:
+                return
+            self._accrue(session, entry, now)
+            if len(self.closed) >= self.max_pending:
+                self.closed.popleft()
+                self.stats['dropped'] += 1
+            self.closed.append(_session_record(session, now, now))
+
+    # ---------- 汇总 ----------
+
+    def _bucket(self, hour, session):
+        key = (hour, session.user, session.mount)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [0, 0.0, 0]
+        return bucket
+
+    def _accrue(self, session, entry, now):
+        """把entry之后的发送字节数和在线时长计入小时汇总，跨小时的时长按比例拆分字节数（调用方持有lock）"""
+        if not entry.counted:
+            self._bucket(int(session.connected_at // HOUR * HOUR), session)[2] += 1
+            entry.counted = True
+        total_bytes = session.bytes_sent - entry.bytes_sent
+        start = entry.accounted_at
+        entry.bytes_sent = session.bytes_sent
+        entry.accounted_at = max(now, start)
+        if now <= start:
+            if total_bytes:
+                self._bucket(int(now // HOUR * HOUR), session)[0] += total_bytes
+            return
+        remaining = total_bytes
+        hour = int(start // HOUR * HOUR)
+        while hour < now:
+            segment_end = min(hour + HOUR, now)
+            seconds = segment_end - max(start, hour)
+            part = remaining if segment_end >= now else int(total_bytes * seconds / (now - start))
+            remaining -= part
+            bucket = self._bucket(hour, session)
+            bucket[0] += part
+            bucket[1] += seconds
+            hour += HOUR
+
+    def _collect(self):
+        """取出待写入的会话记录和小时汇总，在线会话先计入截至当前的用量"""
+        manager = connection.get_connection_manager()
+        now = time.time()
+        with self.lock:
+            sessions = []
+            for connection_id, entry in self.tracked.items():
+                session = manager.get_session(connection_id)
+                if session is None:
+                    continue
+                self._accrue(session, entry, now)
+                sessions.append(_session_record(session, None, now))
+            closed = list(self.closed)
+            self.closed.clear()
+            buckets = self.buckets
+            self.buckets = {}
+        return sessions, closed, buckets
+
+    def _restore(self, closed, buckets):
+        """写入失败：断开记录和汇总并回内存"""
+        with self.lock:
+            self.closed.extendleft(reversed(closed))
+            while len(self.closed) > self.max_pending:
+                self.closed.popleft()
+                self.stats['dropped'] += 1
+            for key, (bytes_sent, seconds, sessions) in buckets.items():
+                bucket = self.buckets.setdefault(key, [0, 0.0, 0])
+                bucket[0] += bytes_sent
+                bucket[1] += seconds
+                bucket[2] += sessions
+
+    def flush(self):
+        """写入一批用量，返回(是否成功, 消息)"""
+        if not config.ACCOUNTING_ENABLED:
+            return False, "用量计费未启用"
+        with self.flush_lock:
+            start = time.perf_counter()
+            sessions, closed, buckets = self._collect()
+            # 在线会话记录在前，同一会话刚断开时由断开记录覆盖
+            records = sessions + closed
+            hourly = [key + tuple(values) for key, values in buckets.items()]
+            if not records and not hourly:
+                return True, "没有待写入的用量"
+            try:
+                database.write_usage_batch(records, hourly)
+            except Exception as e:
+                self._restore(closed, buckets)
+                self.stats['errors'] += 1
+                log_error(f"写入用量记录失败，{len(closed)} 条断开记录和 {len(hourly)} 条汇总保留到下次写入: {e}")
+                return False, str(e)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.stats['flushes'] += 1
+            self.stats['sessions_written'] += len(records)
+            self.stats['buckets_written'] += len(hourly)
+            self.stats['last_flush_ms'] = round(elapsed_ms, 3)
+            self.stats['last_flush_time'] = time.time()
+            log_debug(f"用量写入: {len(records)} 条会话记录, {len(hourly)} 条小时汇总, 耗时 {elapsed_ms:.2f} ms")
+            return True, f"已写入 {len(records)} 条会话记录和 {len(hourly)} 条小时汇总"
+
+    # ---------- 后台线程 ----------
+
+    def start(self):
+        if not config.ACCOUNTING_ENABLED or (self.thread and self.thread.is_alive()):
+            return
+        # 平滑重启的新进程不整理：未结束的会话仍由旧进程持有，随后交接过来继续计费；
+        # 交接中途丢失的会话留到下一次冷启动时整理
+        from . import handoff
+        if not handoff.is_handoff_child():
+            try:
+                stale = database.close_stale_usage_sessions()
+                if stale:
+                    log_warning(f"上次运行有 {stale} 个会话未正常结束，已按最后写入时间记为断开")
+            except Exception as e:
+                log_error(f"整理未结束的用量会话失败: {e}")
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name='UsageAccounting', daemon=True)
+        self.thread.start()
+        log_info(f"用量计费已启动，写入间隔 {self.interval} 秒")
+
+    def stop(self):
+        """停止后台线程，仍在线的会话按当前时间记为断开后写入最后一批"""
+        self.stop_event.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=5)
+        if not config.ACCOUNTING_ENABLED:
+            return
+        manager = connection.get_connection_manager()
+        with self.lock:
+            connection_ids = list(self.tracked)
+        for connection_id in connection_ids:
+            session = manager.get_session(connection_id)
+            if session is not None:
+                self.session_closed(session)
+        self.flush()
+
+    def apply_config_changes(self, changed):
+        """配置热加载：下一次写入起使用新的间隔和上限"""
+        if 'ACCOUNTING_FLUSH_INTERVAL' in changed:
+            self.interval = config.ACCOUNTING_FLUSH_INTERVAL
+        if 'ACCOUNTING_MAX_PENDING' in changed:
+            self.max_pending = config.ACCOUNTING_MAX_PENDING
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                log_error(f"用量写入线程异常: {e}", exc_info=True)
+
+    # ---------- 查询 ----------
+
+    def get_usage(self, username=None, mount=None, start=None, end=None, group='day'):
+        """按用户、挂载点和时间段汇总用量，group为hour/day/month/total"""
+        if group not in REPORT_GROUPS:
+            raise ValueError(f"不支持的分组方式: {group}")
+        self.flush()
+        time_format = REPORT_GROUPS[group]
+        report = {}
+        for hour, user, mount_name, bytes_sent, seconds, sessions in database.query_usage_hourly(username, mount,
+                                                                                                start, end):
+            period = datetime.fromtimestamp(hour).strftime(time_format) if time_format else None
+            key = (period, user, mount_name)
+            item = report.get(key)
+            if item is None:
+                item = report[key] = {'period': period, 'username': user, 'mount': mount_name,
+                                      'bytes_sent': 0, 'seconds': 0.0, 'sessions': 0}
+            item['bytes_sent'] += bytes_sent
+            item['seconds'] += seconds
+            item['sessions'] += sessions
+        for item in report.values():
+            item['seconds'] = round(item['seconds'], 1)
+        return list(report.values())
+
+    def get_sessions(self, username=None, mount=None, start=None, end=None, limit=1000):
+        """查询会话记录，在线会话的断开时间为None"""
+        self.flush()
+        return [{
+            'username': user,
+            'mount': mount_name,
+            'ip': ip,
+            'port': port,
+            'connect_time': connect_time,
+            'disconnect_time': disconnect_time,
+            'duration': round((disconnect_time or last_update) - connect_time, 1),
+            'bytes_sent': bytes_sent,
+        } for user, mount_name, ip, port, connect_time, disconnect_time, last_update, bytes_sent
+            in database.query_usage_sessions(username, mount, start, end, limit)]
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['tracked'] = len(self.tracked)
+            stats['pending_closed'] = len(self.closed)
+            stats['pending_buckets'] = len(self.buckets)
+        stats['enabled'] = config.ACCOUNTING_ENABLED
+        stats['interval'] = self.interval
+        return stats
+
+
+def _session_record(session, disconnect_time, now):
+    return (session.user, session.mount, session.addr[0], session.addr[1], session.connected_at,
+            disconnect_time, now, session.bytes_sent)
+
+
+_accountant = UsageAccountant()
+config.subscribe(_accountant.apply_config_changes)
+
+
+def session_opened(session):
+    _accountant.session_opened(session)
+
+
+def session_resumed(session):
+    _accountant.session_resumed(session)
+
+
+def session_moved(session):
+    _accountant.session_moved(session)
+
+
+def session_closed(session):
+    _accountant.session_closed(session)
+
+
+def start_accounting():
+    """启动用量写入线程"""
+    _accountant.start()
+
+
+def stop_accounting():
+    """停止用量写入线程并写入最后一批"""
+    _accountant.stop()
+
+
+def flush():
+    """立即写入一批用量（平滑重启交接后由旧进程调用）"""
+    return _accountant.flush()
+
+
+def get_usage(username=None, mount=None, start=None, end=None, group='day'):
+    """用量报表"""
+    return _accountant.get_usage(username, mount, start, end, group)
+
+
+def get_usage_sessions(username=None, mount=None, start=None, end=None, limit=1000):
+    """会话记录"""
+    return _accountant.get_sessions(username, mount, start, end, limit)
+
+
+def get_accounting_stats():
+    """获取用量写入统计"""
+    return _accountant.get_stats()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+admission.py - 连接准入控制模块
+功能：在accept之后、进入连接队列之前做准入判断：CIDR黑白名单（基数树最长前缀匹配）、
+      按IP的令牌桶连接速率限制和并发连接上限；认证成功过的IP进入优先通道。
+      所有拒绝均按原因计数，拒绝路径只做字典查找和常数次运算
+"""
+
+import ipaddress
+import socket
+import struct
+import threading
+import time
+
+from . import config
+from . import timerwheel
+from .logger import log_debug, log_warning
+
+# 准入结果
+ADMIT = 'admit'
+ADMIT_PRIORITY = 'priority'
+
+# 拒绝原因
+REJECT_DENY = 'deny'
+REJECT_RATE = 'rate'
+REJECT_PER_IP = 'per_ip'
+REJECT_CAPACITY = 'capacity'
+REJECT_QUEUE_FULL = 'queue_full'
+
+# 空闲IP状态的清理间隔（秒）
+PRUNE_INTERVAL = 60
+
+
+class CIDRTrie:
+    """CIDR前缀基数树（按位二叉树），最长前缀匹配
+
+    节点为 [0分支, 1分支, 值]，IPv4与IPv6各一棵树。
+    """
+
+    def __init__(self):
+        self.roots = {4: [None, None, None], 6: [None, None, None]}
+        self.size = 0
+
+    def insert(self, cidr, value):
+        network = ipaddress.ip_network(cidr.strip(), strict=False)
+        bits = network.max_prefixlen
+        address = int(network.network_address)
+        node = self.roots[network.version]
+        for i in range(network.prefixlen):
+            bit = (address >> (bits - 1 - i)) & 1
+            child = node[bit]
+            if child is None:
+                child = node[bit] = [None, None, None]
+            node = child
+        node[2] = value
+        self.size += 1
+
+    def lookup(self, address):
+        """返回最长匹配前缀的值，没有匹配时返回None"""
+        node = self.roots[address.version]
+        bits = address.max_prefixlen
+        address_int = int(address)
+        value = node[2]
+        for i in range(bits):
+            node = node[(address_int >> (bits - 1 - i)) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                value = node[2]
+        return value
+
+
+class _IPState:
+    """单个IP的准入状态：令牌桶和当前并发连接数"""
+
+    __slots__ = ('tokens', 'updated', 'active')
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.updated = now
+        self.active = 0
+
+
+def _parse_list(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+class AdmissionController:
+    """连接准入控制器
+
+    判断顺序: 黑白名单 -> 全局容量（为优先通道预留名额） -> 单IP并发上限 -> 单IP令牌桶。
+    白名单IP和认证成功过的IP走优先通道：不受速率和单IP并发限制，可使用预留名额。
+    准入控制关闭时只保留全局容量检查（MAX_CONNECTIONS和连接队列大小）。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ips = {}  # {ip: _IPState}
+        self.trusted = {}  # {ip: 过期时间}
+        self.trie = CIDRTrie()
+        self.active_total = 0
+        self.prune_timer = None
+        self.stats = {
+            'admitted': 0,
+            'priority': 0,
+            'rejected': {reason: 0 for reason in (REJECT_DENY, REJECT_RATE, REJECT_PER_IP, REJECT_CAPACITY, REJECT_QUEUE_FULL)},
+        }
+        self.load_rules()
+
+    def load_rules(self):
+        """从配置加载CIDR黑白名单"""
+        trie = CIDRTrie()
+        for value, entries in (('deny', config.ADMISSION_DENY), ('allow', config.ADMISSION_ALLOW)):
+            for cidr in _parse_list(entries):
+                try:
+                    trie.insert(cidr, value)
+                except ValueError as e:
+                    log_warning(f"忽略无效的CIDR规则 {cidr}: {e}")
+        self.trie = trie
+        log_debug(f"准入规则已加载: {trie.size} 条CIDR")
+
+    def admit(self, ip, queue_size=0):
+        """判断是否接受来自ip的新连接
+
+        Returns:
+            tuple: (结果, 拒绝原因)，结果为ADMIT/ADMIT_PRIORITY或None
+        """
+        enabled = config.ADMISSION_ENABLED
+        rule = None
+        if enabled and self.trie.size:
+            try:
+                rule = self.trie.lookup(ipaddress.ip_address(ip))
+            except ValueError:
+                rule = None
+            if rule == 'deny':
+                return self._reject(REJECT_DENY)
+
+        now = time.monotonic()
+        with self.lock:
+            priority = enabled and (rule == 'allow' or self._is_trusted(ip))
+            reserve = config.ADMISSION_PRIORITY_RESERVE if enabled and not priority else 0
+            if self.active_total >= config.MAX_CONNECTIONS - reserve:
+                return self._reject_locked(REJECT_CAPACITY)
+            if queue_size >= config.CONNECTION_QUEUE_SIZE - reserve:
+                return self._reject_locked(REJECT_QUEUE_FULL)
+
+            state = self._state(ip, now)
+            if enabled and not priority:
+                if config.MAX_CONNECTIONS_PER_IP > 0 and state.active >= config.MAX_CONNECTIONS_PER_IP:
+                    return self._reject_locked(REJECT_PER_IP)
+                if config.IP_CONNECT_RATE > 0:
+                    burst = max(config.IP_CONNECT_BURST, 1)
+                    state.tokens = min(burst, state.tokens + (now - state.updated) * config.IP_CONNECT_RATE)
+                    state.updated = now
+                    if state.tokens < 1.0:
+                        return self._reject_locked(REJECT_RATE)
+                    state.tokens -= 1.0
+
+            state.active += 1
+            self.active_total += 1
+            if priority:
+                self.stats['priority'] += 1
+                return ADMIT_PRIORITY, None
+            self.stats['admitted'] += 1
+            return ADMIT, None
+
+    def acquire(self, ip):
+        """不经准入判断直接计入并发连接（平滑重启时从旧进程接管的连接）"""
+        with self.lock:
+            self._state(ip, time.monotonic()).active += 1
+            self.active_total += 1
+
+    def release(self, ip):
+        """连接处理结束（或被队列拒绝）时释放并发计数"""
+        with self.lock:
+            self.active_total = max(0, self.active_total - 1)
+            state = self.ips.get(ip)
+            if state is not None and state.active > 0:
+                state.active -= 1
+
+    def reject_queued(self, ip):
+        """已准入但进入队列失败的连接：释放计数并按队列满计数"""
+        self.release(ip)
+        with self.lock:
+            self.stats['rejected'][REJECT_QUEUE_FULL] += 1
+
+    def mark_trusted(self, ip):
+        """认证成功的IP进入优先通道，有效期ADMISSION_TRUSTED_TTL秒"""
+        with self.lock:
+            self.trusted[ip] = time.monotonic() + config.ADMISSION_TRUSTED_TTL
+
+    def _is_trusted(self, ip):
+        expires = self.trusted.get(ip)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self.trusted[ip]
+            return False
+        return True
+
+    def _state(self, ip, now):
+        state = self.ips.get(ip)
+        if state is None:
+            state = self.ips[ip] = _IPState(max(config.IP_CONNECT_BURST, 1), now)
+        return state
+
+    def _reject(self, reason):
+        with self.lock:
+            return self._reject_locked(reason)
+
+    def _reject_locked(self, reason):
+        self.stats['rejected'][reason] += 1
+        return None, reason
+
+    def start(self):
+        """启动空闲IP状态的定期清理"""
+        self.prune_timer = timerwheel.schedule(PRUNE_INTERVAL, self._prune)
+
+    def stop(self):
+        timerwheel.cancel(self.prune_timer)
+
+    def _prune(self):
+        """清理没有活动连接且令牌已回满的IP，以及过期的优先IP"""
+        now = time.monotonic()
+        burst = max(config.IP_CONNECT_BURST, 1)
+        rate = config.IP_CONNECT_RATE
+        with self.lock:
+            idle = [ip for ip, state in self.ips.items()
+                    if state.active == 0 and (rate <= 0 or state.tokens + (now - state.updated) * rate >= burst)]
+            for ip in idle:
+                del self.ips[ip]
+            expired = [ip for ip, expires in self.trusted.items() if expires < now]
+            for ip in expired:
+                del self.trusted[ip]
+        if idle or expired:
+            log_debug(f"准入状态清理: 移除 {len(idle)} 个空闲IP, {len(expired)} 个过期优先IP")
+        self.prune_timer = timerwheel.schedule(PRUNE_INTERVAL, self._prune)
+
+    def get_stats(self):
+        with self.lock:
+            stats = {
+                'admitted': self.stats['admitted'],
+                'priority': self.stats['priority'],
+                'rejected': dict(self.stats['rejected']),
+                'active': self.active_total,
+                'tracked_ips': len(self.ips),
+                'trusted_ips': len(self.trusted),
+            }
+        stats['rejected_total'] = sum(stats['rejected'].values())
+        stats['cidr_rules'] = self.trie.size
+        return stats
+
+
+_LINGER_RESET = struct.pack('ii', 1, 0)
+
+
+def close_rejected(client_socket):
+    """关闭被拒绝的连接：SO_LINGER=0直接发送RST，不在服务端留下TIME_WAIT"""
+    try:
+        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_RESET)
+    except OSError:
+        pass
+    try:
+        client_socket.close()
+    except OSError:
+        pass
+
+
+_controller = AdmissionController()
+
+
+def _apply_config_changes(changed):
+    """配置热加载：黑白名单变化时重建CIDR规则，其余准入参数每次判断时直接读取配置"""
+    if 'ADMISSION_ALLOW' in changed or 'ADMISSION_DENY' in changed:
+        _controller.load_rules()
+
+
+config.subscribe(_apply_config_changes)
+
+
+def get_controller():
+    """获取全局准入控制器"""
+    return _controller
+
+
+def admit(ip, queue_size=0):
+    """判断是否接受新连接"""
+    return _controller.admit(ip, queue_size)
+
+
+def release(ip):
+    """释放连接计数"""
+    _controller.release(ip)
+
+
+def mark_trusted(ip):
+    """标记认证成功的IP"""
+    _controller.mark_trusted(ip)
+
+
+def get_admission_stats():
+    """获取准入统计"""
+    return _controller.get_stats()
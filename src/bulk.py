@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+用户和挂载点批量导入导出
+支持CSV（带表头）和JSON（数组或每行一个对象的JSON Lines）格式，
+Web批量接口和命令行共用本模块
+
+命令行用法:
+    python -m src.bulk import-users users.csv
+    python -m src.bulk import-mounts mounts.jsonl --format jsonl
+    python -m src.bulk export-users --format csv > users.csv
+"""
+
+import csv
+import io
+import json
+import re
+import sys
+import argparse
+
+from . import database
+from .logger import log_info, log_error
+
+# 每个事务写入的行数，兼顾事务开销和持锁时长
+IMPORT_CHUNK_SIZE = 5000
+
+SUPPORTED_FORMATS = ('csv', 'json', 'jsonl')
+
+_NAME_PATTERN = re.compile(r'^[a-zA-Z0-9_-]+$')
+
+USER_FIELDS = ('username', 'password')
+MOUNT_FIELDS = ('mount', 'password', 'username')
+
+
+def _validate_field(value, field_name, min_len, max_len):
+    """校验字段，规则与Web单条添加接口一致"""
+    if not value:
+        return f"{field_name}不能为空"
+    if not _NAME_PATTERN.match(value):
+        return f"{field_name}只能包含英文字母、数字、下划线和中横线"
+    if len(value) < min_len or len(value) > max_len:
+        return f"{field_name}长度必须在{min_len}-{max_len}个字符之间"
+    return None
+
+
+def guess_format(filename, default='csv'):
+    """根据文件扩展名推断格式"""
+    lower = (filename or '').lower()
+    for fmt in SUPPORTED_FORMATS:
+        if lower.endswith('.' + fmt):
+            return fmt
+    if lower.endswith('.ndjson'):
+        return 'jsonl'
+    return default
+
+
+def iter_records(stream, fmt):
+    """从文本流中逐条读取记录，产出 (行号, 字典)
+
+    csv和jsonl格式逐行解析，不会把整个文件读入内存；json格式为数组，需整体解析
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'jsonl':
+        for line_no, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except ValueError as e:
+                yield line_no, e
+    elif fmt == 'json':
+        data = json.load(stream)
+        if not isinstance(data, list):
+            raise ValueError('JSON格式必须是对象数组')
+        for index, record in enumerate(data, 1):
+            yield index, record
+    else:
+        raise ValueError(f"不支持的格式: {fmt}")
+
+
+def _chunked(iterable, size):
+    """按固定大小分片"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _clean(record, key):
+    value = record.get(key) if isinstance(record, dict) else None
+    return str(value).strip() if value is not None else ''
+
+
+def import_users(stream, fmt='csv', chunk_size=IMPORT_CHUNK_SIZE, workers=None):
+    """批量导入用户
+
+    Returns:
+        dict: {'total', 'added', 'failed', 'errors': [{'row', 'name', 'error'}]}
+    """
+    report = {'total': 0, 'added': 0, 'failed': 0, 'errors': []}
+
+    def valid_rows():
+        for row_no, record in iter_records(stream, fmt):
+            report['total'] += 1
+            if not isinstance(record, dict):
+                report['errors'].append({'row': row_no, 'name': '', 'error': f'记录格式错误: {record}'})
+                continue
+            username = _clean(record, 'username')
+            password = _clean(record, 'password')
+            error = _validate_field(username, '用户名', 2, 50) or _validate_field(password, '密码', 6, 100)
+            if error:
+                report['errors'].append({'row': row_no, 'name': username, 'error': error})
+                continue
+            yield row_no, username, password
+
+    for chunk in _chunked(valid_rows(), chunk_size):
+        _, result = database.bulk_add_users(chunk, workers)
+        report['added'] += result['added']
+        report['errors'].extend(result['errors'])
+
+    report['errors'].sort(key=lambda e: e['row'])
+    report['failed'] = len(report['errors'])
+    log_info(f"批量导入用户完成: 共 {report['total']} 条, 成功 {report['added']}, 失败 {report['failed']}")
+    return report
+
+
+def import_mounts(stream, fmt='csv', chunk_size=IMPORT_CHUNK_SIZE):
+    """批量导入挂载点，username列可选，用于绑定挂载点所属用户
+
+    Returns:
+        dict: {'total', 'added', 'failed', 'errors': [{'row', 'name', 'error'}]}
+    """
+    report = {'total': 0, 'added': 0, 'failed': 0, 'errors': []}
+
+    def valid_rows():
+        for row_no, record in iter_records(stream, fmt):
+            report['total'] += 1
+            if not isinstance(record, dict):
+                report['errors'].append({'row': row_no, 'name': '', 'error': f'记录格式错误: {record}'})
+                continue
+            mount = _clean(record, 'mount')
+            password = _clean(record, 'password')
+            username = _clean(record, 'username')
+            error = _validate_field(mount, '挂载点名称', 2, 50) or _validate_field(password, '密码', 6, 100)
+            if error:
+                report['errors'].append({'row': row_no, 'name': mount, 'error': error})
+                continue
+            yield row_no, mount, password, username or None
+
+    for chunk in _chunked(valid_rows(), chunk_size):
+        _, result = database.bulk_add_mounts(chunk)
+        report['added'] += result['added']
+        report['errors'].extend(result['errors'])
+
+    report['errors'].sort(key=lambda e: e['row'])
+    report['failed'] = len(report['errors'])
+    log_info(f"批量导入挂载点完成: 共 {report['total']} 条, 成功 {report['added']}, 失败 {report['failed']}")
+    return report
+
+
+def _export(rows, fields, fmt):
+    """把行迭代器编码为文本块的生成器"""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        for row in rows:
+            writer.writerow(['' if v is None else v for v in row])
+            if buffer.tell() >= 65536:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    elif fmt == 'jsonl':
+        for row in rows:
+            yield json.dumps(dict(zip(fields, row)), ensure_ascii=False) + '\n'
+    elif fmt == 'json':
+        # 逐条输出数组元素，不在内存中拼接整个数组
+        yield '['
+        first = True
+        for row in rows:
+            yield ('\n' if first else ',\n') + json.dumps(dict(zip(fields, row)), ensure_ascii=False)
+            first = False
+        yield '\n]\n'
+    else:
+        raise ValueError(f"不支持的格式: {fmt}")
+
+
+def export_users(fmt='csv'):
+    """流式导出用户（不含密码），返回文本块生成器"""
+    return _export(database.iter_users(), ('id', 'username'), fmt)
+
+
+def export_mounts(fmt='csv'):
+    """流式导出挂载点（不含密码），返回文本块生成器"""
+    return _export(database.iter_mounts(), ('id', 'mount', 'username', 'lat', 'lon'), fmt)
+
+
+def _print_report(report):
+    print(f"共 {report['total']} 条, 成功 {report['added']}, 失败 {report['failed']}")
+    for error in report['errors']:
+        print(f"  第 {error['row']} 行 {error['name']}: {error['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='2RTK NTRIP Caster 用户和挂载点批量导入导出')
+    parser.add_argument('action', choices=['import-users', 'import-mounts', 'export-users', 'export-mounts'])
+    parser.add_argument('file', nargs='?', default='-', help='导入文件路径，- 表示标准输入（默认）')
+    parser.add_argument('--format', choices=SUPPORTED_FORMATS, help='数据格式，默认根据文件扩展名推断，否则为csv')
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='每个事务写入的行数')
+    parser.add_argument('--workers', type=int, default=None, help='密码哈希线程数')
+    args = parser.parse_args(argv)
+
+    fmt = args.format or guess_format(args.file)
+    database.init_db()
+
+    if args.action.startswith('export'):
+        exporter = export_users if args.action == 'export-users' else export_mounts
+        for block in exporter(fmt):
+            sys.stdout.write(block)
+        return 0
+
+    stream = sys.stdin if args.file == '-' else open(args.file, 'r', encoding='utf-8-sig', newline='')
+    try:
+        if args.action == 'import-users':
+            report = import_users(stream, fmt, args.chunk_size, args.workers)
+        else:
+            report = import_mounts(stream, fmt, args.chunk_size)
+    except ValueError as e:
+        log_error(f"批量导入失败: {e}")
+        print(f"批量导入失败: {e}")
+        return 1
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    _print_report(report)
+    return 0 if report['failed'] == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
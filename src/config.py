@@ -6,7 +6,10 @@ config.py - 配置文件
 
 import os
 import socket
+import threading
+import time
 import configparser
+from collections import deque
 from pathlib import Path
 from typing import List, Tuple
 
@@ -21,20 +24,26 @@ if os.path.exists(CONFIG_FILE):
 else:
     raise FileNotFoundError(f"配置文件 {CONFIG_FILE} 不存在")
 
-def get_config_value(section, key, fallback=None, value_type=str):
-    """获取配置值并转换类型"""
+# 读取过的配置项的默认值和类型 {(节, 键): (默认值, 类型)}，热加载时按相同方式重新读取
+_value_specs = {}
+
+def get_config_value(section, key, fallback=None, value_type=str, parser=None):
+    """获取配置值并转换类型（parser为空时从当前加载的配置文件读取）"""
+    if parser is None:
+        parser = config
+    _value_specs.setdefault((section, key), (fallback, value_type))
     try:
         if value_type == bool:
-            return config.getboolean(section, key, fallback=fallback)
+            return parser.getboolean(section, key, fallback=fallback)
         elif value_type == int:
-            return config.getint(section, key, fallback=fallback)
+            return parser.getint(section, key, fallback=fallback)
         elif value_type == float:
-            return config.getfloat(section, key, fallback=fallback)
+            return parser.getfloat(section, key, fallback=fallback)
         elif value_type == list:
-            value = config.get(section, key, fallback='')
+            value = parser.get(section, key, fallback='')
             return [item.strip() for item in value.split(',') if item.strip()] if value else fallback or []
         else:
-            return config.get(section, key, fallback=fallback)
+            return parser.get(section, key, fallback=fallback)
     except (configparser.NoSectionError, configparser.NoOptionError):
         return fallback
 
@@ -204,10 +213,16 @@ DEFAULT_NTRIP_VERSION = get_config_value('ntrip', 'default_version', '1.0')
 MAX_USER_CONNECTIONS_PER_MOUNT = get_config_value('ntrip', 'max_user_connections_per_mount', 3000, int)
 MAX_USERS_PER_MOUNT = get_config_value('ntrip', 'max_users_per_mount', 3000, int)  # 每个挂载点每个用户的最大连接数
 MAX_CONNECTIONS_PER_USER = get_config_value('ntrip', 'max_connections_per_user', 3, int)  # 每个用户的最大连接数
-MOUNT_TIMEOUT = get_config_value('ntrip', 'mount_timeout', 1800, int)  # 30分钟
-CLIENT_TIMEOUT = get_config_value('ntrip', 'client_timeout', 300, int)  # 5分钟
+MOUNT_TIMEOUT = get_config_value('ntrip', 'mount_timeout', 1800, int)  # 挂载点无数据超时 (秒)，0为不检查
+CLIENT_TIMEOUT = get_config_value('ntrip', 'client_timeout', 300, int)  # 客户端未收到数据超时 (秒)，0为不检查
 CONNECTION_TIMEOUT = get_config_value('ntrip', 'connection_timeout', 1800, int)  # 连接超时时间 (秒)
 
+# 虚拟最近挂载点：流动站连接该挂载点并上传GGA后，自动接入距离最近的在线基站（留空禁用）
+NEAREST_MOUNT = get_config_value('ntrip', 'nearest_mount', '')
+NEAREST_GGA_TIMEOUT = get_config_value('ntrip', 'nearest_gga_timeout', 15, int)  # 等待首条GGA的时间 (秒)
+NEAREST_RESELECT_INTERVAL = get_config_value('ntrip', 'nearest_reselect_interval', 60, int)  # 按最新位置重新选择基站的间隔 (秒)
+NEAREST_MAX_DISTANCE = get_config_value('ntrip', 'nearest_max_distance', 0, float)  # 基站最大距离 (km)，0为不限制
+
 # ==================== TCP配置 ====================
 
 # TCP Keep-Alive配置
@@ -218,6 +233,10 @@ TCP_KEEPALIVE = {
     'count': get_config_value('tcp', 'keepalive_count', 3, int)       # 最大keep-alive探测次数
 }
 SOCKET_TIMEOUT = get_config_value('tcp', 'socket_timeout', 120, int)
+HANDSHAKE_TIMEOUT = get_config_value('tcp', 'handshake_timeout', 10, float)  # 连接建立到请求头完整的最长时间 (秒)
+HANDSHAKE_MAX_HEADER_SIZE = get_config_value('tcp', 'handshake_max_header_size', 8192, int)  # 请求头最大字节数
+TCP_USER_TIMEOUT = get_config_value('tcp', 'user_timeout', 30, int)  # 已发送数据未被确认的最长时间 (秒)，0为使用系统默认
+LIVENESS_SWEEP_INTERVAL = get_config_value('tcp', 'liveness_sweep_interval', 5, int)  # 挂载点存活巡检间隔 (秒)
 
 # ==================== 数据转发配置 ====================
 
@@ -241,6 +260,15 @@ RTCM_BUFFER_SIZE = get_config_value('rtcm', 'buffer_size', 1000, int)
 # RTCM数据解析时长（秒）- 用于修正STR表
 RTCM_PARSE_DURATION = get_config_value('rtcm', 'parse_duration', 30, int)
 
+# 同时运行的STR修正解析数，其余挂载点排队（大量基站同时重连时避免成百上千个解析线程）
+STR_FIX_CONCURRENCY = get_config_value('rtcm', 'str_fix_concurrency', 4, int)
+
+# 挂载点元数据的有效期（秒）：重连或重启后先套用已保存的元数据，有效期内只按帧头指纹复核，过期则重新解析
+STR_VERIFIED_TTL = get_config_value('rtcm', 'str_verified_ttl', 21600, int)
+
+# STR维护间隔（秒）：按接收统计中的帧头计数更新消息类型、星座、载波和比特率字段，0为不维护
+STR_MAINTAIN_INTERVAL = get_config_value('rtcm', 'str_maintain_interval', 60, int)
+
 # RTCM消息类型描述字典
 RTCM_MESSAGE_DESCRIPTIONS = {
     1001: "L1-Only GPS RTK Observables",
@@ -306,10 +334,212 @@ CONNECTION_QUEUE_SIZE = get_config_value('performance', 'connection_queue_size',
 
 MAX_MEMORY_USAGE = get_config_value('performance', 'max_memory_usage', 2048, int)
 
+# ==================== 连接准入控制 ====================
+
+ADMISSION_ENABLED = get_config_value('admission', 'enabled', True, bool)
+MAX_CONNECTIONS_PER_IP = get_config_value('admission', 'max_connections_per_ip', 100, int)  # 单IP并发连接上限，0为不限制
+IP_CONNECT_RATE = get_config_value('admission', 'connect_rate', 10, float)  # 单IP每秒新建连接数，0为不限制
+IP_CONNECT_BURST = get_config_value('admission', 'connect_burst', 50, int)  # 单IP突发连接数
+ADMISSION_PRIORITY_RESERVE = get_config_value('admission', 'priority_reserve', 500, int)  # 为优先通道预留的连接和队列名额
+ADMISSION_TRUSTED_TTL = get_config_value('admission', 'trusted_ttl', 86400, int)  # 认证成功的IP进入优先通道的有效期 (秒)
+ADMISSION_ALLOW = get_config_value('admission', 'allow', '127.0.0.0/8,::1/128')  # 白名单CIDR，逗号分隔
+ADMISSION_DENY = get_config_value('admission', 'deny', '')  # 黑名单CIDR，逗号分隔
+
+# ==================== 平滑重启 ====================
+
+HANDOFF_ENABLED = get_config_value('handoff', 'enabled', True, bool)  # 重启时把连接交给新进程，不断开客户端
+HANDOFF_SOCKET_PATH = get_config_value('handoff', 'socket_path', '2rtk-handoff.sock')  # 新旧进程交接用的Unix socket路径
+HANDOFF_TIMEOUT = get_config_value('handoff', 'timeout', 30, int)  # 等待新进程就绪和确认的最长时间 (秒)
+HANDOFF_DRAIN_TIMEOUT = get_config_value('handoff', 'drain_timeout', 10, int)  # 交接后旧进程等待未完成请求结束的最长时间 (秒)
+
+# ==================== 挂载点时间序列 ====================
+
+TIMESERIES_ENABLED = get_config_value('timeseries', 'enabled', True, bool)  # 每秒采样挂载点速率、流动站数和分发延迟
+TIMESERIES_PERSIST_DIR = get_config_value('timeseries', 'persist_dir', '')  # 历史数据文件目录（mmap），留空只保存在内存
+
+# ==================== 用量计费 ====================
+
+ACCOUNTING_ENABLED = get_config_value('accounting', 'enabled', True, bool)  # 记录流动站会话和按小时汇总的用量
+ACCOUNTING_FLUSH_INTERVAL = get_config_value('accounting', 'flush_interval', 10, int)  # 批量写入数据库的间隔 (秒)，也是崩溃时最多丢失的用量时长
+ACCOUNTING_MAX_PENDING = get_config_value('accounting', 'max_pending', 100000, int)  # 数据库不可写时内存中最多保留的已断开会话记录数
+
 CPU_WARNING_THRESHOLD = get_config_value('performance', 'cpu_warning_threshold', 80, int)
 
 MEMORY_WARNING_THRESHOLD = get_config_value('performance', 'memory_warning_threshold', 80, int)
 
+# ==================== 配置热加载 ====================
+
+# 可热加载的配置项 {名称: (节, 键, 最小值)}，名称中带"."的是字典配置的键（如TCP_KEEPALIVE.idle）。
+# 其余配置项（端口、监听地址、数据库、日志文件、密钥、应用信息等）修改后需要重启才能生效
+RELOADABLE_SETTINGS = {
+    'MAX_CONNECTIONS': ('network', 'max_connections', 1),
+    'BUFFER_SIZE': ('network', 'buffer_size', 1024),
+    'LOG_LEVEL': ('logging', 'log_level', None),
+    'LOG_FREQUENT_STATUS': ('logging', 'log_frequent_status', None),
+    'MAX_USERS_PER_MOUNT': ('ntrip', 'max_users_per_mount', 1),
+    'MAX_CONNECTIONS_PER_USER': ('ntrip', 'max_connections_per_user', 1),
+    'MOUNT_TIMEOUT': ('ntrip', 'mount_timeout', 0),
+    'CLIENT_TIMEOUT': ('ntrip', 'client_timeout', 0),
+    'NEAREST_MOUNT': ('ntrip', 'nearest_mount', None),
+    'NEAREST_GGA_TIMEOUT': ('ntrip', 'nearest_gga_timeout', 1),
+    'NEAREST_RESELECT_INTERVAL': ('ntrip', 'nearest_reselect_interval', 1),
+    'NEAREST_MAX_DISTANCE': ('ntrip', 'nearest_max_distance', 0),
+    'TCP_KEEPALIVE.enabled': ('tcp', 'keepalive_enabled', None),
+    'TCP_KEEPALIVE.idle': ('tcp', 'keepalive_idle', 1),
+    'TCP_KEEPALIVE.interval': ('tcp', 'keepalive_interval', 1),
+    'TCP_KEEPALIVE.count': ('tcp', 'keepalive_count', 1),
+    'SOCKET_TIMEOUT': ('tcp', 'socket_timeout', 1),
+    'HANDSHAKE_TIMEOUT': ('tcp', 'handshake_timeout', 0.1),
+    'HANDSHAKE_MAX_HEADER_SIZE': ('tcp', 'handshake_max_header_size', 256),
+    'TCP_USER_TIMEOUT': ('tcp', 'user_timeout', 0),
+    'LIVENESS_SWEEP_INTERVAL': ('tcp', 'liveness_sweep_interval', 1),
+    'RING_BUFFER_SIZE': ('data_forwarding', 'ring_buffer_size', 1),
+    'BROADCAST_INTERVAL': ('data_forwarding', 'broadcast_interval', 0.001),
+    'CLIENT_HEALTH_CHECK_INTERVAL': ('data_forwarding', 'client_health_check_interval', 0),
+    'STR_FIX_CONCURRENCY': ('rtcm', 'str_fix_concurrency', 1),
+    'STR_VERIFIED_TTL': ('rtcm', 'str_verified_ttl', 0),
+    'STR_MAINTAIN_INTERVAL': ('rtcm', 'str_maintain_interval', 0),
+    'ACCOUNTING_FLUSH_INTERVAL': ('accounting', 'flush_interval', 1),
+    'ACCOUNTING_MAX_PENDING': ('accounting', 'max_pending', 1),
+    'REALTIME_PUSH_INTERVAL': ('web', 'realtime_push_interval', 1),
+    'MAX_WORKERS': ('performance', 'max_workers', 1),
+    'CONNECTION_QUEUE_SIZE': ('performance', 'connection_queue_size', 1),
+    'ADMISSION_ENABLED': ('admission', 'enabled', None),
+    'MAX_CONNECTIONS_PER_IP': ('admission', 'max_connections_per_ip', 0),
+    'IP_CONNECT_RATE': ('admission', 'connect_rate', 0),
+    'IP_CONNECT_BURST': ('admission', 'connect_burst', 1),
+    'ADMISSION_PRIORITY_RESERVE': ('admission', 'priority_reserve', 0),
+    'ADMISSION_TRUSTED_TTL': ('admission', 'trusted_ttl', 0),
+    'ADMISSION_ALLOW': ('admission', 'allow', None),
+    'ADMISSION_DENY': ('admission', 'deny', None),
+    'HANDOFF_ENABLED': ('handoff', 'enabled', None),
+    'HANDOFF_SOCKET_PATH': ('handoff', 'socket_path', None),
+    'HANDOFF_TIMEOUT': ('handoff', 'timeout', 1),
+    'HANDOFF_DRAIN_TIMEOUT': ('handoff', 'drain_timeout', 0),
+}
+
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+_subscribers = []
+_reload_lock = threading.Lock()
+_reload_history = deque(maxlen=50)
+
+
+def subscribe(callback):
+    """注册配置变更回调，热加载后以 {名称: (旧值, 新值)} 调用"""
+    _subscribers.append(callback)
+
+
+def _current_value(name):
+    base, _, key = name.partition('.')
+    value = globals()[base]
+    return value[key] if key else value
+
+
+def _apply_value(name, value):
+    base, _, key = name.partition('.')
+    if key:
+        # 字典配置原地更新，已持有该字典的模块也能读到新值
+        globals()[base][key] = value
+    else:
+        globals()[base] = value
+
+
+def _read_reloadable(parser):
+    """从新解析的配置文件读取全部可热加载的配置项并验证，返回 (值字典, 错误列表)"""
+    values, errors = {}, []
+    for name, (section, key, minimum) in RELOADABLE_SETTINGS.items():
+        fallback, value_type = _value_specs[(section, key)]
+        try:
+            value = get_config_value(section, key, fallback, value_type, parser)
+        except ValueError as e:
+            errors.append(f"[{section}] {key} 不是有效的{value_type.__name__}值: {e}")
+            continue
+        if minimum is not None and value < minimum:
+            errors.append(f"[{section}] {key} = {value} 小于最小值 {minimum}")
+            continue
+        values[name] = value
+    if 'LOG_LEVEL' in values and values['LOG_LEVEL'].upper() not in LOG_LEVELS:
+        errors.append(f"[logging] log_level = {values['LOG_LEVEL']} 不是有效的日志级别 ({', '.join(LOG_LEVELS)})")
+    if values.get('BUFFER_SIZE', 0) > MAX_BUFFER_SIZE:
+        errors.append(f"[network] buffer_size = {values['BUFFER_SIZE']} 超过 max_buffer_size {MAX_BUFFER_SIZE}")
+    return values, errors
+
+
+def _restart_required_keys(parser):
+    """与启动时的配置文件相比有变化、但不能热加载的配置项"""
+    live_keys = {(section, key) for section, key, _ in RELOADABLE_SETTINGS.values()}
+    keys = set()
+    for source in (config, parser):
+        for section in source.sections():
+            keys.update((section, key) for key in source.options(section))
+    changed = []
+    for section, key in sorted(keys - live_keys):
+        if config.get(section, key, fallback=None) != parser.get(section, key, fallback=None):
+            changed.append(f"{section}.{key}")
+    return changed
+
+
+def reload_config(source='api'):
+    """重新读取配置文件并热应用可热加载的配置项
+
+    先完整解析和验证，任何一项无效则不应用任何修改；应用后通知订阅者并逐项记录审计日志。
+    不能热加载的配置项只报告为需要重启，保持启动时的值。
+
+    Returns:
+        tuple: (是否成功, 说明, {'changed': {名称: [旧值, 新值]}, 'restart_required': [节.键]})
+    """
+    from .logger import log_system_event, log_error
+
+    with _reload_lock:
+        parser = configparser.ConfigParser()
+        try:
+            if not parser.read(CONFIG_FILE, encoding='utf-8'):
+                return False, f"配置文件 {CONFIG_FILE} 不存在", {}
+        except configparser.Error as e:
+            return False, f"配置文件格式错误: {e}", {}
+
+        values, errors = _read_reloadable(parser)
+        if errors:
+            return False, "配置验证失败，未应用任何修改: " + '; '.join(errors), {}
+
+        changed = {}
+        for name, value in values.items():
+            old = _current_value(name)
+            if old != value:
+                changed[name] = (old, value)
+                _apply_value(name, value)
+        restart_required = _restart_required_keys(parser)
+
+        for name, (old, new) in changed.items():
+            log_system_event(f'配置热加载 ({source}): {name} {old!r} -> {new!r}')
+        if restart_required:
+            log_system_event(f'配置热加载 ({source}): 以下配置项需要重启才能生效: {", ".join(restart_required)}')
+
+        for callback in list(_subscribers):
+            if not changed:
+                break
+            try:
+                callback(changed)
+            except Exception as e:
+                log_error(f"应用配置变更失败 ({getattr(callback, '__module__', callback)}): {e}", exc_info=True)
+
+        result = {
+            'changed': {name: [old, new] for name, (old, new) in changed.items()},
+            'restart_required': restart_required,
+        }
+        _reload_history.append(dict(result, time=time.time(), source=source))
+        message = f"已应用 {len(changed)} 项配置修改"
+        if restart_required:
+            message += f"，{len(restart_required)} 项需要重启才能生效"
+        return True, message, result
+
+
+def get_reload_history():
+    """获取最近的配置热加载记录"""
+    return list(_reload_history)
+
+
 def load_from_env():
     """从环境变量加载配置"""
     global NTRIP_PORT, WEB_PORT, DEBUG, DATABASE_PATH
@@ -1,19 +1,136 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import sys
+import math
 import time
 import json
+import itertools
 import threading
 from threading import Lock, RLock, Thread
 from collections import defaultdict, deque
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, NamedTuple
 from dataclasses import dataclass, field, asdict
 
 from . import config
 from . import logger
 from .logger import log_system_event, log_error, log_warning, log_info, log_debug
 from .rtcm2_manager import parser_manager as rtcm_manager  # 导入RTCM2解析管理器
+from . import spatial
+from . import timerwheel
+
+# RTCM3帧: 前导字节0xD3、6位保留位和10位长度，之后是消息体（前12位为消息类型）和24位CRC
+RTCM3_PREAMBLE = 0xD3
+RTCM3_MAX_FRAME = 3 + 1023 + 3
+# 基准站坐标消息，消息类型之后是12位基准站ID
+RTCM3_STATION_MESSAGES = (1005, 1006)
+
+
+class MountStats:
+    """挂载点接收统计
+
+    每次收到上传数据只由该挂载点的上传线程调用一次record()，读取方通过snapshot()获取快照，
+    不加锁：速率元组整体替换，计数器只增不减，快照最多落后一次更新。
+    速率为1/10/60秒时间窗口的指数加权平均（按实际到达间隔衰减），抖动为到达间隔偏离
+    平均间隔的指数加权平均（同RFC 3550的1/16增益）。消息类型按RTCM3帧头计数，不校验CRC；
+    基准站ID取自1005/1006帧头后的12位。
+    """
+
+    RATE_WINDOWS = (1.0, 10.0, 60.0)
+
+    __slots__ = ('total_bytes', 'data_count', 'total_messages', 'message_types', 'rates',
+                 'first_data_time', 'last_data_time', 'mean_interval', 'jitter', 'station_id', '_partial')
+
+    def __init__(self):
+        self.total_bytes = 0
+        self.data_count = 0
+        self.total_messages = 0
+        self.message_types = {}  # {消息类型: 帧数}
+        self.rates = (0.0, 0.0, 0.0)  # 字节/秒，对应RATE_WINDOWS
+        self.first_data_time = None
+        self.last_data_time = None
+        self.mean_interval = 0.0
+        self.jitter = 0.0
+        self.station_id = None
+        self._partial = b''  # 跨数据块的不完整帧
+
+    def record(self, data, now=None):
+        """记录一次收到的上传数据"""
+        if now is None:
+            now = time.time()
+        size = len(data)
+        last = self.last_data_time
+        if last is None:
+            self.first_data_time = now
+            self.rates = tuple(size / window for window in self.RATE_WINDOWS)
+        else:
+            interval = max(0.0, now - last)
+            if self.data_count == 1:
+                self.mean_interval = interval
+            else:
+                self.mean_interval += (interval - self.mean_interval) / 16
+                self.jitter += (abs(interval - self.mean_interval) - self.jitter) / 16
+            self.rates = tuple(rate * math.exp(-interval / window) + size / window
+                               for rate, window in zip(self.rates, self.RATE_WINDOWS))
+        self.total_bytes += size
+        self.data_count += 1
+        self.last_data_time = now
+        self._count_frames(data)
+
+    def _count_frames(self, data):
+        buffer = self._partial + data if self._partial else data
+        end = len(buffer)
+        pos = 0
+        types = self.message_types
+        while True:
+            start = buffer.find(RTCM3_PREAMBLE, pos)
+            if start < 0:
+                pos = end
+                break
+            if end - start < 5:
+                pos = start
+                break
+            if buffer[start + 1] & 0xFC:
+                pos = start + 1
+                continue
+            length = ((buffer[start + 1] & 0x03) << 8) | buffer[start + 2]
+            frame_end = start + length + 6
+            if frame_end > end:
+                pos = start
+                break
+            message_type = (buffer[start + 3] << 4) | (buffer[start + 4] >> 4)
+            types[message_type] = types.get(message_type, 0) + 1
+            if message_type in RTCM3_STATION_MESSAGES and length >= 3:
+                self.station_id = ((buffer[start + 4] & 0x0F) << 8) | buffer[start + 5]
+            self.total_messages += 1
+            pos = frame_end
+        self._partial = buffer[pos:] if end - pos < RTCM3_MAX_FRAME else b''
+
+    def snapshot(self, now=None):
+        """获取统计快照，速率衰减到当前时刻（停止上传后逐渐降为0）"""
+        if now is None:
+            now = time.time()
+        last = self.last_data_time
+        rates = self.rates
+        if last is not None:
+            idle = max(0.0, now - last)
+            rates = tuple(rate * math.exp(-idle / window) for rate, window in zip(rates, self.RATE_WINDOWS))
+        return {
+            'total_bytes': self.total_bytes,
+            'data_count': self.data_count,
+            'total_messages': self.total_messages,
+            'message_types': self.message_types.copy(),
+            'rate_1s': rates[0],
+            'rate_10s': rates[1],
+            'rate_60s': rates[2],
+            'mean_interval': self.mean_interval,
+            'jitter': self.jitter,
+            'station_id': self.station_id,
+            'first_data_time': self.first_data_time,
+            'last_data_time': last,
+        }
+
 
 @dataclass
 class MountInfo:
@@ -39,12 +156,8 @@ class MountInfo:
     country: Optional[str] = None  # 国家代码（如CHN）
     city: Optional[str] = None     # 城市名称（如Beijing）
     
-    # 数据统计
-    total_bytes: int = 0
-    total_messages: int = 0
-    data_rate: float = 0.0
-    data_count: int = 0
-    last_data_time: Optional[float] = None
+    # 数据统计（只由上传线程更新）
+    stats: MountStats = field(default_factory=MountStats)
     
     # 状态信息
     status: str = 'online'  # 'online', 'offline'
@@ -56,6 +169,30 @@ class MountInfo:
     
     custom_info: Dict[str, Any] = field(default_factory=dict)
     
+    # 时间轮定时器: 无数据超时检查
+    idle_timer: Optional[object] = None
+    
+    @property
+    def total_bytes(self) -> int:
+        return self.stats.total_bytes
+    
+    @property
+    def total_messages(self) -> int:
+        return self.stats.total_messages
+    
+    @property
+    def data_count(self) -> int:
+        return self.stats.data_count
+    
+    @property
+    def last_data_time(self) -> Optional[float]:
+        return self.stats.last_data_time
+    
+    @property
+    def data_rate(self) -> float:
+        """最近10秒的平均接收速率（字节/秒）"""
+        return self.stats.snapshot()['rate_10s']
+    
     @property
     def uptime(self) -> float:
         """运行时间（秒）"""
@@ -70,7 +207,7 @@ class MountInfo:
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式，用于JSON序列化"""
-        
+        stats = self.stats.snapshot()
         return {
             'mount_name': self.mount_name,
             'ip_address': self.ip_address,
@@ -85,25 +222,109 @@ class MountInfo:
             'height': self.height,
             'country': self.country,
             'city': self.city,
-            'total_bytes': self.total_bytes,
-            'total_messages': self.total_messages,
-            'data_rate': self.data_rate,
-            'data_count': self.data_count,
-            'last_data_time': self.last_data_time,
+            'total_bytes': stats['total_bytes'],
+            'total_messages': stats['total_messages'],
+            'data_rate': stats['rate_10s'],
+            'data_count': stats['data_count'],
+            'last_data_time': stats['last_data_time'],
+            'stats': stats,
             'status': self.status,
             'str_data': self.str_data,
             'initial_str_generated': self.initial_str_generated,
             'final_str_generated': self.final_str_generated,
             'custom_info': self.custom_info
         }
+class ClientSession:
+    """流动站（下载）连接会话
+
+    转发器的客户端列表和连接管理器的在线用户表引用同一个会话对象：转发器直接更新发送进度，
+    连接管理器据此统计在线用户，不再各自维护一份记录。用户名和挂载点名经sys.intern驻留，
+    同一挂载点的上万个会话共用一个字符串对象。
+    """
+
+    __slots__ = ('connection_id', 'socket', 'user', 'mount', 'agent', 'addr', 'protocol_version',
+                 'connected_at', 'last_seen', 'last_sent_timestamp', 'bytes_sent', 'messages_sent',
+                 'send_errors', 'position', 'timeout_timer', 'virtual_mount')
+
+    def __init__(self, client_socket, user, mount, agent, addr, protocol_version):
+        now = time.time()
+        self.connection_id = None  # 登记到连接管理器时分配的全局递增编号
+        self.socket = client_socket
+        self.user = sys.intern(user)
+        self.mount = sys.intern(mount)
+        self.agent = agent
+        self.addr = addr
+        self.protocol_version = protocol_version
+        self.connected_at = now
+        self.last_seen = now
+        self.last_sent_timestamp = now
+        self.bytes_sent = 0
+        self.messages_sent = 0
+        self.send_errors = 0
+        self.position = None  # 流动站最新位置（uplink.RoverPosition），由上行读取线程更新
+        self.timeout_timer = None
+        self.virtual_mount = None  # 经虚拟最近挂载点接入时为虚拟挂载点名
+
+    @property
+    def connect_datetime(self) -> str:
+        return datetime.fromtimestamp(self.connected_at).strftime('%Y-%m-%d %H:%M:%S')
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典格式，用于JSON序列化"""
+        return {
+            'connection_id': self.connection_id,
+            'username': self.user,
+            'mount_name': self.mount,
+            'ip_address': self.addr[0],
+            'user_agent': self.agent,
+            'protocol_version': self.protocol_version,
+            'connect_time': self.connected_at,
+            'connect_datetime': self.connect_datetime,
+            'last_activity': self.last_seen,
+            'bytes_sent': self.bytes_sent
+        }
+
+
+# 读模型：快照的最短发布间隔；读取时合成的实时计数在同一快照版本内复用的时长（秒）
+SNAPSHOT_INTERVAL = 1.0
+# 挂载点停止接收后速率仍需按时间衰减重算的时长（秒），超过后最长速率窗口的速率已降到原来的1%以下
+RATE_DECAY_HORIZON = 5 * MountStats.RATE_WINDOWS[-1]
+
+
+class ConnectionSnapshot(NamedTuple):
+    """连接管理器的只读快照，发布后不再修改
+
+    只包含随状态变化（上下线、切换挂载点、STR和位置更新）而变的部分，每个条目附带活动对象的引用，
+    速率、字节数、最后活动时间等快速变化的计数在读取时从活动对象取值，见ConnectionView。
+    """
+    version: int
+    created: float
+    mounts: Dict[str, tuple]  # {挂载点: (MountInfo.to_dict(), 统计条目, MountInfo)}
+    users: Dict[str, List[tuple]]  # {用户名: [(ClientSession.to_dict(), 统计条目, ClientSession)]}
+    str_data: Dict[str, str]  # {挂载点: STR}
+
+
+class ConnectionView(NamedTuple):
+    """快照加上读取时刻实时计数合成的读模型，结构同原get_online_mounts()/get_online_users()/get_statistics()"""
+    version: int
+    created: float
+    mounts: Dict[str, Dict[str, Any]]
+    users: Dict[str, List[Dict[str, Any]]]
+    statistics: Dict[str, Any]
+
+
 class ConnectionManager:
     """连接和挂载点管理器 - 统一管理在线挂载点、用户连接和STR表"""
     
     def __init__(self):
         # 在线挂载点表: {mount_name: MountInfo}
         self.online_mounts: Dict[str, MountInfo] = {}
-        # 在线用户表: {user_id: [connection_info, ...]}
-        self.online_users = defaultdict(list)
+        # 在线用户表: {username: {connection_id: ClientSession}}，会话对象与转发器共用
+        self.online_users = defaultdict(dict)
+        # 全部在线会话: {connection_id: ClientSession}，按连接ID常数时间查找
+        self.sessions: Dict[int, ClientSession] = {}
+        # 连接ID分配器：进程内单调递增，同一用户同一秒内的多个连接也不会重复
+        self._connection_ids = itertools.count(1)
         # 用户连接计数: {username: count}
         self.user_connection_count = defaultdict(int)
         # 挂载点计数: {mount_name: count}
@@ -116,6 +337,200 @@ class ConnectionManager:
         self.mount_lock = RLock()
         self.user_lock = RLock()
         
+        # 源表版本号：挂载点上下线或STR变化时递增，源表缓存据此判断是否需要重建
+        self.sourcetable_version = 0
+        
+        # 读模型：写入方只标记状态变化的挂载点和用户，发布时只重建这些条目；没有变化时不发布。
+        # 快速变化的计数不进快照，有读取方时才从活动对象合成（同一版本SNAPSHOT_INTERVAL内复用）
+        self.snapshot = ConnectionSnapshot(0, time.time(), {}, {}, {})
+        self._view = None  # 最近合成的ConnectionView
+        self._view_lock = Lock()
+        # 读取时合成的条目缓存，计数未变的条目直接复用:
+        # {挂载点: (快照条目, 计数键, to_dict, 统计条目)}、{连接ID: (快照条目, bytes_sent, last_seen, to_dict, 统计条目)}、
+        # {用户名: (快照中的会话列表, [to_dict], [统计条目])}
+        self._mount_cache = {}
+        self._session_cache = {}
+        self._user_cache = {}
+        self._mount_views = {}  # {挂载点: (to_dict, 统计条目, MountInfo)}
+        self._user_views = {}  # {用户名: [(to_dict, 统计条目, ClientSession)]}
+        self._dirty_mounts = set()
+        self._dirty_users = set()
+        self._publish_lock = Lock()
+        self._publish_timer = None
+        self._published_at = 0.0
+        self.snapshot_stats = {'published': 0, 'mounts_rebuilt': 0, 'users_rebuilt': 0, 'last_publish_ms': 0.0,
+                               'views_built': 0, 'view_entries_rebuilt': 0, 'last_view_ms': 0.0}
+    
+    def _mark_mount(self, mount_name):
+        self._dirty_mounts.add(mount_name)
+        self._schedule_publish()
+    
+    def _mark_user(self, username):
+        self._dirty_users.add(username)
+        self._schedule_publish()
+    
+    def _schedule_publish(self):
+        """安排下一次快照发布，两次发布至少间隔SNAPSHOT_INTERVAL秒"""
+        with self._publish_lock:
+            if self._publish_timer is not None:
+                return
+            delay = max(0.0, self._published_at + SNAPSHOT_INTERVAL - time.time())
+            self._publish_timer = timerwheel.schedule(delay, self._publish_tick)
+    
+    def _publish_tick(self):
+        with self._publish_lock:
+            self._publish_timer = None
+        self.publish_snapshot()
+    
+    def publish_snapshot(self):
+        """重建标记为变化的条目并发布新快照"""
+        start = time.perf_counter()
+        now = time.time()
+        mounts_rebuilt = users_rebuilt = 0
+        with self.mount_lock, self.user_lock:
+            dirty_mounts, self._dirty_mounts = self._dirty_mounts, set()
+            dirty_users, self._dirty_users = self._dirty_users, set()
+            for name in dirty_mounts:
+                mount_info = self.online_mounts.get(name)
+                if mount_info is None:
+                    self._mount_views.pop(name, None)
+                else:
+                    self._mount_views[name] = self._build_mount_view(name, mount_info)
+                    mounts_rebuilt += 1
+            for username in dirty_users:
+                user_sessions = self.online_users.get(username)
+                if not user_sessions:
+                    self._user_views.pop(username, None)
+                else:
+                    self._user_views[username] = [
+                        (session.to_dict(),
+                         {'username': username, 'mount_name': session.mount, 'ip_address': session.addr[0],
+                          'connect_time': session.connected_at, 'bytes_sent': session.bytes_sent},
+                         session)
+                        for session in user_sessions.values()
+                    ]
+                    users_rebuilt += 1
+            mounts = dict(self._mount_views)
+            users = dict(self._user_views)
+        
+        self.snapshot = ConnectionSnapshot(
+            version=self.snapshot.version + 1,
+            created=now,
+            mounts=mounts,
+            users=users,
+            str_data={name: view[0]['str_data'] for name, view in mounts.items() if view[0]['str_data']}
+            if dirty_mounts else self.snapshot.str_data
+        )
+        self._published_at = now
+        self.snapshot_stats['published'] += 1
+        self.snapshot_stats['mounts_rebuilt'] += mounts_rebuilt
+        self.snapshot_stats['users_rebuilt'] += users_rebuilt
+        self.snapshot_stats['last_publish_ms'] = (time.perf_counter() - start) * 1000
+        return self.snapshot
+    
+    def _build_mount_view(self, name, mount_info):
+        info = mount_info.to_dict()
+        return info, {
+            'mount_name': name,
+            'ip_address': mount_info.ip_address,
+            'uptime': mount_info.uptime,
+            'data_count': info['data_count'],
+            'total_bytes': info['total_bytes'],
+            'total_messages': info['total_messages'],
+            'data_rate': info['data_rate'],
+            'user_count': self.mount_connection_count.get(name, 0),
+            'status': mount_info.status,
+            'str_generated': mount_info.final_str_generated
+        }, mount_info
+    
+    def get_snapshot(self):
+        """获取最近发布的只读快照"""
+        return self.snapshot
+    
+    def get_view(self):
+        """获取带实时计数的读模型
+
+        快照版本未变且距上次合成不到SNAPSHOT_INTERVAL时直接复用；否则逐条比较计数，
+        只为计数变化的条目重新合成字典，其余条目沿用上次合成的字典，没有条目变化时复用上次的读模型。
+        """
+        snapshot = self.snapshot
+        view = self._view
+        now = time.time()
+        if view is not None and view.version == snapshot.version and now - view.created < SNAPSHOT_INTERVAL:
+            return view
+        
+        with self._view_lock:
+            start = time.perf_counter()
+            view = self._view
+            mount_cache = {}
+            session_cache = {}
+            user_cache = {}
+            rebuilt = 0
+            for name, item in snapshot.mounts.items():
+                info, entry, mount_info = item
+                stats = mount_info.stats
+                last = stats.last_data_time
+                idle = now - (mount_info.connect_time if last is None else last)
+                # 停止接收后速率仍在衰减，每次按当前时刻重算；衰减完后只按分钟刷新运行时间
+                key = (stats.total_bytes, now if idle < RATE_DECAY_HORIZON else int(idle // 60))
+                cached = self._mount_cache.get(name)
+                if cached is None or cached[0] is not item or cached[1] != key:
+                    current = stats.snapshot(now)
+                    # 覆盖已有键不改变键的顺序，结果与MountInfo.to_dict()一致
+                    cached = (item, key,
+                              {**info, 'total_bytes': current['total_bytes'],
+                               'total_messages': current['total_messages'], 'data_rate': current['rate_10s'],
+                               'data_count': current['data_count'], 'last_data_time': current['last_data_time'],
+                               'stats': current},
+                              {**entry, 'uptime': now - mount_info.connect_time, 'data_count': current['data_count'],
+                               'total_bytes': current['total_bytes'], 'total_messages': current['total_messages'],
+                               'data_rate': current['rate_10s']})
+                    rebuilt += 1
+                mount_cache[name] = cached
+            for username, sessions in snapshot.users.items():
+                cached_user = self._user_cache.get(username)
+                changed = cached_user is None or cached_user[0] is not sessions
+                for item in sessions:
+                    info, entry, session = item
+                    cached = self._session_cache.get(session.connection_id)
+                    if (cached is None or cached[0] is not item or cached[1] != session.bytes_sent
+                            or cached[2] != session.last_seen):
+                        cached = (item, session.bytes_sent, session.last_seen,
+                                  {**info, 'last_activity': session.last_seen, 'bytes_sent': session.bytes_sent},
+                                  {**entry, 'bytes_sent': session.bytes_sent})
+                        rebuilt += 1
+                        changed = True
+                    session_cache[session.connection_id] = cached
+                if changed:
+                    cached_user = (sessions, [session_cache[s.connection_id][3] for _, _, s in sessions],
+                                   [session_cache[s.connection_id][4] for _, _, s in sessions])
+                user_cache[username] = cached_user
+            self._mount_cache = mount_cache
+            self._session_cache = session_cache
+            self._user_cache = user_cache
+            
+            if view is not None and not rebuilt and view.version == snapshot.version:
+                view = view._replace(created=now)
+            else:
+                user_stats = list(itertools.chain.from_iterable(cached[2] for cached in user_cache.values()))
+                view = ConnectionView(
+                    version=snapshot.version,
+                    created=now,
+                    mounts={name: cached[2] for name, cached in mount_cache.items()},
+                    users={username: cached[1] for username, cached in user_cache.items()},
+                    statistics={
+                        'total_mounts': len(mount_cache),
+                        'total_users': len(user_stats),
+                        'mounts': [cached[3] for cached in mount_cache.values()],
+                        'users': user_stats
+                    }
+                )
+            self._view = view
+            self.snapshot_stats['views_built'] += 1
+            self.snapshot_stats['view_entries_rebuilt'] += rebuilt
+            self.snapshot_stats['last_view_ms'] = (time.perf_counter() - start) * 1000
+            return view
+        
         
     def print_active_connections(self):
         """实时打印当前所有活跃的NTRIP连接信息"""
@@ -155,47 +570,9 @@ class ConnectionManager:
         self.print_active_connections()
     
     def cleanup_zombie_connections(self):
-        """清理僵尸连接 - 检查系统层面socket状态"""
-        import subprocess
-        import re
-        
-        try:
-            # 获取系统层面的socket连接状态
-            result = subprocess.run(['netstat', '-an'], capture_output=True, text=True, shell=True)
-            if result.returncode != 0:
-                log_warning("无法获取系统socket状态")
-                return
-            
-            # 解析ESTABLISHED连接
-            established_ips = set()
-            for line in result.stdout.split('\n'):
-                if ':2101' in line and 'ESTABLISHED' in line:
-                    # 提取远程IP地址
-                    match = re.search(r'(\d+\.\d+\.\d+\.\d+):(\d+)\s+ESTABLISHED', line)
-                    if match:
-                        remote_ip = match.group(1)
-                        established_ips.add(remote_ip)
-            
-            # 检查应用层连接状态
-            with self.mount_lock:
-                zombie_mounts = []
-                for mount_name, mount_info in self.online_mounts.items():
-                    if mount_info.ip_address not in established_ips:
-                        zombie_mounts.append(mount_name)
-                        log_warning(f"检测到僵尸连接: 挂载点 {mount_name}, IP {mount_info.ip_address}")
-                
-                # 清理僵尸连接
-                for mount_name in zombie_mounts:
-                    log_info(f"清理僵尸连接: {mount_name}")
-                    self.remove_mount_connection(mount_name, "僵尸连接清理")
-                
-                if zombie_mounts:
-                    log_info(f"已清理 {len(zombie_mounts)} 个僵尸连接")
-                else:
-                    log_debug("未发现僵尸连接")
-                    
-        except Exception as e:
-            log_error(f"清理僵尸连接时发生异常: {e}", exc_info=True)
+        """清理僵尸连接 - 基于socket的TCP_INFO状态和最后数据时间，由liveness巡检线程定期执行"""
+        from . import liveness
+        return liveness.sweep()
     
     def add_mount_connection(self, mount_name, ip_address, user_agent="", protocol_version="1.0", client_socket=None):
         """添加挂载点连接上传端"""
@@ -203,7 +580,9 @@ class ConnectionManager:
             if mount_name in self.online_mounts:
                 log_debug(f"挂载点 {mount_name} 仍在线程表中，可能是相同IP重复连接的清理过程")
                
+                self._cancel_mount_timers(self.online_mounts[mount_name])
                 del self.online_mounts[mount_name]
+                spatial.remove_mount_position(mount_name)
             
             log_debug(f"开始创建挂载点连接 - 名称: {mount_name}, IP: {ip_address}, User-Agent: {user_agent}, 协议版本: {protocol_version}")
             
@@ -218,6 +597,8 @@ class ConnectionManager:
             
             # 添加到在线挂载点表
             self.online_mounts[mount_name] = mount_info
+            self.sourcetable_version += 1
+            self._mark_mount(mount_name)
             log_debug(f"挂载点 {mount_name} 已添加到在线列表，当前在线挂载点数量: {len(self.online_mounts)}")
             
             # 生成初始STR表
@@ -226,6 +607,9 @@ class ConnectionManager:
             # 启动STR修正解析流程
             self.start_str_correction(mount_name)
             
+            if config.MOUNT_TIMEOUT > 0:
+                self._arm_idle_timer(mount_info, config.MOUNT_TIMEOUT)
+            
             log_info(f"挂载点 {mount_name} 已上线，IP: {ip_address}当前在线挂载点数量: {len(self.online_mounts)}")
             log_debug(f"挂载点 {mount_name} 连接成功，初始状态: {mount_info.status}, 连接时间: {mount_info.connect_datetime}")
             
@@ -233,11 +617,18 @@ class ConnectionManager:
             
             return True, "Mount point connected successfully"
     
-    def remove_mount_connection(self, mount_name, reason="主动断开"):
-        """移除挂载点连接（上传端断开）"""
+    def remove_mount_connection(self, mount_name, reason="主动断开", client_socket=None):
+        """移除挂载点连接（上传端断开）
+        
+        client_socket不为None时只在挂载点仍是该socket的连接时移除，避免误删已重连的挂载点
+        """
         with self.mount_lock:
             if mount_name in self.online_mounts:
                 mount_info = self.online_mounts[mount_name]
+                if client_socket is not None and mount_info.client_socket is not client_socket:
+                    log_debug(f"挂载点 {mount_name} 已由新连接接管，跳过移除")
+                    return False
+                self._cancel_mount_timers(mount_info)
                 
                 # 强制关闭socket
                 if mount_info.client_socket:
@@ -258,6 +649,9 @@ class ConnectionManager:
                     actual_reason = "异常离线"
                 
                 del self.online_mounts[mount_name]
+                spatial.remove_mount_position(mount_name)
+                self.sourcetable_version += 1
+                self._mark_mount(mount_name)
                 
                 log_info(f"挂载点 {mount_name} 已下线，连接时长: {mount_info.uptime:.1f}秒，原因: {actual_reason}")
                 log_debug(f"挂载点 {mount_name} 移除完成，剩余在线挂载点数量: {len(self.online_mounts)}")
@@ -268,45 +662,33 @@ class ConnectionManager:
                 log_debug(f"尝试移除不存在的挂载点: {mount_name}")
                 return False
     
+    def _arm_idle_timer(self, mount_info, delay):
+        mount_info.idle_timer = timerwheel.schedule(delay, self._check_mount_idle, mount_info)
+    
+    def _check_mount_idle(self, mount_info):
+        """无数据超时检查：超过MOUNT_TIMEOUT未收到数据的挂载点下线，否则按最后数据时间重新定时"""
+        with self.mount_lock:
+            mount_name = mount_info.mount_name
+            if self.online_mounts.get(mount_name) is not mount_info:
+                return
+            idle = mount_info.idle_time
+            if idle < config.MOUNT_TIMEOUT:
+                self._arm_idle_timer(mount_info, config.MOUNT_TIMEOUT - idle)
+                return
+            log_warning(f"挂载点 {mount_name} 已 {idle:.0f} 秒未收到数据，超过 {config.MOUNT_TIMEOUT} 秒，强制下线")
+            self.remove_mount_connection(mount_name, f"{idle:.0f}秒未收到数据")
+    
+    def _cancel_mount_timers(self, mount_info):
+        from . import strfix
+        timerwheel.cancel(mount_info.idle_timer)
+        mount_info.idle_timer = None
+        # 排队或正在解析的STR修正随本次连接作废
+        strfix.cancel(mount_info)
+    
     def _generate_initial_str(self, mount_name: str):
         """生成初始STR表"""
         parse_result = {}  
         self._process_str_data(mount_name, parse_result, mode="initial")
-    def _update_message_statistics(self, mount_name: str, parsed_messages, data_size: int) -> bool:
-        """更新挂载点基本统计信息"""
-        if mount_name not in self.online_mounts:
-            log_debug(f"统计更新失败 - 挂载点 {mount_name} 不在线")
-            return False
-        
-        mount_info = self.online_mounts[mount_name]
-        current_time = time.time()
-        old_total_bytes = mount_info.total_bytes
-        old_data_rate = mount_info.data_rate
-        
-        with self.mount_lock:
-            
-            mount_info.last_update = current_time
-            mount_info.last_data_time = current_time
-            mount_info.total_bytes += data_size
-            mount_info.data_count += 1
-            
-            uptime = mount_info.uptime
-            if uptime > 0:
-                mount_info.data_rate = mount_info.total_bytes / uptime
-            
-            # 移除频繁的统计更新debug日志，避免刷屏
-            # log_debug(f"挂载点 {mount_name} 统计更新: 数据包大小={data_size}B, 累计字节={mount_info.total_bytes}B (增加{data_size}B), 数据速率={mount_info.data_rate:.2f}B/s (原{old_data_rate:.2f}B/s)")
-            # log_debug(f"挂载点 {mount_name} 计数更新: 数据包数={mount_info.data_count}, 运行时间={uptime:.1f}秒, 空闲时间={mount_info.idle_time:.1f}秒")
-        
-        return True
-    
-    def update_mount_data(self, mount_name: str, data_size: int) -> bool:
-        """更新挂载点数据统计"""
-        if mount_name not in self.online_mounts:
-            return False
-        
-        return self._update_message_statistics(mount_name, None, data_size)
-    
     def get_mount_str_data(self, mount_name: str) -> Optional[str]:
         """获取挂载点的STR表数据"""
         if mount_name in self.online_mounts:
@@ -314,136 +696,81 @@ class ConnectionManager:
         return None
     
     def get_all_str_data(self) -> Dict[str, str]:
-        """获取所有挂载点的STR表数据"""
-        str_data = {}
-        with self.mount_lock:
-            for mount_name, mount_info in self.online_mounts.items():
-                if mount_info.str_data:
-                    str_data[mount_name] = mount_info.str_data
-        return str_data
+        """获取所有挂载点的STR表数据（只读快照）"""
+        return self.snapshot.str_data
 
     
-    def add_user_connection(self, username, mount_name, ip_address, user_agent="", protocol_version="1.0", client_socket=None):
-        """添加用户连接"""
+    def add_user_connection(self, session):
+        """登记流动站会话（由转发器在接入客户端时调用）"""
         with self.user_lock:
-            connection_id = f"{username}_{mount_name}_{int(time.time())}"
-            
-            socket_info = "无socket" if client_socket is None else f"端口:{getattr(client_socket, 'getpeername', lambda: ('未知', '未知'))()[1] if hasattr(client_socket, 'getpeername') else '未知'}"
-            log_debug(f"创建用户连接 - 用户: {username}, 挂载点: {mount_name}, IP: {ip_address}, {socket_info}, User-Agent: {user_agent}")
-            
-            connection_info = {
-                'connection_id': connection_id,
-                'username': username,
-                'mount_name': mount_name,
-                'ip_address': ip_address,
-                'user_agent': user_agent,
-                'protocol_version': protocol_version,
-                'connect_time': time.time(),
-                'connect_datetime': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'last_activity': time.time(),
-                'bytes_sent': 0,
-                'client_socket': client_socket
-            }
-            
-            if username not in self.online_users:
-                self.online_users[username] = []
-                log_debug(f"为新用户 {username} 创建连接列表")
-            if username not in self.user_connection_count:
-                self.user_connection_count[username] = 0
-            if mount_name not in self.mount_connection_count:
-                self.mount_connection_count[mount_name] = 0
-            
-            old_user_count = self.user_connection_count[username]
-            old_mount_count = self.mount_connection_count[mount_name]
+            session.connection_id = next(self._connection_ids)
+            self.sessions[session.connection_id] = session
+            from . import accounting
+            accounting.session_opened(session)
+            self.online_users[session.user][session.connection_id] = session
+            self.user_connection_count[session.user] += 1
+            self.mount_connection_count[session.mount] += 1
+            self._mark_user(session.user)
+            self._mark_mount(session.mount)
             
-            self.online_users[username].append(connection_info)
-            self.user_connection_count[username] += 1
-            self.mount_connection_count[mount_name] += 1
-            
-            log_info(f"用户 {username} IP: {ip_address} 已连接，从挂载点 {mount_name}开始订阅RTCM数据")
-            log_debug(f"用户连接统计更新 - 用户 {username}: {old_user_count} -> {self.user_connection_count[username]}, 挂载点 {mount_name}: {old_mount_count} -> {self.mount_connection_count[mount_name]}")
-            log_debug(f"连接ID生成: {connection_id}, 总在线用户数: {len(self.online_users)}")
-            return connection_id
+            log_info(f"用户 {session.user} IP: {session.addr[0]} 已连接，从挂载点 {session.mount}开始订阅RTCM数据")
+            log_debug(f"连接ID生成: {session.connection_id}, 总在线用户数: {len(self.online_users)}")
+            return session.connection_id
     
-    def remove_user_connection(self, username, connection_id=None, mount_name=None):
-        """移除用户连接"""
+    def remove_user_connection(self, session):
+        """移除流动站会话，会话已移除时返回False"""
         with self.user_lock:
-            if username not in self.online_users:
+            if self.sessions.get(session.connection_id) is not session:
                 return False
+            del self.sessions[session.connection_id]
+            sessions = self.online_users[session.user]
+            del sessions[session.connection_id]
+            self.mount_connection_count[session.mount] -= 1
+            self.user_connection_count[session.user] -= 1
+            if not sessions:
+                del self.online_users[session.user]
+                del self.user_connection_count[session.user]
+            self._mark_user(session.user)
+            self._mark_mount(session.mount)
+            from . import accounting
+            accounting.session_closed(session)
             
-            connections_to_remove = []
-            
-            for i, conn in enumerate(self.online_users[username]):
-                should_remove = False
-                
-                if connection_id and conn['connection_id'] == connection_id:
-                    should_remove = True
-                elif mount_name and conn['mount_name'] == mount_name:
-                    should_remove = True
-                elif not connection_id and not mount_name:
-                    should_remove = True
-                
-                if should_remove:
-                    connections_to_remove.append(i)
-                    self.mount_connection_count[conn['mount_name']] -= 1
-                    
-                    
-                    if conn.get('client_socket'):
-                        try:
-                            conn['client_socket'].close()
-                        except:
-                            pass
-                    
-                    log_info(f"用户 {username} 已从挂载点 {conn['mount_name']} 断开")
-            
-
-            for i in reversed(connections_to_remove):
-                del self.online_users[username][i]
-                self.user_connection_count[username] -= 1
-            
-            if not self.online_users[username]:
-                del self.online_users[username]
-                del self.user_connection_count[username]
-            
-            return len(connections_to_remove) > 0
+            log_info(f"用户 {session.user} 已从挂载点 {session.mount} 断开")
+            return True
     
-    def update_mount_data_stats(self, mount_name, data_size):
-        """更新挂载点数据统计"""
-        if mount_name in self.online_mounts:
-            mount_info = self.online_mounts[mount_name]
-            mount_info.data_count += 1
-            mount_info.last_data_time = time.time()
-            mount_info.total_bytes += data_size
-            uptime = mount_info.uptime
-            if uptime > 0:
-                mount_info.data_rate = mount_info.total_bytes / uptime
-    
-    def update_user_activity(self, username, connection_id, bytes_sent=0):
-        """更新用户状态"""
+    def move_user_connection(self, session, new_mount):
+        """流动站会话切换到另一个挂载点，会话已移除时返回False"""
         with self.user_lock:
-            if username not in self.online_users:
-                log_debug(f"用户状态更新失败 - 用户 {username} 不在线")
+            if self.sessions.get(session.connection_id) is not session:
                 return False
-            
-            connection_found = False
-            for conn in self.online_users[username]:
-                if conn['connection_id'] == connection_id:
-                    old_bytes = conn['bytes_sent']
-                    conn['last_activity'] = time.time()
-                    conn['bytes_sent'] += bytes_sent
-                    connection_found = True
-                    
-                    # 移除频繁的用户活动更新debug日志，避免刷屏
-                    # if bytes_sent > 0:
-                    #     log_debug(f"用户 {username} 信息更新: 连接ID={connection_id}, 本次发送={bytes_sent}B, 累计发送={conn['bytes_sent']}B (原{old_bytes}B), 挂载点={conn['mount_name']}")
-                    break
-            
-            if not connection_found:
-                log_debug(f"用户状态更新失败 - 连接ID {connection_id} 不存在于用户 {username}")
-                return False
-            
+            # 切换前的用量记到原挂载点
+            from . import accounting
+            accounting.session_moved(session)
+            self.mount_connection_count[session.mount] -= 1
+            self._mark_mount(session.mount)
+            session.mount = sys.intern(new_mount)
+            self.mount_connection_count[session.mount] += 1
+            self._mark_mount(session.mount)
+            self._mark_user(session.user)
             return True
     
+    def get_user_sessions(self, username, mount_name=None):
+        """获取用户的会话列表，可按挂载点过滤"""
+        with self.user_lock:
+            sessions = self.online_users.get(username)
+            if not sessions:
+                return []
+            return [s for s in sessions.values() if mount_name is None or s.mount == mount_name]
+    
+    def get_session(self, connection_id):
+        """按连接ID获取在线会话，不存在时返回None"""
+        return self.sessions.get(connection_id)
+    
+    def get_mount_stats(self, mount_name):
+        """获取在线挂载点的统计记录（MountStats），由上传线程在接收数据时直接更新"""
+        mount_info = self.online_mounts.get(mount_name)
+        return mount_info.stats if mount_info else None
+    
     def is_mount_online(self, mount_name):
         """检查挂载点是否在线"""
         with self.mount_lock:
@@ -458,8 +785,8 @@ class ConnectionManager:
         with self.user_lock:
             if username in self.online_users and self.online_users[username]:
                 
-                latest_connection = max(self.online_users[username], key=lambda x: x['connect_time'])
-                return latest_connection['connect_datetime']
+                latest_connection = max(self.online_users[username].values(), key=lambda x: x.connected_at)
+                return latest_connection.connect_datetime
             return None
     
     def get_mount_connection_count(self, mount_name):
@@ -467,14 +794,12 @@ class ConnectionManager:
         return self.mount_connection_count.get(mount_name, 0)
     
     def get_online_mounts(self):
-        """获取在线挂载点列表"""
-        with self.mount_lock:
-            return {name: info.to_dict() for name, info in self.online_mounts.items()}
+        """获取在线挂载点列表（只读读模型）"""
+        return self.get_view().mounts
     
     def get_online_users(self):
-        """获取在线用户列表"""
-        with self.user_lock:
-            return dict(self.online_users)
+        """获取在线用户列表（只读读模型）"""
+        return self.get_view().users
     
     def get_mount_info(self, mount_name):
         """获取挂载点信息"""
@@ -484,7 +809,7 @@ class ConnectionManager:
     
     def get_user_connections(self, username):
         """获取用户连接信息"""
-        return self.online_users.get(username, [])
+        return [s.to_dict() for s in self.get_user_sessions(username)]
     
     def get_mount_statistics(self, mount_name: str) -> Optional[Dict[str, Any]]:
         """获取挂载点统计信息"""
@@ -492,14 +817,14 @@ class ConnectionManager:
             return None
         
         mount_info = self.online_mounts[mount_name]
-        return {
+        statistics = mount_info.stats.snapshot()
+        statistics.update({
             'mount_name': mount_name,
             'status': mount_info.status,
             'uptime': mount_info.uptime,
-            'total_bytes': mount_info.total_bytes,
-            'data_rate': mount_info.data_rate,
-            'data_count': mount_info.data_count
-        }
+            'data_rate': statistics['rate_10s']
+        })
+        return statistics
     
     def generate_mount_list(self):
         """生成挂载点列表数据"""
@@ -536,90 +861,27 @@ class ConnectionManager:
                     ]
                     mount_info_str = ';'.join(mount_data)
                     mount_list.append(mount_info_str)
-                    log_info(f"已为挂载点 {mount_name} 创建STR: {mount_info_str}", 'connection_manager')
+                    log_debug(f"已为挂载点 {mount_name} 创建默认STR: {mount_info_str}", 'connection_manager')
         
         return mount_list
     
+    def get_sourcetable_snapshot(self):
+        """获取源表版本号和挂载点STR列表的一致快照"""
+        with self.mount_lock:
+            return self.sourcetable_version, self.generate_mount_list()
+    
     def get_statistics(self):
-        """获取总体统计信息"""
-        with self.mount_lock, self.user_lock:
-            total_mounts = len(self.online_mounts)
-            total_users = sum(len(connections) for connections in self.online_users.values())
-            
-            mount_stats = []
-            for mount_name, mount_info in self.online_mounts.items():
-                mount_stats.append({
-                    'mount_name': mount_name,
-                    'ip_address': mount_info.ip_address,
-                    'uptime': mount_info.uptime,
-                    'data_count': mount_info.data_count,
-                    'total_bytes': mount_info.total_bytes,
-                    'total_messages': mount_info.total_messages,
-                    'data_rate': mount_info.data_rate,
-                    'user_count': self.mount_connection_count.get(mount_name, 0),
-                    'status': mount_info.status,
-                    'str_generated': mount_info.final_str_generated
-                })
-            
-            user_stats = []
-            for username, connections in self.online_users.items():
-                for conn in connections:
-                    user_stats.append({
-                        'username': username,
-                        'mount_name': conn['mount_name'],
-                        'ip_address': conn['ip_address'],
-                        'connect_time': conn['connect_time'],
-                        'bytes_sent': conn['bytes_sent']
-                    })
-            
-            return {
-                'total_mounts': total_mounts,
-                'total_users': total_users,
-                'mounts': mount_stats,
-                'users': user_stats
-            }
+        """获取总体统计信息（只读读模型）"""
+        return self.get_view().statistics
     
     def start_str_correction(self, mount_name: str):
-        """启动30秒RTCM解析并修正STR"""
-        if mount_name not in self.online_mounts:
+        """提交STR修正：由strfix调度器排队，按并发上限启动RTCM解析后修正STR"""
+        mount_info = self.online_mounts.get(mount_name)
+        if mount_info is None:
             log_warning(f"无法启动STR修正，挂载点 {mount_name} 不在线")
             return
-
-        success = rtcm_manager.start_parser(
-            mount_name=mount_name,
-            mode="str_fix",
-            duration=30
-        )
-        
-        if not success:
-            log_error(f"启动STR修正解析失败 [挂载点: {mount_name}]")
-            return
-            
-        log_info(f"已启动STR修正解析 [挂载点: {mount_name}]，将在30秒后修正STR表")
-        
-        
-        def wait_and_correct():
-            log_debug(f"开始等待STR修正完成 [挂载点: {mount_name}]")
-            time.sleep(35)  
-            log_debug(f"等待完成，开始获取解析结果 [挂载点: {mount_name}]")
-            
-            parse_result = rtcm_manager.get_result(mount_name)
-            log_debug(f"获取到解析结果 [挂载点: {mount_name}]: {parse_result is not None}")
-            
-            if parse_result:
-                log_debug(f"解析结果内容 [挂载点: {mount_name}]: {parse_result}")
-                
-                self._process_str_data(mount_name, parse_result, mode="correct")
-            else:
-                log_warning(f"未获取到STR修正解析结果 [挂载点: {mount_name}]")
-                log_debug(f"STR修正失败 - 挂载点: {mount_name}, 可能原因: 解析超时、数据不足或解析器异常")
-            
-            
-            log_debug(f"停止解析器 [挂载点: {mount_name}]")
-            rtcm_manager.stop_parser(mount_name)
-            log_debug(f"STR修正流程完成 [挂载点: {mount_name}]")
-        
-        threading.Thread(target=wait_and_correct, daemon=True).start()
+        from . import strfix
+        strfix.submit(mount_info)
 
     def _process_str_data(self, mount_name: str, parse_result: dict, mode: str = "correct"):
         """统一的STR处理函数：支持初始生成、修正和重新生成模式
@@ -665,7 +927,15 @@ class ConnectionManager:
             log_debug(f"处理后STR [挂载点: {mount_name}]: {processed_str}")
            
             
-            mount_info.str_data = processed_str
+            if processed_str != original_str:
+                mount_info.str_data = processed_str
+                self.sourcetable_version += 1
+            
+            # 解析到基站坐标(1005/1006)后加入空间索引，供虚拟最近挂载点查询
+            if parse_result.get("lat") and parse_result.get("lon"):
+                mount_info.lat = parse_result["lat"]
+                mount_info.lon = parse_result["lon"]
+                spatial.update_mount_position(mount_name, mount_info.lat, mount_info.lon)
             if mode == "initial":
                 mount_info.initial_str_generated = True
             else:
@@ -682,6 +952,7 @@ class ConnectionManager:
                 log_info(f"[挂载点: {mount_name}]STR已生成: {processed_str}")
             
             log_debug(f"STR处理流程结束 [挂载点: {mount_name}]，模式: {mode}, 最终状态: final_str_generated={mount_info.final_str_generated}")
+            self._mark_mount(mount_name)
     
     
     def _create_initial_str_parts(self, mount_name: str, parse_result: dict) -> list:
@@ -808,17 +1079,21 @@ def remove_mount_connection(mount_name):
     """移除挂载点连接"""
     return get_connection_manager().remove_mount_connection(mount_name)
 
-def add_user_connection(username, mount_name, ip_address, user_agent="", protocol_version="1.0", client_socket=None):
-    """添加用户连接"""
-    return get_connection_manager().add_user_connection(username, mount_name, ip_address, user_agent, protocol_version, client_socket)
+def add_user_connection(session):
+    """登记流动站会话"""
+    return get_connection_manager().add_user_connection(session)
 
-def remove_user_connection(username, connection_id=None, mount_name=None):
-    """移除用户连接"""
-    return get_connection_manager().remove_user_connection(username, connection_id, mount_name)
+def remove_user_connection(session):
+    """移除流动站会话"""
+    return get_connection_manager().remove_user_connection(session)
 
-def update_user_activity(username, connection_id, bytes_sent=0):
-    """更新用户活动"""
-    return get_connection_manager().update_user_activity(username, connection_id, bytes_sent)
+def get_session(connection_id):
+    """按连接ID获取在线会话"""
+    return get_connection_manager().get_session(connection_id)
+
+def move_user_connection(session, new_mount):
+    """流动站会话切换挂载点"""
+    return get_connection_manager().move_user_connection(session, new_mount)
 
 def is_mount_online(mount_name):
     """检查挂载点是否在线"""
@@ -828,13 +1103,9 @@ def get_user_connection_count(username):
     """获取用户连接数"""
     return get_connection_manager().get_user_connection_count(username)
 
-def update_mount_data(mount_name, data_size):
-    """更新挂载点数据"""
-    return get_connection_manager().update_mount_data(mount_name, data_size)
-
-def update_mount_data_stats(mount_name, data_size):
-    """更新挂载点数据统计"""
-    return get_connection_manager().update_mount_data_stats(mount_name, data_size)
+def get_mount_stats(mount_name):
+    """获取挂载点统计记录"""
+    return get_connection_manager().get_mount_stats(mount_name)
 
 def get_statistics():
     """获取统计信息"""
@@ -4,6 +4,8 @@ import sqlite3
 import hashlib
 import secrets
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 from threading import Lock
 from . import config
 from . import logger
@@ -33,6 +35,122 @@ def verify_password(stored_password, provided_password):
     
     return key.hex() == hash_value
 
+def _migration_mounts_user_id_index(c):
+    """为mounts.user_id建立索引，删除用户时解绑挂载点不再全表扫描"""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_mounts_user_id ON mounts(user_id)")
+
+def _migration_mounts_location(c):
+    """为mounts表补充可选的lat/lon列"""
+    c.execute("PRAGMA table_info(mounts)")
+    columns = {column[1] for column in c.fetchall()}
+    if 'lat' not in columns:
+        c.execute("ALTER TABLE mounts ADD COLUMN lat REAL")
+    if 'lon' not in columns:
+        c.execute("ALTER TABLE mounts ADD COLUMN lon REAL")
+
+def _migration_mount_metadata(c):
+    """挂载点元数据表：STR修正解析得到的位置、设备、消息类型等信息，重连或重启后直接套用"""
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS mount_metadata (
+        mount TEXT PRIMARY KEY,
+        station_id INTEGER,
+        fingerprint TEXT NOT NULL,
+        metadata TEXT NOT NULL,
+        verified_at REAL NOT NULL
+    )
+    ''')
+
+def _migration_usage_tables(c):
+    """用量计费表：流动站会话记录和按小时、用户、挂载点汇总的用量"""
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS usage_sessions (
+        id INTEGER PRIMARY KEY,
+        username TEXT NOT NULL,
+        mount TEXT NOT NULL,
+        ip TEXT NOT NULL,
+        port INTEGER NOT NULL,
+        connect_time REAL NOT NULL,
+        disconnect_time REAL,
+        last_update REAL NOT NULL,
+        bytes_sent INTEGER NOT NULL DEFAULT 0,
+        UNIQUE (username, ip, port, connect_time)
+    )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_usage_sessions_connect_time ON usage_sessions(connect_time)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_usage_sessions_open ON usage_sessions(disconnect_time) WHERE disconnect_time IS NULL")
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS usage_hourly (
+        hour INTEGER NOT NULL,
+        username TEXT NOT NULL,
+        mount TEXT NOT NULL,
+        bytes_sent INTEGER NOT NULL DEFAULT 0,
+        seconds REAL NOT NULL DEFAULT 0,
+        sessions INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (hour, username, mount)
+    )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_usage_hourly_username ON usage_hourly(username, hour)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_usage_hourly_mount ON usage_hourly(mount, hour)")
+
+# 结构迁移列表: (版本号, 描述, 迁移函数)，版本号严格递增，已发布的迁移不要修改
+SCHEMA_MIGRATIONS = [
+    (1, 'mounts.user_id索引', _migration_mounts_user_id_index),
+    (2, 'mounts表增加lat/lon列', _migration_mounts_location),
+    (3, 'mount_metadata表', _migration_mount_metadata),
+    (4, 'usage_sessions/usage_hourly用量表', _migration_usage_tables),
+]
+
+# 启动时探测到的表结构
+_schema_caps = {
+    'loaded': False,
+    'version': 0,
+    'mount_columns': frozenset(),
+}
+
+def _get_schema_version(c):
+    """读取当前数据库结构版本，版本表不存在时创建"""
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    c.execute("SELECT MAX(version) FROM schema_migrations")
+    result = c.fetchone()
+    return result[0] if result and result[0] is not None else 0
+
+def _apply_migrations(c):
+    """按版本顺序执行尚未应用的迁移，迁移与版本记录在同一事务中提交"""
+    conn = c.connection
+    conn.commit()
+    current_version = _get_schema_version(c)
+    for version, description, migrate in SCHEMA_MIGRATIONS:
+        if version <= current_version:
+            continue
+        try:
+            migrate(c)
+            c.execute("INSERT INTO schema_migrations (version, description) VALUES (?, ?)", (version, description))
+            conn.commit()
+            current_version = version
+            log_database_operation('migrate', 'schema_migrations', True, f'v{version} {description}')
+        except Exception as e:
+            conn.rollback()
+            log_database_operation('migrate', 'schema_migrations', False, f'v{version} {description}: {e}')
+            raise
+    return current_version
+
+def _load_schema_capabilities(c):
+    """探测并缓存表结构"""
+    c.execute("PRAGMA table_info(mounts)")
+    _schema_caps['mount_columns'] = frozenset(column[1] for column in c.fetchall())
+    _schema_caps['version'] = _get_schema_version(c)
+    _schema_caps['loaded'] = True
+
+def get_schema_version():
+    """获取启动时探测到的数据库结构版本"""
+    return _schema_caps['version']
+
 def init_db():
     """初始化SQLite数据库表结构"""
     with db_lock:
@@ -70,6 +188,12 @@ def init_db():
         )
         ''')
         
+        # 按版本执行结构迁移（索引、可选列等）
+        _apply_migrations(c)
+
+        # 启动时一次性探测表结构，避免每次查询都执行PRAGMA
+        _load_schema_capabilities(c)
+
         c.execute("SELECT * FROM admins")
         if not c.fetchone():
             # 使用哈希密码存储默认管理员密码
@@ -378,9 +502,11 @@ def get_all_mounts():
         conn = sqlite3.connect(config.DATABASE_PATH)
         c = conn.cursor()
         try:
-            c.execute("PRAGMA table_info(mounts)")
-            columns = [column[1] for column in c.fetchall()]
-            
+            # 未经init_db的进程（如命令行工具）首次使用时探测一次
+            if not _schema_caps['loaded']:
+                _load_schema_capabilities(c)
+            columns = _schema_caps['mount_columns']
+
             if 'lat' in columns and 'lon' in columns:
                 c.execute("""SELECT m.id, m.mount, m.password, m.user_id, u.username, m.lat, m.lon
                              FROM mounts m 
@@ -394,6 +520,353 @@ def get_all_mounts():
             conn.close()
 
 
+def get_user_id(username):
+    """按用户名查找用户ID（走users.username唯一索引）"""
+    with db_lock:
+        conn = sqlite3.connect(config.DATABASE_PATH)
+        c = conn.cursor()
+        try:
+            c.execute("SELECT id FROM users WHERE username = ?", (username,))
+            result = c.fetchone()
+            return result[0] if result else None
+        finally:
+            conn.close()
+
+def get_mount_id(mount):
+    """按挂载点名称查找挂载点ID（走mounts.mount唯一索引）"""
+    with db_lock:
+        conn = sqlite3.connect(config.DATABASE_PATH)
+        c = conn.cursor()
+        try:
+            c.execute("SELECT id FROM mounts WHERE mount = ?", (mount,))
+            result = c.fetchone()
+            return result[0] if result else None
+        finally:
+            conn.close()
+
+# ==================== 挂载点元数据 ====================
+
+def load_mount_metadata():
+    """读取全部挂载点元数据: [(挂载点, 基准站ID, 帧头指纹JSON, 元数据JSON, 校验时间)]"""
+    with db_lock:
+        conn = sqlite3.connect(config.DATABASE_PATH)
+        c = conn.cursor()
+        try:
+            c.execute("SELECT mount, station_id, fingerprint, metadata, verified_at FROM mount_metadata")
+            return c.fetchall()
+        finally:
+            conn.close()
+
+def save_mount_metadata(mount, station_id, fingerprint, metadata, verified_at):
+    """保存挂载点元数据（同名挂载点覆盖）"""
+    with db_lock:
+        conn = sqlite3.connect(config.DATABASE_PATH)
+        c = conn.cursor()
+        try:
+            c.execute("""INSERT OR REPLACE INTO mount_metadata (mount, station_id, fingerprint, metadata, verified_at)
+                         VALUES (?, ?, ?, ?, ?)""", (mount, station_id, fingerprint, metadata, verified_at))
+            conn.commit()
+            log_database_operation('save_mount_metadata', 'mount_metadata', True, f'挂载点: {mount}')
+            return True
+        except Exception as e:
+            log_database_operation('save_mount_metadata', 'mount_metadata', False, str(e))
+            return False
+        finally:
+            conn.close()
+
+# ==================== 用量计费 ====================
+
+def write_usage_batch(sessions, hourly):
+    """在一个事务中写入一批会话记录和小时汇总
+
+    Args:
+        sessions: [(用户名, 挂载点, IP, 端口, 连接时间, 断开时间或None, 更新时间, 累计字节数)]，
+                  同一会话重复写入时覆盖为较新的记录
+        hourly: [(小时起点, 用户名, 挂载点, 字节数增量, 在线秒数增量, 新会话数)]，与已有汇总相加
+    """
+    with db_lock:
+        conn = sqlite3.connect(config.DATABASE_PATH)
+        c = conn.cursor()
+        try:
+            # 平滑重启时新旧进程会写同一会话，按更新时间保留较新的断开状态
+            c.executemany("""INSERT INTO usage_sessions
+                                 (username, mount, ip, port, connect_time, disconnect_time, last_update, bytes_sent)
+                             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                             ON CONFLICT (username, ip, port, connect_time) DO UPDATE SET
+                                 mount = CASE WHEN excluded.last_update >= last_update THEN excluded.mount ELSE mount END,
+                                 disconnect_time = CASE WHEN excluded.last_update >= last_update
+                                                        THEN excluded.disconnect_time ELSE disconnect_time END,
+                                 last_update = MAX(last_update, excluded.last_update),
+                                 bytes_sent = MAX(bytes_sent, excluded.bytes_sent)""", sessions)
+            c.executemany("""INSERT INTO usage_hourly (hour, username, mount, bytes_sent, seconds, sessions)
+                             VALUES (?, ?, ?, ?, ?, ?)
+                             ON CONFLICT (hour, username, mount) DO UPDATE SET
+                                 bytes_sent = bytes_sent + excluded.bytes_sent,
+                                 seconds = seconds + excluded.seconds,
+                                 sessions = sessions + excluded.sessions""", hourly)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+def close_stale_usage_sessions():
+    """启动时把上次未正常断开（进程崩溃）的会话按最后写入时间记为断开，返回处理的会话数"""
+    with db_lock:
+        conn = sqlite3.connect(config.DATABASE_PATH)
+        c = conn.cursor()
+        try:
+            c.execute("UPDATE usage_sessions SET disconnect_time = last_update WHERE disconnect_time IS NULL")
+            conn.commit()
+            return c.rowcount
+        finally:
+            conn.close()
+
+def _usage_filters(username, mount, conditions, params):
+    if username:
+        conditions.append("username = ?")
+        params.append(username)
+    if mount:
+        conditions.append("mount = ?")
+        params.append(mount)
+
+def query_usage_hourly(username=None, mount=None, start=None, end=None):
+    """查询小时汇总: [(小时起点, 用户名, 挂载点, 字节数, 在线秒数, 会话数)]，start/end按小时起点过滤"""
+    conditions, params = [], []
+    _usage_filters(username, mount, conditions, params)
+    if start is not None:
+        conditions.append("hour >= ?")
+        params.append(int(start // 3600 * 3600))
+    if end is not None:
+        conditions.append("hour < ?")
+        params.append(end)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+    with db_lock:
+        conn = sqlite3.connect(config.DATABASE_PATH)
+        c = conn.cursor()
+        try:
+            c.execute(f"""SELECT hour, username, mount, bytes_sent, seconds, sessions FROM usage_hourly{where}
+                          ORDER BY hour, username, mount""", params)
+            return c.fetchall()
+        finally:
+            conn.close()
+
+def query_usage_sessions(username=None, mount=None, start=None, end=None, limit=1000):
+    """查询与[start, end)有重叠的会话记录，按连接时间倒序:
+    [(用户名, 挂载点, IP, 端口, 连接时间, 断开时间或None, 更新时间, 字节数)]"""
+    conditions, params = [], []
+    _usage_filters(username, mount, conditions, params)
+    if start is not None:
+        conditions.append("(disconnect_time IS NULL OR disconnect_time >= ?)")
+        params.append(start)
+    if end is not None:
+        conditions.append("connect_time < ?")
+        params.append(end)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+    with db_lock:
+        conn = sqlite3.connect(config.DATABASE_PATH)
+        c = conn.cursor()
+        try:
+            c.execute(f"""SELECT username, mount, ip, port, connect_time, disconnect_time, last_update, bytes_sent
+                          FROM usage_sessions{where} ORDER BY connect_time DESC LIMIT ?""", params + [limit])
+            return c.fetchall()
+        finally:
+            conn.close()
+
+# ==================== 批量导入导出 ====================
+
+# SQLite单条语句的参数上限为999，IN查询按此分片
+_SQL_IN_CHUNK = 500
+
+def _hash_passwords_parallel(passwords, workers=None):
+    """并行哈希密码，PBKDF2在hashlib中会释放GIL，线程池即可利用多核"""
+    if not passwords:
+        return []
+    workers = workers or min(32, (os.cpu_count() or 1) * 2)
+    if workers <= 1 or len(passwords) < 64:
+        return [hash_password(p) for p in passwords]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(hash_password, passwords, chunksize=64))
+
+def _select_existing(c, sql_prefix, values):
+    """分片执行 IN 查询，返回已存在的值集合"""
+    existing = set()
+    values = list(values)
+    for i in range(0, len(values), _SQL_IN_CHUNK):
+        chunk = values[i:i + _SQL_IN_CHUNK]
+        placeholders = ','.join('?' * len(chunk))
+        c.execute(f"{sql_prefix} ({placeholders})", chunk)
+        existing.update(row[0] for row in c.fetchall())
+    return existing
+
+def bulk_add_users(rows, workers=None):
+    """批量添加用户，单事务executemany写入
+
+    Args:
+        rows: 可迭代的 (行号, 用户名, 密码)
+        workers: 密码哈希线程数，None为自动
+
+    Returns:
+        tuple: (是否全部成功, 报告字典 {'added': 数量, 'errors': [{'row', 'name', 'error'}]})
+    """
+    errors = []
+    pending = []
+    seen = set()
+    for row_no, username, password in rows:
+        if username in seen:
+            errors.append({'row': row_no, 'name': username, 'error': '导入数据中用户名重复'})
+            continue
+        seen.add(username)
+        pending.append((row_no, username, password))
+
+    if pending:
+        # 查重只读，不持锁哈希，避免阻塞认证请求
+        conn = sqlite3.connect(config.DATABASE_PATH)
+        try:
+            existing = _select_existing(conn.cursor(), "SELECT username FROM users WHERE username IN", (r[1] for r in pending))
+        finally:
+            conn.close()
+
+        fresh = []
+        for row in pending:
+            if row[1] in existing:
+                errors.append({'row': row[0], 'name': row[1], 'error': '用户名已存在'})
+            else:
+                fresh.append(row)
+        pending = fresh
+
+    added = 0
+    if pending:
+        hashed = _hash_passwords_parallel([r[2] for r in pending], workers)
+        with db_lock:
+            conn = sqlite3.connect(config.DATABASE_PATH)
+            c = conn.cursor()
+            try:
+                c.executemany("INSERT INTO users (username, password) VALUES (?, ?)",
+                              zip((r[1] for r in pending), hashed))
+                conn.commit()
+                added = len(pending)
+                log_database_operation('bulk_add_users', 'users', True, f'导入 {added} 个用户')
+            except sqlite3.IntegrityError:
+                # 查重与写入之间有并发写入，回退为逐行插入定位冲突行
+                conn.rollback()
+                for (row_no, username, _), hashed_password in zip(pending, hashed):
+                    try:
+                        c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hashed_password))
+                        added += 1
+                    except sqlite3.IntegrityError:
+                        errors.append({'row': row_no, 'name': username, 'error': '用户名已存在'})
+                conn.commit()
+                log_database_operation('bulk_add_users', 'users', True, f'导入 {added} 个用户（逐行回退）')
+            except Exception as e:
+                conn.rollback()
+                log_database_operation('bulk_add_users', 'users', False, str(e))
+                errors.extend({'row': r[0], 'name': r[1], 'error': f'写入失败: {e}'} for r in pending)
+            finally:
+                conn.close()
+
+    errors.sort(key=lambda e: e['row'])
+    return not errors, {'added': added, 'errors': errors}
+
+def bulk_add_mounts(rows):
+    """批量添加挂载点，单事务executemany写入
+
+    Args:
+        rows: 可迭代的 (行号, 挂载点名称, 密码, 绑定用户名或None)
+
+    Returns:
+        tuple: (是否全部成功, 报告字典 {'added': 数量, 'errors': [{'row', 'name', 'error'}]})
+    """
+    errors = []
+    pending = []
+    seen = set()
+    for row_no, mount, password, username in rows:
+        if mount in seen:
+            errors.append({'row': row_no, 'name': mount, 'error': '导入数据中挂载点名称重复'})
+            continue
+        seen.add(mount)
+        pending.append((row_no, mount, password, username or None))
+
+    added = 0
+    if pending:
+        with db_lock:
+            conn = sqlite3.connect(config.DATABASE_PATH)
+            c = conn.cursor()
+            try:
+                existing = _select_existing(c, "SELECT mount FROM mounts WHERE mount IN", (r[1] for r in pending))
+                usernames = list({r[3] for r in pending if r[3]})
+                user_ids = {}
+                for i in range(0, len(usernames), _SQL_IN_CHUNK):
+                    chunk = usernames[i:i + _SQL_IN_CHUNK]
+                    c.execute(f"SELECT username, id FROM users WHERE username IN ({','.join('?' * len(chunk))})", chunk)
+                    user_ids.update(c.fetchall())
+
+                values = []
+                for row_no, mount, password, username in pending:
+                    if mount in existing:
+                        errors.append({'row': row_no, 'name': mount, 'error': '挂载点名称已存在'})
+                    elif username and username not in user_ids:
+                        errors.append({'row': row_no, 'name': mount, 'error': f'指定的用户不存在: {username}'})
+                    else:
+                        values.append((mount, password, user_ids.get(username)))
+
+                if values:
+                    c.executemany("INSERT INTO mounts (mount, password, user_id) VALUES (?, ?, ?)", values)
+                    conn.commit()
+                    added = len(values)
+                    log_database_operation('bulk_add_mounts', 'mounts', True, f'导入 {added} 个挂载点')
+            except Exception as e:
+                conn.rollback()
+                log_database_operation('bulk_add_mounts', 'mounts', False, str(e))
+                errors.extend({'row': r[0], 'name': r[1], 'error': f'写入失败: {e}'} for r in pending)
+                added = 0
+            finally:
+                conn.close()
+
+    errors.sort(key=lambda e: e['row'])
+    return not errors, {'added': added, 'errors': errors}
+
+def iter_users(batch_size=1000):
+    """流式遍历用户 (id, username)，按主键分页，每页单独持锁，不一次性加载全表"""
+    last_id = 0
+    while True:
+        with db_lock:
+            conn = sqlite3.connect(config.DATABASE_PATH)
+            try:
+                rows = conn.execute("SELECT id, username FROM users WHERE id > ? ORDER BY id LIMIT ?",
+                                    (last_id, batch_size)).fetchall()
+            finally:
+                conn.close()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1][0]
+
+def iter_mounts(batch_size=1000):
+    """流式遍历挂载点 (id, mount, username, lat, lon)，按主键分页"""
+    last_id = 0
+    while True:
+        with db_lock:
+            conn = sqlite3.connect(config.DATABASE_PATH)
+            c = conn.cursor()
+            try:
+                if not _schema_caps['loaded']:
+                    _load_schema_capabilities(c)
+                location = 'm.lat, m.lon' if {'lat', 'lon'} <= _schema_caps['mount_columns'] else 'NULL, NULL'
+                c.execute(f"""SELECT m.id, m.mount, u.username, {location}
+                              FROM mounts m
+                              LEFT JOIN users u ON m.user_id = u.id
+                              WHERE m.id > ? ORDER BY m.id LIMIT ?""", (last_id, batch_size))
+                rows = c.fetchall()
+            finally:
+                conn.close()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1][0]
+
+
 def verify_admin(username, password):
     """验证管理员账号密码"""
     with db_lock:
@@ -451,13 +924,8 @@ class DatabaseManager:
     
     def delete_user(self, username):
         """删除用户"""
-        users = get_all_users()
-        user_id = None
-        for user in users:
-            if user[1] == username:  # user[1] 是 username
-                user_id = user[0]    # user[0] 是 id
-                break
-        
+        user_id = get_user_id(username)
+
         if user_id is None:
             return False, "用户不存在"
         
@@ -466,7 +934,31 @@ class DatabaseManager:
     def get_all_users(self):
         """获取所有用户"""
         return get_all_users()
-    
+
+    def get_user_id(self, username):
+        """按用户名获取用户ID"""
+        return get_user_id(username)
+
+    def get_mount_id(self, mount):
+        """按挂载点名称获取挂载点ID"""
+        return get_mount_id(mount)
+
+    def bulk_add_users(self, rows, workers=None):
+        """批量添加用户"""
+        return bulk_add_users(rows, workers)
+
+    def bulk_add_mounts(self, rows):
+        """批量添加挂载点"""
+        return bulk_add_mounts(rows)
+
+    def iter_users(self, batch_size=1000):
+        """流式遍历用户"""
+        return iter_users(batch_size)
+
+    def iter_mounts(self, batch_size=1000):
+        """流式遍历挂载点"""
+        return iter_mounts(batch_size)
+
     def get_user_password(self, username):
         """获取用户密码，用于Digest认证"""
         with sqlite3.connect(config.DATABASE_PATH) as conn:
@@ -482,16 +974,20 @@ class DatabaseManager:
             c.execute("SELECT id FROM mounts WHERE mount = ?", (mount,))
             return c.fetchone() is not None
     
-    def verify_download_user(self, mount, username, password):
-        """验证下载用户，只验证用户名密码，不验证挂载点绑定关系"""
+    def verify_download_user(self, mount, username, password, check_mount=True):
+        """验证下载用户，只验证用户名密码，不验证挂载点绑定关系
+        
+        check_mount为False时不检查挂载点是否存在（用于虚拟挂载点）
+        """
         with sqlite3.connect(config.DATABASE_PATH) as conn:
             c = conn.cursor()
             
-            c.execute("SELECT id FROM mounts WHERE mount = ?", (mount,))
-            mount_result = c.fetchone()
-            if not mount_result:
-                logger.log_authentication(username, mount, False, 'database', '挂载点不存在')
-                return False, "挂载点不存在"
+            if check_mount:
+                c.execute("SELECT id FROM mounts WHERE mount = ?", (mount,))
+                mount_result = c.fetchone()
+                if not mount_result:
+                    logger.log_authentication(username, mount, False, 'database', '挂载点不存在')
+                    return False, "挂载点不存在"
             
             c.execute("SELECT id, password FROM users WHERE username = ?", (username,))
             user_result = c.fetchone()
@@ -540,13 +1036,8 @@ class DatabaseManager:
     
     def delete_mount(self, mount):
         """删除挂载点"""
-        mounts = self.get_all_mounts()
-        mount_id = None
-        for m in mounts:
-            if m[1] == mount:  # m[1] 是挂载点名称
-                mount_id = m[0]  # m[0] 是ID
-                break
-        
+        mount_id = get_mount_id(mount)
+
         if mount_id is None:
             return False, "挂载点不存在"
         
@@ -9,6 +9,9 @@ from threading import Lock, RLock
 from . import config
 from . import logger
 from . import connection
+from . import liveness
+from . import timerwheel
+from .uplink import UplinkReader
 
 class RingBuffer:
     """环形缓冲区"""
@@ -102,6 +105,12 @@ class RingBuffer:
             self._write_index = 0
             self._read_index = 0
     
+    def resize(self, maxlen):
+        """调整缓冲区容量，缩小时丢弃最旧的数据"""
+        with self.lock:
+            self.maxlen = maxlen
+            self.buffer = deque(self.buffer, maxlen=maxlen)
+    
     def is_full(self):
         """检查缓冲区是否已满"""
         with self.lock:
@@ -112,6 +121,25 @@ class RingBuffer:
         with self.lock:
             return len(self.buffer) == 0
 
+class FanoutStats:
+    """挂载点分发统计，只由广播线程更新，计数只增不减（读取方按差值计算每秒值）"""
+
+    __slots__ = ('deliveries', 'bytes_sent', 'latency_sum', 'latency_max')
+
+    def __init__(self):
+        self.deliveries = 0
+        self.bytes_sent = 0
+        self.latency_sum = 0.0  # 秒，数据到达缓冲区到发给流动站的时间
+        self.latency_max = 0.0
+
+    def record(self, latency, bytes_sent):
+        self.deliveries += 1
+        self.bytes_sent += bytes_sent
+        self.latency_sum += latency
+        if latency > self.latency_max:
+            self.latency_max = latency
+
+
 class SimpleDataForwarder:
     """简化的数据广播"""
     
@@ -120,15 +148,20 @@ class SimpleDataForwarder:
         self.broadcast_interval = broadcast_interval or config.BROADCAST_INTERVAL
         
         self.mount_buffers = {}  # {mount_name: RingBuffer}
+        self.fanout_stats = {}  # {mount_name: FanoutStats}
         self.buffer_lock = RLock()
         
-        self.clients = {}  # {mount_name: [client_info]}
+        self.clients = {}  # {mount_name: [ClientSession]}
         self.client_lock = RLock()
         
         self.subscribers = {}  # {mount_name: [socket_write_end]}
         self.subscriber_lock = RLock()
         
+        # 流动站上行数据读取（GGA位置）
+        self.uplink = UplinkReader(on_disconnect=self._on_uplink_closed)
+        
         self.broadcast_thread = None
+        self.health_timer = None
         self.running = False
         
         self.stats = {
@@ -139,6 +172,23 @@ class SimpleDataForwarder:
             'failed_sends': 0,
             'disconnected_clients': 0
         }
+        config.subscribe(self._apply_config_changes)
+    
+    def _apply_config_changes(self, changed):
+        """配置热加载：调整广播间隔、缓冲区容量和健康检查间隔"""
+        if 'BROADCAST_INTERVAL' in changed:
+            self.broadcast_interval = config.BROADCAST_INTERVAL
+        if 'RING_BUFFER_SIZE' in changed:
+            self.buffer_maxlen = config.RING_BUFFER_SIZE
+            with self.buffer_lock:
+                buffers = list(self.mount_buffers.values())
+            for ring_buffer in buffers:
+                ring_buffer.resize(self.buffer_maxlen)
+        if 'CLIENT_HEALTH_CHECK_INTERVAL' in changed and self.running:
+            timerwheel.cancel(self.health_timer)
+            self.health_timer = None
+            if config.CLIENT_HEALTH_CHECK_INTERVAL > 0:
+                self.health_timer = timerwheel.schedule(config.CLIENT_HEALTH_CHECK_INTERVAL, self._health_check)
     
     def start(self):
         """启动广播线程"""
@@ -148,6 +198,9 @@ class SimpleDataForwarder:
         self.running = True
         self.broadcast_thread = threading.Thread(target=self._broadcast_loop, daemon=True)
         self.broadcast_thread.start()
+        self.uplink.start()
+        if config.CLIENT_HEALTH_CHECK_INTERVAL > 0:
+            self.health_timer = timerwheel.schedule(config.CLIENT_HEALTH_CHECK_INTERVAL, self._health_check)
         logger.log_system_event('数据转发器已启动')
     
     def stop(self):
@@ -156,6 +209,8 @@ class SimpleDataForwarder:
         
         if self.broadcast_thread and self.broadcast_thread.is_alive():
             self.broadcast_thread.join(timeout=5)
+        self.uplink.stop()
+        timerwheel.cancel(self.health_timer)
         
         # 关闭所有客户端连接
         with self.client_lock:
@@ -165,49 +220,52 @@ class SimpleDataForwarder:
                     
         logger.log_system_event('数据转发器已停止')
     
-    def add_client(self, client_socket, user, mount, agent, addr, protocol_version, connection_id=None):
-        """添加客户端连接（同步方式）"""
+    def detach_clients(self):
+        """平滑重启：停止广播和上行读取，摘下所有客户端但不关闭socket（由新进程接管）"""
+        self.running = False
+        if self.broadcast_thread and self.broadcast_thread.is_alive():
+            self.broadcast_thread.join(timeout=5)
+        self.uplink.stop()
+        timerwheel.cancel(self.health_timer)
+        
+        with self.client_lock:
+            clients = [client_info for mount_clients in self.clients.values() for client_info in mount_clients]
+            self.clients = {}
+            self.stats['active_clients'] = 0
+        for client_info in clients:
+            timerwheel.cancel(client_info.timeout_timer)
+        logger.log_system_event(f'数据转发器已停止，摘下 {len(clients)} 个客户端')
+        return clients
+    
+    def add_client(self, client_socket, user, mount, agent, addr, protocol_version):
+        """添加客户端连接（同步方式），返回与连接管理器共用的ClientSession"""
         try:
             # 启用TCP Keep-Alive
             self._enable_keepalive(client_socket)
             
             client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
-            current_time = time.time()
-            client_info = {
-                'socket': client_socket,
-                'user': user,
-                'mount': mount,
-                'agent': agent,
-                'addr': addr,
-                'protocol_version': protocol_version,
-                'connection_id': connection_id,
-                'connected_at': current_time,
-                'last_seen': current_time,
-                'last_sent_timestamp': current_time,  
-                'bytes_sent': 0,
-                'messages_sent': 0,
-                'send_errors': 0
-            }
+            session = connection.ClientSession(client_socket, user, mount, agent, addr, protocol_version)
             
             with self.client_lock:
                 # 限制同用户同挂载点的连接数
-                if mount not in self.clients:
-                    self.clients[mount] = []
-                
-                user_connections = [c for c in self.clients[mount] if c['user'] == user]
+                user_connections = connection.get_connection_manager().get_user_sessions(user, mount)
                 if len(user_connections) >= config.MAX_USERS_PER_MOUNT:
                     
-                    oldest = min(user_connections, key=lambda x: x['connected_at'])
+                    oldest = min(user_connections, key=lambda x: x.connected_at)
                     self.remove_client(oldest)
                 
-                self.clients[mount].append(client_info)
+                self.clients.setdefault(mount, []).append(session)
+                connection.add_user_connection(session)
                 
                 self.stats['total_clients'] += 1
                 self.stats['active_clients'] = sum(len(clients) for clients in self.clients.values())
             
+            self.uplink.register(session)
+            if config.CLIENT_TIMEOUT > 0:
+                session.timeout_timer = timerwheel.schedule(config.CLIENT_TIMEOUT, self._check_client_timeout, session)
             logger.log_client_connect(user, mount, addr[0], protocol_version)
-            return client_info
+            return session
             
         except Exception as e:
             logger.log_error(f"添加客户端失败: {e}", exc_info=True)
@@ -241,6 +299,9 @@ class SimpleDataForwarder:
                 pass
             
             
+            # 流动站掉线后发送的数据长时间得不到确认时由内核断开，广播线程随即发送失败并移除客户端
+            liveness.apply_user_timeout(client_socket)
+            
             client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, config.BUFFER_SIZE)
             client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, config.BUFFER_SIZE)
             
@@ -250,11 +311,13 @@ class SimpleDataForwarder:
     def remove_client(self, client_info):
         """移除客户端连接"""
         try:
+            self.uplink.unregister(client_info)
+            timerwheel.cancel(client_info.timeout_timer)
             self._close_client(client_info)
             
             with self.client_lock:
                 
-                mount = client_info['mount']
+                mount = client_info.mount
                 if mount in self.clients and client_info in self.clients[mount]:
                     self.clients[mount].remove(client_info)
                     
@@ -264,25 +327,100 @@ class SimpleDataForwarder:
                 self.stats['active_clients'] = sum(len(clients) for clients in self.clients.values())
                 self.stats['disconnected_clients'] += 1
             
-            connection.remove_user_connection(
-                client_info['user'], 
-                client_info['addr'][0], 
-                client_info['mount']
-            )
-            
-            logger.log_client_disconnect(
-                client_info['user'], 
-                client_info['mount'], 
-                client_info['addr'][0]
-            )
+            if connection.remove_user_connection(client_info):
+                logger.log_client_disconnect(client_info.user, client_info.mount, client_info.addr[0])
             
         except Exception as e:
             logger.log_error(f"移除客户端失败: {e}", exc_info=True)
     
+    def move_client(self, client_info, new_mount):
+        """把客户端切换到另一个挂载点而不断开连接（虚拟挂载点重新选择基站时使用）"""
+        try:
+            with self.client_lock:
+                old_mount = client_info.mount
+                # 客户端已被remove_client移除（发送失败、超时等）时不再切换，避免已关闭的会话重新加入分发列表
+                if old_mount not in self.clients or client_info not in self.clients[old_mount]:
+                    return False
+                if not connection.move_user_connection(client_info, new_mount):
+                    return False
+                self.clients[old_mount].remove(client_info)
+                if not self.clients[old_mount]:
+                    del self.clients[old_mount]
+                
+                # 从切换时刻开始接收新挂载点的数据，避免重放旧缓冲区
+                client_info.last_sent_timestamp = time.time()
+                self.clients.setdefault(client_info.mount, []).append(client_info)
+            return True
+        except Exception as e:
+            logger.log_error(f"切换客户端挂载点失败: {e}", exc_info=True)
+            return False
+    
+    def _is_active(self, client_info):
+        with self.client_lock:
+            mount = client_info.mount
+            return mount in self.clients and client_info in self.clients[mount]
+    
+    def _check_client_timeout(self, client_info):
+        """客户端超时检查：超过CLIENT_TIMEOUT未收到任何数据时断开，否则按最后发送时间重新定时"""
+        if not self._is_active(client_info):
+            return
+        idle = time.time() - client_info.last_seen
+        if idle < config.CLIENT_TIMEOUT:
+            client_info.timeout_timer = timerwheel.schedule(config.CLIENT_TIMEOUT - idle, self._check_client_timeout, client_info)
+            return
+        logger.log_info(f"客户端 {client_info.user}@{client_info.addr[0]} 已 {idle:.0f} 秒未收到挂载点 {client_info.mount} 的数据，断开连接")
+        self.remove_client(client_info)
+    
+    def _health_check(self):
+        """定期检查下载连接的socket状态，清理已失效的连接"""
+        try:
+            with self.client_lock:
+                clients = [c for mount_clients in self.clients.values() for c in mount_clients]
+            for client_info in clients:
+                reason = liveness.check_socket(client_info.socket)
+                if reason:
+                    logger.log_info(f"客户端健康检查: {client_info.user}@{client_info.addr[0]} {reason}，移除连接")
+                    self.remove_client(client_info)
+        finally:
+            # 检查期间热加载可能已按新间隔重新调度，先取消避免重复
+            timerwheel.cancel(self.health_timer)
+            if self.running and config.CLIENT_HEALTH_CHECK_INTERVAL > 0:
+                self.health_timer = timerwheel.schedule(config.CLIENT_HEALTH_CHECK_INTERVAL, self._health_check)
+    
+    def _on_uplink_closed(self, client_info):
+        """上行读取发现连接已关闭时移除客户端"""
+        if self._is_active(client_info):
+            logger.log_debug(f"流动站 {client_info.user}@{client_info.addr[0]} 已断开连接", 'ntrip')
+            self.remove_client(client_info)
+    
+    def get_rover_positions(self, mount=None):
+        """获取流动站最新位置，按挂载点汇总
+        
+        Returns:
+            dict: {挂载点: [{'user', 'addr', 'lat', 'lon', 'quality', 'satellites', 'age'}, ...]}，
+                  只包含上传过有效GGA的客户端
+        """
+        now = time.time()
+        with self.client_lock:
+            mounts = [mount] if mount else list(self.clients)
+            result = {}
+            for mount_name in mounts:
+                rovers = []
+                for client_info in self.clients.get(mount_name, []):
+                    position = client_info.position
+                    if position is not None:
+                        rover = position.to_dict(now)
+                        rover['user'] = client_info.user
+                        rover['addr'] = client_info.addr[0]
+                        rovers.append(rover)
+                if rovers:
+                    result[mount_name] = rovers
+            return result
+    
     def _close_client(self, client_info):
         """关闭客户端连接"""
         try:
-            socket_obj = client_info['socket']
+            socket_obj = client_info.socket
             socket_obj.close()
         except Exception as e:
             logger.log_debug(f"关闭客户端连接失败: {e}", 'ntrip')
@@ -298,16 +436,12 @@ class SimpleDataForwarder:
             self.mount_buffers[mount].append(data_chunk, timestamp)
         
         self._send_to_subscribers(mount, data_chunk)
-        
-        try:
-            connection.update_mount_data_stats(mount, len(data_chunk))
-        except Exception as e:
-            logger.log_error(f"更新挂载点 {mount} 数据统计时发生错误: {e}")
     
     def create_mount_buffer(self, mount):
         with self.buffer_lock:
             if mount not in self.mount_buffers:
                 self.mount_buffers[mount] = RingBuffer(self.buffer_maxlen)
+                self.fanout_stats[mount] = FanoutStats()
                 logger.log_mount_operation('buffer_created', mount)
                 return True
             return False
@@ -316,6 +450,7 @@ class SimpleDataForwarder:
         with self.buffer_lock:
             if mount in self.mount_buffers:
                 del self.mount_buffers[mount]
+                self.fanout_stats.pop(mount, None)
                 logger.log_mount_operation('buffer_removed', mount)
                 return True
             return False
@@ -346,23 +481,24 @@ class SimpleDataForwarder:
     def _send_data_to_clients(self, clients, buffer, mount_name):
         """发送数据到客户端列表"""
         disconnected_clients = []
+        fanout = self.fanout_stats.get(mount_name)
         
         for client_info in clients:
             try:
-                self._send_to_client(client_info, buffer)
+                self._send_to_client(client_info, buffer, fanout)
             except Exception as e:
-                logger.log_warning(f"发送数据到客户端失败 ({client_info['addr']}): {e}", 'ntrip')
+                logger.log_warning(f"发送数据到客户端失败 ({client_info.addr}): {e}", 'ntrip')
                 disconnected_clients.append(client_info)
         
         # 清理断开的连接
         for client_info in disconnected_clients:
             self.remove_client(client_info)
     
-    def _send_to_client(self, client_info, buffer):
-        """发送数据到单个客户端"""
+    def _send_to_client(self, client_info, buffer, fanout=None):
+        """发送数据到单个客户端，fanout为该挂载点的FanoutStats"""
         try:
             
-            last_sent_timestamp = client_info['last_sent_timestamp']
+            last_sent_timestamp = client_info.last_sent_timestamp
             new_data = buffer.get_since(last_sent_timestamp)
             
             if new_data:
@@ -372,33 +508,28 @@ class SimpleDataForwarder:
                 if bytes_sent > 0:
                    
                     current_time = time.time()
-                    client_info['last_seen'] = current_time
-                    client_info['last_sent_timestamp'] = new_data[-1][0]
-                    client_info['bytes_sent'] += bytes_sent
-                    client_info['messages_sent'] += len(new_data)
+                    client_info.last_seen = current_time
+                    client_info.last_sent_timestamp = new_data[-1][0]
+                    client_info.bytes_sent += bytes_sent
+                    client_info.messages_sent += len(new_data)
                     
                     self.stats['total_bytes_sent'] += bytes_sent
                     self.stats['total_messages_sent'] += len(new_data)
-                    
-                    if client_info.get('connection_id'):
-                        # 静默更新用户活动，不产生日志
-                        connection.update_user_activity(
-                            client_info['user'], 
-                            client_info['connection_id'], 
-                            bytes_sent
-                        )
+                    if fanout is not None:
+                        # 按本批最早的数据计算分发延迟
+                        fanout.record(current_time - new_data[0][0], bytes_sent)
         
         except Exception as e:
             # 只在非网络错误时记录警告日志
             if "Connection" not in str(e) and "Broken pipe" not in str(e):
-                logger.log_warning(f"发送数据到客户端失败 ({client_info['addr']}): {e}", 'ntrip')
+                logger.log_warning(f"发送数据到客户端失败 ({client_info.addr}): {e}", 'ntrip')
             raise
     
     def _send_data_simple(self, client_info, data_list):
         """简单的数据发送方法"""
         try:
-            socket_obj = client_info['socket']
-            protocol_version = client_info['protocol_version']
+            socket_obj = client_info.socket
+            protocol_version = client_info.protocol_version
             total_bytes_sent = 0
             
             for timestamp, data in data_list:
@@ -416,7 +547,7 @@ class SimpleDataForwarder:
             return total_bytes_sent
             
         except Exception as e:
-            client_info['send_errors'] += 1
+            client_info.send_errors += 1
             self.stats['failed_sends'] += 1
             raise
     
@@ -430,7 +561,8 @@ class SimpleDataForwarder:
             return {
                 'forwarder': self.stats.copy(),
                 'buffers': buffer_stats,
-                'clients_by_mount': {mount: len(clients) for mount, clients in self.clients.items()}
+                'clients_by_mount': {mount: len(clients) for mount, clients in self.clients.items()},
+                'uplink': self.uplink.get_stats()
             }
     
     def get_client_info(self, mount=None):
@@ -451,14 +583,14 @@ class SimpleDataForwarder:
         with self.client_lock:
             for mount_name, clients in self.clients.items():
                 for client_info in clients[:]:
-                    if client_info['user'] == username:
+                    if client_info.user == username:
                         clients_to_remove.append(client_info)
         
         for client_info in clients_to_remove:
             try:
                 self.remove_client(client_info)
                 disconnected_count += 1
-                logger.log_info(f"强制断开用户 {username} 的连接: {client_info['mount']}")
+                logger.log_info(f"强制断开用户 {username} 的连接: {client_info.mount}")
             except Exception as e:
                 logger.log_error(f"强制断开用户 {username} 连接失败: {e}")
         
@@ -477,7 +609,7 @@ class SimpleDataForwarder:
                     try:
                         self.remove_client(client_info)
                         disconnected_count += 1
-                        logger.log_info(f"强制断开挂载点 {mount_name} 的用户连接: {client_info['user']}")
+                        logger.log_info(f"强制断开挂载点 {mount_name} 的用户连接: {client_info.user}")
                     except Exception as e:
                         logger.log_error(f"强制断开挂载点 {mount_name} 用户连接失败: {e}")
         
@@ -574,11 +706,14 @@ def stop_forwarder():
     """停止数据转发器"""
     forwarder.stop()
 
+def detach_clients():
+    """摘下所有客户端（平滑重启）"""
+    return forwarder.detach_clients()
 
-def add_client(client_socket, user, mount, agent, addr, protocol_version, connection_id=None):
+def add_client(client_socket, user, mount, agent, addr, protocol_version):
     """同步添加客户端（兼容原接口）"""
     try:
-        return forwarder.add_client(client_socket, user, mount, agent, addr, protocol_version, connection_id)
+        return forwarder.add_client(client_socket, user, mount, agent, addr, protocol_version)
     except Exception as e:
         logger.log_error(f"添加客户端超时: {e}", 'ntrip')
         raise
@@ -587,6 +722,14 @@ def remove_client(client_info):
     """移除客户端"""
     return forwarder.remove_client(client_info)
 
+def move_client(client_info, new_mount):
+    """切换客户端挂载点"""
+    return forwarder.move_client(client_info, new_mount)
+
+def get_rover_positions(mount=None):
+    """获取流动站最新位置"""
+    return forwarder.get_rover_positions(mount)
+
 def upload_data(mount, data_chunk):
     """上传数据"""
     return forwarder.upload_data(mount, data_chunk)
@@ -599,6 +742,10 @@ def remove_mount_buffer(mount):
     """移除挂载点缓冲区"""
     return forwarder.remove_mount_buffer(mount)
 
+def get_fanout_stats(mount):
+    """获取挂载点的分发统计（FanoutStats），挂载点没有缓冲区时返回None"""
+    return forwarder.fanout_stats.get(mount)
+
 def get_stats():
     """获取统计信息"""
     return forwarder.get_stats()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+handoff.py - 平滑重启（连接交接）模块
+功能：旧进程启动新进程后，通过Unix socket（SCM_RIGHTS）把NTRIP监听socket、握手中的连接、
+      在线基站和流动站的连接及其转发游标交给新进程；旧进程停止读写这些socket，等待未完成的
+      短请求结束后退出。socket在新旧进程间共享，旧进程退出时不会关闭客户端的TCP连接
+"""
+
+import base64
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from . import accounting
+from . import config
+from . import connection
+from . import forwarder
+from .logger import log_debug, log_info, log_warning, log_error, log_system_event
+
+# 新进程通过该环境变量得知交接socket路径
+HANDOFF_ENV = 'NTRIP_HANDOFF_SOCKET'
+# 每条交接消息携带的socket数和JSON大小上限（Linux单条消息最多253个文件描述符）
+BATCH_FDS = 64
+BATCH_BYTES = 64 * 1024
+MAX_MESSAGE = 1024 * 1024
+ACK = b'ok'
+
+# 随会话交接的转发游标和统计字段
+CLIENT_CURSOR_FIELDS = ('connected_at', 'last_seen', 'last_sent_timestamp', 'bytes_sent', 'messages_sent')
+
+SUPPORTED = all(hasattr(socket, name) for name in ('AF_UNIX', 'SOCK_SEQPACKET', 'send_fds', 'recv_fds'))
+
+_frozen = False
+_restart_lock = threading.Lock()
+# 正在读取并转发基站数据的上传线程数；冻结时等其归零后再交出socket
+_upload_reads = 0
+_upload_cond = threading.Condition()
+
+
+def is_frozen():
+    """旧进程是否已开始交接（交接后不再读写已交出的socket）"""
+    return _frozen
+
+
+def begin_upload_read():
+    """上传线程在socket可读后、recv之前调用；已冻结时返回False，线程不再读取，未读数据留给新进程"""
+    global _upload_reads
+    with _upload_cond:
+        if _frozen:
+            return False
+        _upload_reads += 1
+        return True
+
+
+def end_upload_read():
+    """上传线程读取并转发完一块数据后调用"""
+    global _upload_reads
+    with _upload_cond:
+        _upload_reads -= 1
+        if not _upload_reads:
+            _upload_cond.notify_all()
+
+
+def _freeze(timeout):
+    """标记冻结并等待进行中的基站数据读取转发完成，之后交出的基站socket不会再被本进程读取"""
+    global _frozen
+    with _upload_cond:
+        _frozen = True
+        if not _upload_cond.wait_for(lambda: not _upload_reads, timeout):
+            log_warning(f"平滑重启: 等待基站数据转发超时，仍有 {_upload_reads} 个上传线程在读取")
+
+
+def is_handoff_child():
+    """当前进程是否为平滑重启启动的新进程"""
+    return bool(os.environ.get(HANDOFF_ENV))
+
+
+def _remove_socket_file(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _send(channel, message, socks=()):
+    payload = json.dumps(message, ensure_ascii=False).encode('utf-8')
+    socket.send_fds(channel, [payload], [sock.fileno() for sock in socks])
+
+
+def _send_batches(channel, kind, items):
+    """分批发送 [(描述dict, socket)]，描述中的fd为该socket在本条消息中的序号"""
+    batch, socks, size = [], [], 0
+    for item, sock in items:
+        item['fd'] = len(socks)
+        encoded = len(json.dumps(item))
+        if socks and (len(socks) >= BATCH_FDS or size + encoded > BATCH_BYTES):
+            _send(channel, {'type': kind, 'items': batch}, socks)
+            batch, socks, size = [], [], 0
+            item['fd'] = 0
+        batch.append(item)
+        socks.append(sock)
+        size += encoded
+    if socks:
+        _send(channel, {'type': kind, 'items': batch}, socks)
+
+
+def _peer_address(sock, fallback_ip):
+    try:
+        return list(sock.getpeername()[:2])
+    except OSError:
+        return [fallback_ip, 0]
+
+
+def _collect_sessions():
+    """收集在线基站和流动站会话，流动站从转发器中摘下（不关闭socket）"""
+    sessions = []
+    manager = connection.get_connection_manager()
+    with manager.mount_lock:
+        mounts = [(name, info) for name, info in manager.online_mounts.items() if info.client_socket is not None]
+    for name, info in mounts:
+        sock = info.client_socket
+        if sock.fileno() == -1:
+            continue
+        sessions.append(({
+            'kind': 'mount',
+            'mount': name,
+            'addr': _peer_address(sock, info.ip_address),
+            'agent': info.user_agent,
+            'ntrip_version': info.protocol_version,
+        }, sock))
+
+    for client_info in forwarder.detach_clients():
+        sock = client_info.socket
+        if sock.fileno() == -1:
+            continue
+        session = {
+            'kind': 'client',
+            'mount': client_info.mount,
+            'virtual_mount': client_info.virtual_mount,
+            'user': client_info.user,
+            'agent': client_info.agent,
+            'addr': list(client_info.addr[:2]),
+            'ntrip_version': client_info.protocol_version,
+        }
+        for field in CLIENT_CURSOR_FIELDS:
+            session[field] = getattr(client_info, field)
+        sessions.append((session, sock))
+    return sessions
+
+
+def graceful_restart(service_manager):
+    """旧进程：启动新进程并交接所有连接，交接完成后本进程退出
+
+    新进程就绪之前出现的错误不影响本进程继续运行；开始交接后本进程已停止读写连接，
+    即使交接中途失败也会退出，由新进程（或进程管理器）继续提供服务。
+
+    Returns:
+        tuple: (False, 失败原因)，交接成功时不返回
+    """
+    if not SUPPORTED:
+        return False, "当前平台不支持通过SCM_RIGHTS交接连接"
+    caster = getattr(service_manager, 'ntrip_caster', None)
+    if caster is None or not caster.running:
+        return False, "NTRIP服务器未运行"
+    if not _restart_lock.acquire(blocking=False):
+        return False, "平滑重启正在进行中"
+
+    path = os.path.abspath(config.HANDOFF_SOCKET_PATH)
+    child = None
+    try:
+        _remove_socket_file(path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            listener.bind(path)
+            listener.listen(1)
+            listener.settimeout(config.HANDOFF_TIMEOUT)
+            child = subprocess.Popen([sys.executable] + sys.argv, env=dict(os.environ, **{HANDOFF_ENV: path}))
+            log_system_event(f'平滑重启: 新进程已启动 (PID {child.pid})，等待其就绪')
+            channel, _ = listener.accept()
+        finally:
+            listener.close()
+            _remove_socket_file(path)
+    except Exception as e:
+        if child is not None and child.poll() is None:
+            child.kill()
+        _restart_lock.release()
+        if isinstance(e, socket.timeout):
+            return False, f"新进程未在 {config.HANDOFF_TIMEOUT} 秒内就绪"
+        return False, f"启动新进程失败: {e}"
+
+    # 从这里开始本进程不再接受连接，也不再读写交出的socket
+    sessions = []
+    try:
+        _freeze(config.HANDOFF_TIMEOUT)
+        server_socket, pending = caster.freeze()
+        sessions = _collect_sessions()
+        channel.settimeout(config.HANDOFF_TIMEOUT)
+        _send(channel, {'type': 'listener'}, [server_socket])
+        _send_batches(channel, 'handshakes', [
+            ({'addr': list(address[:2]), 'priority': priority, 'data': base64.b64encode(data).decode('ascii')}, sock)
+            for sock, address, priority, data in pending
+        ])
+        _send_batches(channel, 'sessions', sessions)
+        _send(channel, {'type': 'done'})
+        if channel.recv(len(ACK)) != ACK:
+            raise ConnectionError("新进程未确认接管")
+        log_system_event(f'平滑重启: 已交接 {len(pending)} 个握手中连接、{len(sessions)} 个会话给新进程 (PID {child.pid})')
+    except Exception as e:
+        log_error(f"平滑重启交接失败，本进程退出: {e}", exc_info=True)
+        os._exit(1)
+    finally:
+        channel.close()
+
+    # 交接前的用量写入数据库，新进程从交接时的累计值继续计
+    accounting.flush()
+    _drain(caster, len(sessions))
+    log_system_event('平滑重启: 旧进程退出')
+    os._exit(0)
+
+
+def _drain(caster, handed_off):
+    """等待仍在处理中的短请求（源表、认证等）结束；已交出的会话线程只是阻塞在旧socket上，不需要等待"""
+    deadline = time.time() + config.HANDOFF_DRAIN_TIMEOUT
+    while time.time() < deadline and caster.active_connections > handed_off:
+        time.sleep(0.1)
+    remaining = caster.active_connections - handed_off
+    if remaining > 0:
+        log_warning(f"平滑重启: 等待超时，仍有 {remaining} 个请求未处理完")
+
+
+def receive():
+    """新进程：连接旧进程的交接socket，接收监听socket、握手中的连接和会话
+
+    Returns:
+        dict: {'channel', 'listener', 'pending': [(socket, 地址, 优先级, 已读数据)], 'sessions': [会话dict]}
+    """
+    path = os.environ.pop(HANDOFF_ENV)
+    channel = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    channel.settimeout(config.HANDOFF_TIMEOUT)
+    channel.connect(path)
+    inherited = {'channel': channel, 'listener': None, 'pending': [], 'sessions': []}
+    while True:
+        payload, fds, flags, _ = socket.recv_fds(channel, MAX_MESSAGE, BATCH_FDS)
+        socks = [socket.socket(fileno=fd) for fd in fds]
+        if not payload:
+            raise ConnectionError("旧进程在交接完成前断开")
+        if flags & getattr(socket, 'MSG_CTRUNC', 0):
+            raise ConnectionError("交接消息中的socket被截断")
+        message = json.loads(payload)
+        kind = message['type']
+        if kind == 'listener':
+            inherited['listener'] = socks[0]
+        elif kind == 'handshakes':
+            for item in message['items']:
+                inherited['pending'].append((socks[item['fd']], tuple(item['addr']), item['priority'],
+                                             base64.b64decode(item['data'])))
+        elif kind == 'sessions':
+            for item in message['items']:
+                item['socket'] = socks[item.pop('fd')]
+                item['addr'] = tuple(item['addr'])
+                inherited['sessions'].append(item)
+        elif kind == 'done':
+            break
+    log_info(f"平滑重启: 已接收监听socket、{len(inherited['pending'])} 个握手中连接和 {len(inherited['sessions'])} 个会话")
+    return inherited
+
+
+def acknowledge(inherited):
+    """新进程：确认已接管，旧进程收到后开始退出"""
+    channel = inherited['channel']
+    try:
+        channel.send(ACK)
+    finally:
+        channel.close()
+
+
+def wait_for_port(port, timeout=None):
+    """新进程：等待旧进程退出并释放端口（Web端口不交接）"""
+    deadline = time.time() + (timeout or config.HANDOFF_TIMEOUT)
+    while True:
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+                probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                probe.bind((config.HOST, port))
+            return True
+        except OSError:
+            if time.time() >= deadline:
+                return False
+            log_debug(f"等待端口 {port} 释放")
+            time.sleep(0.2)
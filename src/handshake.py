@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+handshake.py - 连接握手读取模块
+功能：用一个selector线程读取所有新连接的请求头，并对每个连接施加独立于流传输超时的握手期限；
+      只有请求头完整的连接才交给工作线程池处理，空闲或逐字节慢速发送的连接只占用一个文件描述符，
+      到期后直接关闭，不占用工作线程（防止slowloris类攻击）
+"""
+
+import heapq
+import socket
+import selectors
+import threading
+import time
+from collections import deque
+
+from . import config
+from . import logger
+
+# 单次读取上限
+HANDSHAKE_READ_SIZE = 4096
+# 请求头结束标记：标准为空行CRLFCRLF，兼容只用LF换行的旧客户端
+HEADER_TERMINATORS = (b'\r\n\r\n', b'\n\n')
+
+
+class _HandshakeState:
+    """单个连接的握手读取状态"""
+
+    __slots__ = ('sock', 'address', 'priority', 'buffer', 'deadline', 'done')
+
+    def __init__(self, sock, address, priority, deadline):
+        self.sock = sock
+        self.address = address
+        self.priority = priority
+        self.buffer = bytearray()
+        self.deadline = deadline
+        self.done = False
+
+
+class HandshakeReader:
+    """请求头读取线程
+
+    新连接设为非阻塞后注册到selector，可读时增量追加到缓冲区，读到请求头结束标记
+    （或超过HANDSHAKE_MAX_HEADER_SIZE）即注销并回调 on_ready(sock, address, priority, data)。
+    每个连接的期限记录在按到期时间排序的堆中，到期时只收到了完整请求行的旧客户端仍按请求处理，
+    其余连接直接关闭并回调 on_close(sock, address, reason)。
+    """
+
+    def __init__(self, on_ready, on_close):
+        self.on_ready = on_ready
+        self.on_close = on_close
+        self.selector = None
+        self.pending = deque()  # [_HandshakeState]
+        self.pending_lock = threading.Lock()
+        self.deadlines = []  # [(到期时间, 序号, _HandshakeState)]
+        self.seq = 0
+        self.wakeup_r = None
+        self.wakeup_w = None
+        self.thread = None
+        self.running = False
+        self.stats = {'accepted': 0, 'completed': 0, 'timeout': 0, 'closed': 0, 'oversized': 0, 'partial': 0}
+
+    def start(self):
+        if self.running:
+            return
+        self.selector = selectors.DefaultSelector()
+        self.wakeup_r, self.wakeup_w = socket.socketpair()
+        self.wakeup_r.setblocking(False)
+        self.wakeup_w.setblocking(False)
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ, None)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='HandshakeReader', daemon=True)
+        self.thread.start()
+
+    def stop(self, detach=False):
+        """停止读取线程；detach为True时不关闭握手中的连接，返回 [(socket, 地址, 优先级, 已读数据)]"""
+        if not self.running:
+            return []
+        self.running = False
+        self._wakeup()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=5)
+        # 关闭所有仍在握手中的连接
+        with self.pending_lock:
+            waiting = list(self.pending)
+            self.pending.clear()
+        waiting.extend(key.data for key in self.selector.get_map().values() if key.data is not None)
+        detached = []
+        for state in waiting:
+            if detach:
+                self._unregister(state)
+                detached.append((state.sock, state.address, state.priority, bytes(state.buffer)))
+            else:
+                self._close(state, '服务器关闭')
+        for sock in (self.wakeup_r, self.wakeup_w):
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self.selector.close()
+        self.deadlines.clear()
+        return detached
+
+    def add(self, sock, address, priority, data=b''):
+        """加入新连接，开始读取请求头（由accept线程调用）；data为已读取的部分请求头"""
+        state = _HandshakeState(sock, address, priority, time.monotonic() + config.HANDSHAKE_TIMEOUT)
+        state.buffer += data
+        if not self.running:
+            self._close(state, '服务器未运行')
+            return
+        with self.pending_lock:
+            self.pending.append(state)
+        self._wakeup()
+
+    def _wakeup(self):
+        try:
+            self.wakeup_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def _apply_pending(self):
+        with self.pending_lock:
+            states = list(self.pending)
+            self.pending.clear()
+        for state in states:
+            try:
+                state.sock.setblocking(False)
+                self.selector.register(state.sock, selectors.EVENT_READ, state)
+            except (KeyError, ValueError, OSError) as e:
+                self._close(state, f"注册失败: {e}")
+                continue
+            self.seq += 1
+            heapq.heappush(self.deadlines, (state.deadline, self.seq, state))
+            self.stats['accepted'] += 1
+            if state.buffer:
+                self._check_complete(state, 0)
+
+    def _run(self):
+        while self.running:
+            timeout = 1.0
+            if self.deadlines:
+                timeout = min(timeout, max(0.0, self.deadlines[0][0] - time.monotonic()))
+            try:
+                events = self.selector.select(timeout=timeout)
+            except (OSError, ValueError):
+                self._purge_closed()
+                continue
+            for key, _ in events:
+                if key.data is None:
+                    try:
+                        while self.wakeup_r.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+                self._read(key.data)
+            self._apply_pending()
+            self._expire(time.monotonic())
+
+    def _purge_closed(self):
+        for key in list(self.selector.get_map().values()):
+            if key.data is not None and key.fileobj.fileno() == -1:
+                self._close(key.data, 'socket已关闭')
+        self._apply_pending()
+
+    def _read(self, state):
+        try:
+            data = state.sock.recv(HANDSHAKE_READ_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self._close(state, f"读取失败: {e}")
+            return
+        if not data:
+            self._close(state, '客户端在发送请求头前断开')
+            return
+
+        # 只需在新数据及其前3个字节中查找结束标记
+        start = max(0, len(state.buffer) - 3)
+        state.buffer += data
+        self._check_complete(state, start)
+
+    def _check_complete(self, state, start):
+        if any(state.buffer.find(marker, start) != -1 for marker in HEADER_TERMINATORS):
+            self.stats['completed'] += 1
+            self._dispatch(state)
+        elif len(state.buffer) >= config.HANDSHAKE_MAX_HEADER_SIZE:
+            # 交给处理器按异常请求响应
+            self.stats['oversized'] += 1
+            self._dispatch(state)
+
+    def _expire(self, now):
+        while self.deadlines and self.deadlines[0][0] <= now:
+            _, _, state = heapq.heappop(self.deadlines)
+            if state.done:
+                continue
+            if b'\n' in state.buffer:
+                # 已收到完整请求行但没有空行结束的旧客户端，按已收到的内容处理
+                self.stats['partial'] += 1
+                self._dispatch(state)
+            else:
+                self.stats['timeout'] += 1
+                self._close(state, f"握手超时 ({config.HANDSHAKE_TIMEOUT} 秒)")
+
+    def _unregister(self, state):
+        state.done = True
+        try:
+            self.selector.unregister(state.sock)
+        except (KeyError, ValueError, OSError, AttributeError):
+            pass
+
+    def _dispatch(self, state):
+        self._unregister(state)
+        try:
+            self.on_ready(state.sock, state.address, state.priority, bytes(state.buffer))
+        except Exception as e:
+            logger.log_error(f"提交握手完成的连接失败 {state.address}: {e}", exc_info=True)
+
+    def _close(self, state, reason):
+        self._unregister(state)
+        self.stats['closed'] += 1
+        try:
+            self.on_close(state.sock, state.address, reason)
+        except Exception as e:
+            logger.log_error(f"关闭握手连接失败 {state.address}: {e}", exc_info=True)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['pending'] = len(self.selector.get_map()) - 1 if self.running else 0
+        stats['timeout_seconds'] = config.HANDSHAKE_TIMEOUT
+        return stats
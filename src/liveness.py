@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+liveness.py - 连接存活检测模块
+功能：基于内核socket状态（TCP_INFO）和TCP_USER_TIMEOUT判断连接是否存活，
+      由后台线程定期巡检并清理失效挂载点，替代握手路径上调用netstat的僵尸连接清理；
+      长时间无数据的挂载点由连接管理器的时间轮定时器按MOUNT_TIMEOUT处理
+"""
+
+import socket
+import struct
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from . import config
+from . import connection
+from .logger import log_debug, log_info, log_warning, log_error
+
+# Linux tcp_info 前部字段: 8个u8 + 13个u32（到tcpi_last_ack_recv为止）
+_TCP_INFO_STRUCT = struct.Struct('8B13I')
+TCP_INFO_SUPPORTED = hasattr(socket, 'TCP_INFO')
+TCP_USER_TIMEOUT_SUPPORTED = hasattr(socket, 'TCP_USER_TIMEOUT')
+
+TCP_ESTABLISHED = 1
+TCP_STATE_NAMES = {
+    1: 'ESTABLISHED', 2: 'SYN_SENT', 3: 'SYN_RECV', 4: 'FIN_WAIT1', 5: 'FIN_WAIT2', 6: 'TIME_WAIT',
+    7: 'CLOSE', 8: 'CLOSE_WAIT', 9: 'LAST_ACK', 10: 'LISTEN', 11: 'CLOSING',
+}
+
+
+class TCPInfo(NamedTuple):
+    """内核TCP连接状态（tcp_info的部分字段）"""
+    state: int
+    retransmits: int
+    probes: int
+    rto_ms: float
+    unacked: int
+    last_data_recv_ms: int
+    last_ack_recv_ms: int
+
+
+def read_tcp_info(sock) -> Optional[TCPInfo]:
+    """读取socket的TCP_INFO，平台不支持或socket已关闭时返回None"""
+    if not TCP_INFO_SUPPORTED:
+        return None
+    try:
+        raw = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, _TCP_INFO_STRUCT.size)
+    except (OSError, ValueError):
+        return None
+    if len(raw) < _TCP_INFO_STRUCT.size:
+        return None
+    fields = _TCP_INFO_STRUCT.unpack(raw)
+    return TCPInfo(
+        state=fields[0],
+        retransmits=fields[2],
+        probes=fields[3],
+        rto_ms=fields[8] / 1000.0,
+        unacked=fields[12],
+        last_data_recv_ms=fields[19],
+        last_ack_recv_ms=fields[20],
+    )
+
+
+def apply_user_timeout(sock):
+    """设置TCP_USER_TIMEOUT：已发送数据超过该时间未被确认时内核直接断开连接"""
+    timeout = config.TCP_USER_TIMEOUT
+    if timeout <= 0 or not TCP_USER_TIMEOUT_SUPPORTED:
+        return False
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, int(timeout * 1000))
+        return True
+    except OSError as e:
+        log_debug(f"设置TCP_USER_TIMEOUT失败: {e}")
+        return False
+
+
+def check_socket(sock):
+    """按socket状态判断连接是否失效
+
+    Returns:
+        str: 失效原因，连接正常或无法判断时返回None
+    """
+    if sock is None:
+        return None
+    try:
+        if sock.fileno() == -1:
+            return "socket已关闭"
+    except (OSError, AttributeError):
+        return "socket已关闭"
+    info = read_tcp_info(sock)
+    if info is not None and info.state != TCP_ESTABLISHED:
+        return f"TCP状态 {TCP_STATE_NAMES.get(info.state, info.state)}"
+    return None
+
+
+class LivenessMonitor:
+    """挂载点存活巡检线程
+
+    每隔LIVENESS_SWEEP_INTERVAL秒检查一次所有在线挂载点，只读取内核socket状态和内存中的时间戳，
+    不创建子进程。检测延迟按"最后一次收到数据到被清理"统计。
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval or config.LIVENESS_SWEEP_INTERVAL
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            'sweeps': 0,
+            'detected': 0,
+            'last_sweep_ms': 0.0,
+            'max_sweep_ms': 0.0,
+            'last_detection_latency': None,
+            'max_detection_latency': 0.0,
+            'total_detection_latency': 0.0,
+            'reasons': {},
+        }
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name='LivenessMonitor', daemon=True)
+        self.thread.start()
+        log_info(f"连接存活巡检已启动，间隔 {self.interval} 秒，TCP_USER_TIMEOUT {config.TCP_USER_TIMEOUT} 秒")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=5)
+
+    def apply_config_changes(self, changed):
+        """配置热加载：下一轮巡检起使用新的间隔"""
+        if 'LIVENESS_SWEEP_INTERVAL' in changed:
+            self.interval = config.LIVENESS_SWEEP_INTERVAL
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                log_error(f"连接存活巡检异常: {e}", exc_info=True)
+
+    def sweep(self):
+        """巡检一次所有在线挂载点，返回清理的挂载点数量"""
+        manager = connection.get_connection_manager()
+        start = time.perf_counter()
+        now = time.time()
+        with manager.mount_lock:
+            candidates = [
+                (name, info.client_socket, info.last_data_time or info.connect_time)
+                for name, info in manager.online_mounts.items()
+            ]
+
+        dead = []
+        for name, sock, last_data_time in candidates:
+            reason = check_socket(sock)
+            if reason is not None:
+                dead.append((name, sock, reason, now - last_data_time))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        for name, sock, reason, latency in dead:
+            with manager.mount_lock:
+                # 巡检期间挂载点可能已重连，只清理仍是同一个连接的挂载点
+                info = manager.online_mounts.get(name)
+                if info is None or info.client_socket is not sock:
+                    continue
+                log_warning(f"检测到失效挂载点 {name} ({info.ip_address}): {reason}，距最后数据 {latency:.1f} 秒")
+                manager.remove_mount_connection(name, f"存活检测: {reason}")
+            self._record(reason, latency)
+
+        with self.stats_lock:
+            self.stats['sweeps'] += 1
+            self.stats['last_sweep_ms'] = round(elapsed_ms, 3)
+            self.stats['max_sweep_ms'] = round(max(self.stats['max_sweep_ms'], elapsed_ms), 3)
+        if dead:
+            log_info(f"连接存活巡检: 检查 {len(candidates)} 个挂载点，清理 {len(dead)} 个，耗时 {elapsed_ms:.2f} ms")
+        return len(dead)
+
+    def _record(self, reason, latency):
+        kind = 'tcp_state' if reason.startswith('TCP') else 'closed'
+        with self.stats_lock:
+            self.stats['detected'] += 1
+            self.stats['last_detection_latency'] = round(latency, 3)
+            self.stats['max_detection_latency'] = round(max(self.stats['max_detection_latency'], latency), 3)
+            self.stats['total_detection_latency'] += latency
+            self.stats['reasons'][kind] = self.stats['reasons'].get(kind, 0) + 1
+
+    def get_stats(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+            stats['reasons'] = dict(self.stats['reasons'])
+        detected = stats.pop('total_detection_latency')
+        stats['avg_detection_latency'] = round(detected / stats['detected'], 3) if stats['detected'] else None
+        stats['interval'] = self.interval
+        stats['tcp_user_timeout'] = config.TCP_USER_TIMEOUT
+        stats['tcp_info_supported'] = TCP_INFO_SUPPORTED
+        return stats
+
+
+_monitor = LivenessMonitor()
+config.subscribe(_monitor.apply_config_changes)
+
+
+def start_monitor():
+    """启动存活巡检线程"""
+    _monitor.start()
+
+
+def stop_monitor():
+    """停止存活巡检线程"""
+    _monitor.stop()
+
+
+def sweep():
+    """立即巡检一次"""
+    return _monitor.sweep()
+
+
+def get_liveness_stats():
+    """获取存活检测统计"""
+    return _monitor.get_stats()
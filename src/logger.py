@@ -141,6 +141,15 @@ class NTRIPLogger:
         
         self._loggers['root'] = root_logger
     
+    def apply_log_level(self, level_name):
+        """配置热加载：调整根日志记录器及其控制台输出的日志级别"""
+        level = getattr(logging, level_name.upper())
+        root_logger = self._loggers['root']
+        root_logger.setLevel(level)
+        for handler in root_logger.handlers:
+            if not isinstance(handler, RotatingFileHandler):
+                handler.setLevel(level)
+    
     def get_logger(self, name='root'):
         """获取指定名称的日志记录器"""
         if name in self._loggers:
@@ -339,6 +348,14 @@ def init_logging():
                 _logger_instance = NTRIPLogger()
     return _logger_instance
 
+def _apply_config_changes(changed):
+    """配置热加载后应用新的日志级别"""
+    if 'LOG_LEVEL' in changed and _logger_instance is not None:
+        _logger_instance.apply_log_level(config.LOG_LEVEL)
+
+if hasattr(config, 'subscribe'):
+    config.subscribe(_apply_config_changes)
+
 def set_web_instance(web_instance):
     """设置Web实例引用，用于实时日志推送"""
     NTRIPLogger.set_web_instance(web_instance)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+nmea.py - NMEA语句解析模块
+功能：增量切分流动站上行的NMEA语句，校验校验和，解析GGA位置信息
+"""
+
+from typing import NamedTuple, Optional
+
+# 单条NMEA语句最大长度（标准为82字节，放宽以兼容部分设备的扩展字段）
+MAX_SENTENCE_LENGTH = 256
+
+
+class GGAFix(NamedTuple):
+    """GGA定位结果"""
+    lat: float
+    lon: float
+    quality: int        # 定位质量: 0无效 1单点 2差分 4固定解 5浮点解
+    satellites: int
+    hdop: Optional[float]
+    altitude: Optional[float]
+    utc_time: str
+
+
+def verify_checksum(sentence):
+    """校验NMEA语句校验和，语句不带校验和时视为通过"""
+    star = sentence.rfind('*')
+    if star < 0:
+        return True
+    checksum = 0
+    for ch in sentence[1:star]:
+        checksum ^= ord(ch)
+    try:
+        return checksum == int(sentence[star + 1:star + 3], 16)
+    except ValueError:
+        return False
+
+
+def _parse_coordinate(value, hemisphere, degree_digits):
+    """把 ddmm.mmmm / dddmm.mmmm 格式转换为十进制度"""
+    if not value:
+        return None
+    degrees = float(value[:degree_digits])
+    minutes = float(value[degree_digits:])
+    result = degrees + minutes / 60.0
+    return -result if hemisphere in ('S', 'W') else result
+
+
+def parse_gga(sentence):
+    """解析GGA语句（$GPGGA/$GNGGA等任意talker）
+
+    Returns:
+        GGAFix: 解析结果，语句无效或无定位时返回None
+    """
+    sentence = sentence.strip()
+    if len(sentence) < 7 or sentence[0] != '$' or sentence[3:6] != 'GGA':
+        return None
+    if not verify_checksum(sentence):
+        return None
+    star = sentence.rfind('*')
+    fields = (sentence[1:star] if star >= 0 else sentence[1:]).split(',')
+    if len(fields) < 10:
+        return None
+    try:
+        quality = int(fields[6] or 0)
+        if quality == 0:
+            return None
+        lat = _parse_coordinate(fields[2], fields[3], 2)
+        lon = _parse_coordinate(fields[4], fields[5], 3)
+        if lat is None or lon is None or not (-90.0 <= lat <= 90.0) or not (-180.0 <= lon <= 180.0):
+            return None
+        return GGAFix(
+            lat=lat,
+            lon=lon,
+            quality=quality,
+            satellites=int(fields[7] or 0),
+            hdop=float(fields[8]) if fields[8] else None,
+            altitude=float(fields[9]) if fields[9] else None,
+            utc_time=fields[1],
+        )
+    except ValueError:
+        return None
+
+
+class NMEALineBuffer:
+    """增量NMEA语句切分器
+
+    每次feed一段上行字节，返回其中完整的语句；不完整的尾部保留到下一次。
+    非NMEA字节（如部分流动站上行的二进制数据）会被丢弃。
+    """
+
+    __slots__ = ('_pending',)
+
+    def __init__(self):
+        self._pending = b''
+
+    def feed(self, data):
+        """输入字节，返回完整语句列表（str）"""
+        buffer = self._pending + data if self._pending else data
+        sentences = []
+        start = buffer.find(b'$')
+        while start >= 0:
+            end = buffer.find(b'\n', start)
+            if end < 0:
+                break
+            line = buffer[start:end].rstrip(b'\r')
+            # 语句中间出现新的'$'说明前一条被截断，从新的起点开始
+            restart = line.rfind(b'$')
+            if restart > 0:
+                line = line[restart:]
+            if len(line) <= MAX_SENTENCE_LENGTH:
+                sentences.append(line.decode('ascii', errors='ignore'))
+            start = buffer.find(b'$', end + 1)
+
+        if start < 0:
+            self._pending = b''
+        else:
+            tail = buffer[start:]
+            self._pending = tail if len(tail) <= MAX_SENTENCE_LENGTH else b''
+        return sentences
+
+    def latest_gga(self, data):
+        """输入字节，返回其中最后一条有效GGA定位，没有则返回None"""
+        fix = None
+        for sentence in self.feed(data):
+            parsed = parse_gga(sentence)
+            if parsed is not None:
+                fix = parsed
+        return fix
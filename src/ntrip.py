@@ -10,10 +10,13 @@ import socket
 import logging
 import threading
 import base64
+import select
+import selectors
+import itertools
+from urllib.parse import unquote
 from datetime import datetime, timezone
 from threading import Thread
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from queue import Queue, Full, Empty
+from queue import Queue, PriorityQueue, Full, Empty
 from collections import defaultdict
 
 from . import forwarder
@@ -21,6 +24,16 @@ from . import config
 from . import logger
 from .logger import log_debug, log_info, log_warning, log_error, log_critical, log_system_event
 from . import connection
+from . import sourcetable
+from . import nmea
+from . import spatial
+from . import uplink
+from . import liveness
+from . import timerwheel
+from . import admission
+from . import handshake
+from . import handoff
+from . import accounting
 
 
 DEBUG = config.DEBUG
@@ -67,13 +80,24 @@ MAX_CONNECTIONS = config.MAX_CONNECTIONS
 MAX_CONNECTIONS_PER_USER = config.MAX_CONNECTIONS_PER_USER
 MAX_WORKERS = config.MAX_WORKERS
 CONNECTION_QUEUE_SIZE = config.CONNECTION_QUEUE_SIZE
+WORKER_IDLE_TIMEOUT = 60  # 工作线程空闲超过该时间(秒)后退出
+
+
+def _apply_config_changes(changed):
+    """配置热加载后同步本模块复制的配置项"""
+    for name in ('BUFFER_SIZE', 'MAX_CONNECTIONS', 'MAX_CONNECTIONS_PER_USER', 'MAX_WORKERS', 'CONNECTION_QUEUE_SIZE'):
+        if name in changed:
+            globals()[name] = changed[name][1]
+
+
+config.subscribe(_apply_config_changes)
 
 # 获取日志记录器
 
 class NTRIPHandler:
     """NTRIP请求处理器"""
     
-    def __init__(self, client_socket, client_address, db_manager):
+    def __init__(self, client_socket, client_address, db_manager, initial_data=None):
         self.client_socket = client_socket
         self.client_address = client_address
         self.db_manager = db_manager
@@ -84,8 +108,12 @@ class NTRIPHandler:
         self.username = ""
         self.ntrip1_password = ""  
         self.current_method = "GET"  
+        self.request_body = b""  # 请求头之后随请求一起到达的数据（如流动站的首条GGA）
+        self.initial_data = initial_data  # 握手线程已读取的请求头数据
+        self.handed_off = False  # 平滑重启时会话已交给新进程
         
-        self.client_socket.settimeout(config.SOCKET_TIMEOUT)
+        # 会话建立前使用握手期限，建立后由_enter_streaming切换为流传输超时
+        self.client_socket.settimeout(config.HANDSHAKE_TIMEOUT)
         
         self._configure_keepalive()
     
@@ -119,13 +147,43 @@ class NTRIPHandler:
         except Exception as e:
             logger.log_debug(f"配置Keep-Alive失败: {e}", 'ntrip')
     
+    def _read_request_head(self):
+        """读取请求头：握手线程已读到的数据直接使用，否则在握手期限内循环读取到空行"""
+        if self.initial_data is not None:
+            return self.initial_data
+        data = b''
+        deadline = time.monotonic() + config.HANDSHAKE_TIMEOUT
+        while len(data) < config.HANDSHAKE_MAX_HEADER_SIZE:
+            if any(marker in data for marker in handshake.HEADER_TERMINATORS):
+                break
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise socket.timeout("握手超时")
+                self.client_socket.settimeout(remaining)
+                chunk = self.client_socket.recv(BUFFER_SIZE)
+            except socket.timeout:
+                # 已收到完整请求行的旧客户端按已收到的内容处理
+                if b'\n' in data:
+                    break
+                raise
+            if not chunk:
+                break
+            data += chunk
+        self.client_socket.settimeout(config.HANDSHAKE_TIMEOUT)
+        return data
+    
+    def _enter_streaming(self):
+        """会话已建立：握手期限结束，改用流传输超时"""
+        self.client_socket.settimeout(config.SOCKET_TIMEOUT)
+    
     def handle_request(self):
         """处理NTRIP请求，增强验证和错误处理"""
         try:
             # 改为debug级别，避免频繁日志
             log_debug(f"=== 开始处理请求 {self.client_address} ===")
            
-            request_data = self.client_socket.recv(BUFFER_SIZE).decode('utf-8', errors='ignore')
+            request_data = self._read_request_head().decode('utf-8', errors='ignore')
             if not request_data:
                 log_debug(f"客户端 {self.client_address} 发送空请求")
                 return
@@ -136,6 +194,8 @@ class NTRIPHandler:
             # 改为debug级别，避免频繁日志
             log_debug(f"检测到连接请求来自 {self.client_address}: {sanitized_request}")
             
+            self.request_body = request_data.partition('\r\n\r\n')[2].encode('utf-8', errors='ignore')
+            
             lines = request_data.strip().split('\r\n')
             if not lines or not lines[0].strip():
                 self.send_error_response(400, "Bad Request: Empty request line")
@@ -193,7 +253,7 @@ class NTRIPHandler:
                 self.send_error_response(405, f"Method Not Allowed: {method}")
         
         except socket.timeout:
-            log_debug(f"客户端 {self.client_address} 连接超时")
+            log_debug(f"客户端 {self.client_address} 连接超时（握手期限 {config.HANDSHAKE_TIMEOUT} 秒）")
             
             self._cleanup()
         except UnicodeDecodeError as e:
@@ -567,8 +627,15 @@ class NTRIPHandler:
             return '[REQUEST DATA - SANITIZATION FAILED]'
     
     def verify_user(self, mount, auth_header, request_type="upload"):
-        """验证NTRIP请求的用户和挂载点是否合法
+        """验证NTRIP请求的用户和挂载点是否合法，认证成功的IP进入准入优先通道
         """
+        is_valid, message = self._verify_user(mount, auth_header, request_type)
+        if is_valid:
+            admission.mark_trusted(self.client_address[0])
+        return is_valid, message
+    
+    def _verify_user(self, mount, auth_header, request_type="upload"):
+        """验证用户和挂载点"""
         try:
             # 统一处理挂载点名称，确保去除前导/
             mount_name = mount.lstrip('/')
@@ -730,7 +797,8 @@ class NTRIPHandler:
 
             if request_type == "download":
                 
-                is_valid, error_msg = self.db_manager.verify_download_user(mount_name, username, password)
+                is_valid, error_msg = self.db_manager.verify_download_user(mount_name, username, password,
+                                                                            check_mount=not self._is_nearest_mount(mount_name))
             else:
                 
                 if self.protocol_type == "ntrip2_0":
@@ -779,7 +847,8 @@ class NTRIPHandler:
 
             if request_type == "download":
                
-                is_valid, error_msg = self.db_manager.verify_download_user(mount_name, username, stored_password)
+                is_valid, error_msg = self.db_manager.verify_download_user(mount_name, username, stored_password,
+                                                                            check_mount=not self._is_nearest_mount(mount_name))
             else:
                 
                 if self.protocol_type == "ntrip2_0":
@@ -1050,8 +1119,7 @@ a=control:*
             # print(f"\n>>> 新的上传请求 - IP: {self.client_address[0]}, 挂载点: {path.lstrip('/')}, 时间: {datetime.now().strftime('%H:%M:%S.%f')[:-3]}")
             # print(f">>> 请求详情 - 方法: POST, 路径: {path}, 用户代理: {headers.get('User-Agent', 'Unknown')}")
             
-            connection.get_connection_manager().cleanup_zombie_connections()
-            connection.get_connection_manager().force_refresh_connections()
+            # 僵尸连接由liveness巡检线程在后台清理，不在握手路径上执行
             
             # 提取挂载点名称
             mount = path.lstrip('/')
@@ -1115,6 +1183,7 @@ a=control:*
                     return
 
                 self.mount_connection_established = True
+                liveness.apply_user_timeout(self.client_socket)
                 
                 if success:
                     logger.log_info(f"挂载点 {mount} 已成功添加到连接管理器: {message}")
@@ -1123,6 +1192,7 @@ a=control:*
             except Exception as e:
                 logger.log_error(f"添加挂载点 {mount} 到连接管理器时发生异常: {e}", exc_info=True)
 
+            self._enter_streaming()
             self.send_upload_success_response()
             
             username_for_log = getattr(self, 'username', mount) if hasattr(self, 'username') else mount
@@ -1140,7 +1210,12 @@ a=control:*
         try:
             
             if path.strip().lower() in ['/', '', '/sourcetable']:
-                self._send_mount_list()
+                self._send_mount_list(headers)
+                return
+            
+            # NTRIP 2.0源表过滤请求: GET /?STR;;;;;;GPS+GLO
+            if path.startswith('/?'):
+                self._send_mount_list(headers, unquote(path[2:]).strip())
                 return
             
             mount = path.lstrip('/')
@@ -1153,18 +1228,19 @@ a=control:*
                 self.send_auth_challenge(message)
                 return
             
+            if self._is_nearest_mount(mount):
+                self._handle_nearest_download()
+                return
+            
             if not self.db_manager.check_mount_exists_in_db(mount):
                 self.send_error_response(404, "Mount point not found")
                 return
             
-            # 添加到连接管理器
-            connection_id = connection.add_user_connection(self.username, mount, self.client_address[0])
-            
-            # 添加客户端到转发器
+            # 添加客户端到转发器（同时登记到连接管理器）
             try:
                 self.client_info = forwarder.add_client(self.client_socket, self.username, mount,
                                                        self.user_agent, self.client_address, 
-                                                       self.ntrip_version, connection_id)
+                                                       self.ntrip_version)
                 if not self.client_info:
                     self.send_error_response(500, "Failed to add client")
                     return
@@ -1173,6 +1249,7 @@ a=control:*
                 self.send_error_response(500, "Failed to add client")
                 return
             
+            self._enter_streaming()
             self.send_download_success_response()
             
             logger.log_client_connect(self.username, mount, self.client_address[0], self.user_agent)
@@ -1201,22 +1278,37 @@ a=control:*
     
     def _receive_rtcm_data(self, mount):
         """接收RTCM数据循环"""
+        # 本线程是该挂载点统计的唯一写入者，循环外取一次统计记录
+        stats = connection.get_mount_stats(mount)
+        selector = selectors.DefaultSelector()
         try:
+            selector.register(self.client_socket, selectors.EVENT_READ)
             while True:
                 try:
-                    data = self.client_socket.recv(BUFFER_SIZE)
+                    # 先等socket可读再进入读取：平滑重启冻结后不再recv，未读数据留在内核缓冲区由新进程读取
+                    if not selector.select(self.client_socket.gettimeout()):
+                        # 与recv超时处理一致（socket已被其他线程关闭时也在这里退出）
+                        raise socket.timeout("timed out")
+                    if not handoff.begin_upload_read():
+                        # 连接已交给新进程，本进程不再转发也不清理
+                        self.handed_off = True
+                        break
+                    try:
+                        data = self.client_socket.recv(BUFFER_SIZE)
+                        if data:
+                            forwarder.upload_data(mount, data)
+                            if stats is not None:
+                                stats.record(data)
+                    finally:
+                        handoff.end_upload_read()
                     if not data:
                         # 连接已关闭
                         logger.log_debug(f"挂载点 {mount} 连接已关闭", 'ntrip')
                         break
                     
-                    forwarder.upload_data(mount, data)
-
-                    connection.get_connection_manager().update_mount_data_stats(mount, len(data))
-                    
                 except OSError as e:
                     
-                    if e.winerror == 10038:  #10038 
+                    if getattr(e, 'winerror', None) == 10038 or self.client_socket.fileno() == -1:  #10038 
                         logger.log_debug(f"挂载点 {mount} socket已被关闭，停止接收数据", 'ntrip')
                     else:
                         logger.log_error(f"挂载点 {mount} socket错误: {e}", 'ntrip')
@@ -1228,34 +1320,40 @@ a=control:*
         except Exception as e:
             logger.log_error(f"接收RTCM数据异常: {e}", exc_info=True)
         finally:
+            selector.close()
+            if self.handed_off:
+                logger.log_debug(f"挂载点 {mount} 已交给新进程", 'ntrip')
+            else:
+                self._schedule_mount_cleanup(mount)
+    
+    def _schedule_mount_cleanup(self, mount):
+        """挂载点断开：1.5秒后清理连接和缓冲区"""
+        client_socket = self.client_socket
+        
+        def delayed_cleanup():
+            """延迟清理函数（在时间轮线程中执行）"""
+            # 只清理本次连接，1.5秒内同名挂载点已重连时保留新连接和缓冲区
+            try:
+                connection.get_connection_manager().remove_mount_connection(mount, client_socket=client_socket)
+            except Exception as e:
+                log_warning(f"清理挂载点连接失败: {e}")
             
-            def delayed_cleanup():
-                """延迟清理函数"""
+            if not connection.is_mount_online(mount):
                 try:
                     forwarder.remove_mount_buffer(mount)
                 except Exception as e:
                     logger.log_warning(f"清理转发器缓冲区失败: {e}", 'ntrip')
-                
-                try:
-                    connection.get_connection_manager().remove_mount_connection(mount)
-                except Exception as e:
-                    log_warning(f"清理挂载点连接失败: {e}")
-                
-
-                logger.log_mount_operation('disconnected', mount)
-                # 改为debug级别，避免频繁日志
-                log_debug(f"挂载点 {mount} 延迟清理完成")
-            
-            # 记录断开事件，改为warning级别以确保重要信息被记录
-            log_warning(f"挂载点 {mount} 连接断开，将在1.5秒后清理数据")
-            
-
-            cleanup_timer = threading.Timer(1.5, delayed_cleanup)
-            cleanup_timer.daemon = True  # 设置为守护线程
-            cleanup_timer.start()
             
-
-            self._cleanup()
+            logger.log_mount_operation('disconnected', mount)
+            # 改为debug级别，避免频繁日志
+            log_debug(f"挂载点 {mount} 延迟清理完成")
+        
+        # 记录断开事件，改为warning级别以确保重要信息被记录
+        log_warning(f"挂载点 {mount} 连接断开，将在1.5秒后清理数据")
+        
+        timerwheel.schedule(1.5, delayed_cleanup)
+        
+        self._cleanup()
     
     def _keep_connection_alive(self):
         """保持下载连接活跃）"""
@@ -1282,84 +1380,143 @@ a=control:*
                 forwarder.remove_client(self.client_info)
                 logger.log_client_disconnect(self.username, self.mount, self.client_address[0])
     
-    def _send_mount_list(self):
-        """发送挂载点列表"""
+    def resume_session(self, session):
+        """接管平滑重启前已建立的会话：恢复会话状态后直接进入数据循环，不重复握手和认证"""
+        self.mount = session['mount']
+        self.username = session.get('user') or self.mount
+        self.user_agent = session.get('agent', '')
+        self.ntrip_version = session.get('ntrip_version', '1.0')
+        self._enter_streaming()
+        
+        if session['kind'] == 'mount':
+            connection.get_connection_manager().add_mount_connection(self.mount, self.client_address[0], self.user_agent,
+                                                                     self.ntrip_version, self.client_socket)
+            self.mount_connection_established = True
+            liveness.apply_user_timeout(self.client_socket)
+            log_info(f"平滑重启: 已接管挂载点 {self.mount} ({self.client_address[0]})")
+            self._receive_rtcm_data(self.mount)
+            return
+        
+        self.client_info = forwarder.add_client(self.client_socket, self.username, self.mount,
+                                                self.user_agent, self.client_address, self.ntrip_version)
+        # 恢复转发游标，只发送旧进程尚未发出的数据
+        for field in handoff.CLIENT_CURSOR_FIELDS:
+            if field in session:
+                setattr(self.client_info, field, session[field])
+        accounting.session_resumed(self.client_info)
+        
+        virtual_mount = session.get('virtual_mount')
+        if not virtual_mount:
+            self._keep_connection_alive()
+            return
+        self.client_info.virtual_mount = virtual_mount
+        self.mount = virtual_mount
         try:
-            from . import config
-            from datetime import datetime
-            
-            mount_list = connection.generate_mount_list()
-            logger.log_debug(f"生成的挂载点列表: {mount_list}", 'ntrip')
-            
-            
-            content_lines = []
-            
-            # 添加CAS信息（Caster信息）
-            # 复用现有配置: server_name=author, server_port=NTRIP_PORT, operator=APP_NAME, network_name=author, website_url=APP_WEBSITE, fallback_ip=HOST
-            cas_line = f"CAS;{config.APP_AUTHOR};{config.NTRIP_PORT};{config.APP_NAME};{config.APP_AUTHOR};0;{config.CASTER_COUNTRY};{config.CASTER_LATITUDE};{config.CASTER_LONGITUDE};{config.HOST};0;{config.APP_WEBSITE}"
-            content_lines.append(cas_line)
-            
-            # 添加NET信息（Network信息）
-            net_line = f"NET;{config.APP_AUTHOR};{config.APP_AUTHOR};B;{config.CASTER_COUNTRY};{config.APP_WEBSITE};{config.APP_WEBSITE};{config.APP_CONTACT};none"
-            content_lines.append(net_line)
-            
-            # 添加STR表数据
-            content_lines.extend(mount_list)
+            self._nearest_session_loop(config.NEAREST_MAX_DISTANCE or None)
+        except (OSError, ValueError) as e:
+            log_debug(f"虚拟挂载点 {self.mount} 连接结束 {self.client_address}: {e}")
+        finally:
+            forwarder.remove_client(self.client_info)
+    
+    def _is_nearest_mount(self, mount):
+        """是否为虚拟最近挂载点"""
+        return bool(config.NEAREST_MOUNT) and mount == config.NEAREST_MOUNT
+    
+    def _read_gga(self, nmea_buffer, timeout):
+        """在timeout秒内读取流动站上行数据，返回最后一条有效GGA；连接关闭时抛出ConnectionError"""
+        ready, _, _ = select.select([self.client_socket], [], [], timeout)
+        if not ready:
+            return None
+        data = self.client_socket.recv(4096)
+        if not data:
+            raise ConnectionError("流动站已断开连接")
+        return nmea_buffer.latest_gga(data)
+    
+    def _handle_nearest_download(self):
+        """虚拟最近挂载点：读取流动站GGA，接入最近的在线基站，并随位置变化重新选择"""
+        max_distance = config.NEAREST_MAX_DISTANCE or None
+        nmea_buffer = nmea.NMEALineBuffer()
+        self.client_info = None
+        
+        # 先响应200，多数流动站收到响应后才开始上传GGA；等待GGA有单独的期限
+        self._enter_streaming()
+        self.send_download_success_response()
+        
+        try:
+            fix = nmea_buffer.latest_gga(self.request_body) if self.request_body else None
+            deadline = time.time() + config.NEAREST_GGA_TIMEOUT
+            while fix is None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    log_info(f"虚拟挂载点 {self.mount}: {self.client_address[0]} 未在 {config.NEAREST_GGA_TIMEOUT} 秒内发送有效GGA，断开连接")
+                    return
+                fix = self._read_gga(nmea_buffer, remaining)
             
-            # 将内容转换为字符串
-            content_str = '\r\n'.join(content_lines) + '\r\n' if content_lines else '\r\n'
-            log_debug(f"挂载点列表内容长度: {len(content_str)}")
+            target, distance = spatial.find_nearest_mount(fix.lat, fix.lon, max_distance)
+            if target is None:
+                log_info(f"虚拟挂载点 {self.mount}: 用户 {self.username} 位置 ({fix.lat:.4f}, {fix.lon:.4f}) 附近没有可用基站")
+                return
             
-            if self.ntrip_version == "2.0":
-                # NTRIP 2.0格式 - 使用标准HTTP响应
-                current_time = datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S GMT')
-                
-                # 构建HTTP响应头
-                response_lines = [
-                    "HTTP/1.1 200 OK",
-                    f"Server: NTRIP 2RTK caster {config.APP_VERSION}",
-                    f"Date: {current_time}",
-                    "Ntrip-Version: Ntrip/2.0",
-                    f"Content-Length: {len(content_str.encode('utf-8'))}",
-                    "Content-Type: text/plain",
-                    "Connection: close",
-                    "",  # 空行分隔头部和内容
-                    content_str
-                ]
-                
-                response = '\r\n'.join(response_lines)
-                try:
-                    self.client_socket.send(response.encode('utf-8'))
-                    log_debug(f"发送NTRIP 2.0格式挂载点列表到 {self.client_address}")
-                except Exception as e:
-                    logger.log_error(f"发送NTRIP 2.0挂载点列表失败: {e}", exc_info=True)
+            self.client_info = forwarder.add_client(self.client_socket, self.username, target,
+                                                    self.user_agent, self.client_address, self.ntrip_version)
+            self.client_info.virtual_mount = self.mount
+            if self.client_info.position is None:
+                # 用接入前读到的GGA作为初始位置，之后由上行读取线程更新
+                position = uplink.RoverPosition()
+                position.update(fix, time.time())
+                self.client_info.position = position
+            log_info(f"虚拟挂载点 {self.mount}: 用户 {self.username} 接入最近基站 {target}，距离 {distance:.1f} km")
+            
+            self._nearest_session_loop(max_distance)
+        except (OSError, ValueError, ConnectionError) as e:
+            log_debug(f"虚拟挂载点 {self.mount} 连接结束 {self.client_address}: {e}")
+        finally:
+            if self.client_info:
+                forwarder.remove_client(self.client_info)
             else:
-                # NTRIP 1.0格式 - 使用SOURCETABLE格式
-                current_time = datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S GMT')
-                
-                response_lines = [
-                    "SOURCETABLE 200 OK",
-                    f"Server: NTRIP 2RTK caster {config.APP_VERSION}",
-                    f"Date: {current_time}",
-                    "Ntrip-Version: Ntrip/1.0",
-                    f"Content-Length: {len(content_str.encode('utf-8'))}",
-                    "Content-Type: text/plain",
-                    "Connection: close",
-                    "",  # 空行分隔头部和内容
-                    content_str,
-                    "ENDSOURCETABLE"
-                ]
-                
-                response = '\r\n'.join(response_lines)
-                log_debug(f"NTRIP 1.0响应内容: {repr(response[:200])}...")
                 try:
-                    self.client_socket.send(response.encode('utf-8'))
-                    log_debug(f"发送NTRIP 1.0格式挂载点列表到 {self.client_address}")
-                except Exception as e:
-                    logger.log_error(f"发送NTRIP 1.0挂载点列表失败: {e}", exc_info=True)
-            
-            log_debug(f"发送挂载点列表到 {self.client_address}")
+                    self.client_socket.close()
+                except Exception:
+                    pass
+    
+    def _nearest_session_loop(self, max_distance):
+        """定期或当前基站下线时按流动站最新位置重新选择最近基站
         
+        接入后上行GGA由转发器的上行读取线程解析，这里只读取client_info中的位置。
+        """
+        last_check = time.time()
+        # 客户端被移除（流动站断开、发送失败、管理员强制下线）时socket会被关闭
+        while self.client_socket.fileno() != -1:
+            time.sleep(1.0)
+            position = self.client_info.position
+            if position is None:
+                continue
+            
+            current = self.client_info.mount
+            now = time.time()
+            mount_online = connection.is_mount_online(current)
+            if mount_online and now - last_check < config.NEAREST_RESELECT_INTERVAL:
+                continue
+            last_check = now
+            
+            target, distance = spatial.find_nearest_mount(position.lat, position.lon, max_distance)
+            if target is None:
+                if not mount_online:
+                    log_info(f"虚拟挂载点 {self.mount}: 基站 {current} 已下线且附近没有可用基站，断开用户 {self.username}")
+                    return
+                continue
+            if target != current and forwarder.move_client(self.client_info, target):
+                log_info(f"虚拟挂载点 {self.mount}: 用户 {self.username} 从基站 {current} 切换到 {target}，距离 {distance:.1f} km")
+    
+    def _send_mount_list(self, headers=None, query=''):
+        """发送挂载点列表（源表），直接发送缓存中预渲染的响应字节，query为源表过滤串"""
+        headers = headers or {}
+        if_none_match = next((v for k, v in headers.items() if k.lower() == 'if-none-match'), '')
+        accept_encoding = next((v for k, v in headers.items() if k.lower() == 'accept-encoding'), '')
+        try:
+            response = sourcetable.get_sourcetable_response(self.ntrip_version, if_none_match, accept_encoding, query)
+            self.client_socket.sendall(response)
+            log_debug(f"发送NTRIP {self.ntrip_version}格式挂载点列表到 {self.client_address}")
         except Exception as e:
             log_error(f"发送挂载点列表异常: {e}", exc_info=True)
     
@@ -1519,12 +1676,13 @@ a=control:*
             if hasattr(self, 'username') and hasattr(self, 'mount'):
                 if hasattr(self, 'client_info'):  # 下载连接
                     # print(f">>> 移除用户连接 - 用户: {self.username}, 挂载点: {self.mount}")
-                    connection.remove_user_connection(self.username, self.client_address[0], self.mount)
+                    if self.client_info:
+                        connection.remove_user_connection(self.client_info)
                 else:  # 上传连接
                     # 只有真正成功建立的挂载点连接才在断开时移除
                     if hasattr(self, 'mount_connection_established') and self.mount_connection_established:
                         # print(f">>> 移除挂载点连接 - 挂载点: {self.mount}")
-                        connection.remove_mount_connection(self.mount)
+                        connection.get_connection_manager().remove_mount_connection(self.mount, client_socket=self.client_socket)
                     else:
                         # print(f">>> 跳过移除挂载点连接 - 挂载点: {self.mount} (连接未成功建立)")
                         pass
@@ -1538,20 +1696,45 @@ a=control:*
             logger.log_error(f"清理资源时出错: {e}", exc_info=True)
 
 class NTRIPCaster:
-    """NTRIP Caster服务器 - 使用线程池处理高并发连接"""
+    """NTRIP Caster服务器 - 使用线程池处理高并发连接
+
+    握手完成的连接直接放入有界优先级队列，由空闲工作线程取出处理（队列到工作线程只有一次交接）；
+    没有空闲工作线程且未达到MAX_WORKERS时按需创建，空闲超过WORKER_IDLE_TIMEOUT秒的工作线程退出。
+    """
     
-    def __init__(self, db_manager):
-        self.server_socket = None
+    def __init__(self, db_manager, listener=None):
+        self.server_socket = listener  # 平滑重启时为从旧进程接管的监听socket
         self.running = False
+        self.accepting = True
+        self.accept_stopped = threading.Event()
         self.db_manager = db_manager
 
-        self.thread_pool = None
-        self.connection_queue = Queue(maxsize=CONNECTION_QUEUE_SIZE)
+        # 优先级队列: (优先级, 序号, socket, 地址, 请求头数据)，优先通道的连接先被处理
+        self.connection_queue = PriorityQueue(maxsize=CONNECTION_QUEUE_SIZE)
+        # 空闲工作线程计数：每个空闲线程持有一个信号量，入队时占用一个，占用失败才创建新线程
+        self.idle_workers = threading.Semaphore(0)
+        self.workers = set()
+        # 请求头在握手线程中读取，只有握手完成的连接才进入队列
+        self.handshake_reader = handshake.HandshakeReader(self._on_handshake_ready, self._on_handshake_closed)
+        self.connection_seq = itertools.count(1)
         self.active_connections = 0
         self.connection_lock = threading.Lock()
 
         self.total_connections = 0
         self.rejected_connections = 0
+        config.subscribe(self._apply_config_changes)
+    
+    def _apply_config_changes(self, changed):
+        """配置热加载：调整连接队列容量和监听队列长度（工作线程上限在下次创建线程时生效）"""
+        if 'CONNECTION_QUEUE_SIZE' in changed:
+            with self.connection_queue.mutex:
+                self.connection_queue.maxsize = CONNECTION_QUEUE_SIZE
+                self.connection_queue.not_full.notify_all()
+        if 'MAX_CONNECTIONS' in changed and self.running and self.server_socket is not None:
+            try:
+                self.server_socket.listen(MAX_CONNECTIONS)
+            except OSError as e:
+                log_warning(f"调整监听队列长度失败: {e}")
     
     def start(self):
         """启动NTRIP服务器"""
@@ -1569,18 +1752,15 @@ class NTRIPCaster:
     
     def _start_ntrip_server(self):
         """启动NTRIP服务器"""
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_socket.bind(('0.0.0.0', NTRIP_PORT))
-        self.server_socket.listen(MAX_CONNECTIONS)
+        if self.server_socket is None:
+            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server_socket.bind(('0.0.0.0', NTRIP_PORT))
+            self.server_socket.listen(MAX_CONNECTIONS)
         self.running = True
         
-        self.thread_pool = ThreadPoolExecutor(
-            max_workers=MAX_WORKERS,
-            thread_name_prefix="NTRIP-Worker"
-        )
-        
-        self._start_connection_handler()
+        self.handshake_reader.start()
+        admission.get_controller().start()
 
         ntrip_urls = config.get_display_urls(NTRIP_PORT, "NTRIP服务器")
         if len(ntrip_urls) == 1:
@@ -1590,32 +1770,34 @@ class NTRIPCaster:
             for url in ntrip_urls:
                 log_system_event(f'  - {url}')
         
-        log_system_event(f'线程池大小: {MAX_WORKERS}, 连接队列大小: {CONNECTION_QUEUE_SIZE}')
+        log_system_event(f'线程池大小: {MAX_WORKERS}, 连接队列大小: {CONNECTION_QUEUE_SIZE}, 握手期限: {config.HANDSHAKE_TIMEOUT} 秒')
     
 
     def _main_loop(self):
         """主循环，接受客户端连接"""
-        while self.running:
+        try:
+            self._accept_loop()
+        finally:
+            self.accept_stopped.set()
+    
+    def _accept_loop(self):
+        while self.running and self.accepting:
             try:
                 client_socket, client_address = self.server_socket.accept()
                 
-                # 检查连接数限制
-                with self.connection_lock:
-                    if self.active_connections >= MAX_CONNECTIONS:
-                        log_warning(f"连接数已达上限 {MAX_CONNECTIONS}，拒绝连接 {client_address}")
-                        client_socket.close()
+                # 准入控制：黑白名单、全局容量、单IP并发和速率限制，拒绝时直接RST关闭
+                result, reason = admission.admit(client_address[0], self.connection_queue.qsize())
+                if result is None:
+                    admission.close_rejected(client_socket)
+                    with self.connection_lock:
                         self.rejected_connections += 1
-                        continue
+                    log_debug(f"拒绝连接 {client_address}: {reason}")
+                    continue
 
-                try:
-                    self.connection_queue.put((client_socket, client_address), timeout=1.0)
-                    with self.connection_lock:
-                        self.total_connections += 1
-                    log_info(f"接受连接来自 {client_address}, 队列大小: {self.connection_queue.qsize()}, 活跃连接: {self.active_connections}")
-                except Full:
-                    log_warning(f"连接队列已满，拒绝连接 {client_address}")
-                    client_socket.close()
-                    self.rejected_connections += 1
+                priority = 0 if result == admission.ADMIT_PRIORITY else 1
+                with self.connection_lock:
+                    self.total_connections += 1
+                self.handshake_reader.add(client_socket, client_address, priority)
             
             except socket.error as e:
                 if self.running:
@@ -1625,51 +1807,120 @@ class NTRIPCaster:
                 log_error(f"主循环异常: {e}", exc_info=True)
                 break
     
-    def _start_connection_handler(self):
-        """启动连接处理器线程"""
-        handler_thread = Thread(target=self._connection_handler, daemon=True)
-        handler_thread.start()
-        log_debug("连接处理器已启动")
+    def _on_handshake_ready(self, client_socket, client_address, priority, data):
+        """请求头已完整（握手线程回调），放入连接队列并唤醒或创建工作线程"""
+        try:
+            self.connection_queue.put_nowait((priority, next(self.connection_seq), client_socket, client_address, data))
+            self._ensure_worker()
+            log_debug(f"接受连接来自 {client_address}, 队列大小: {self.connection_queue.qsize()}, 活跃连接: {self.active_connections}")
+        except Full:
+            log_warning(f"连接队列已满，拒绝连接 {client_address}")
+            admission.get_controller().reject_queued(client_address[0])
+            admission.close_rejected(client_socket)
+            with self.connection_lock:
+                self.rejected_connections += 1
     
-    def _connection_handler(self):
-        """连接处理器，从队列中取出连接并提交给线程池"""
-        while self.running:
+    def _on_handshake_closed(self, client_socket, client_address, reason):
+        """握手未完成的连接被关闭（握手线程回调）"""
+        log_debug(f"关闭未完成握手的连接 {client_address}: {reason}")
+        admission.release(client_address[0])
+        admission.close_rejected(client_socket)
+    
+    def freeze(self):
+        """平滑重启：停止接受新连接并取出握手中和排队中的连接
+
+        Returns:
+            tuple: (监听socket, [(socket, 地址, 优先级, 已读数据)])
+        """
+        self.accepting = False
+        # 主循环阻塞在accept上，用一个本地连接唤醒；accept到的连接照常进入握手线程并随之交接
+        try:
+            socket.create_connection(('127.0.0.1', self.server_socket.getsockname()[1]), timeout=1).close()
+        except OSError:
+            pass
+        self.accept_stopped.wait(5)
+        
+        pending = self.handshake_reader.stop(detach=True)
+        while True:
             try:
+                priority, _, client_socket, client_address, data = self.connection_queue.get_nowait()
+            except Empty:
+                break
+            if client_socket is not None:
+                pending.append((client_socket, client_address, priority, data))
+        return self.server_socket, pending
+    
+    def adopt(self, pending, sessions):
+        """平滑重启：接管旧进程交来的握手中连接和已建立的会话"""
+        controller = admission.get_controller()
+        for client_socket, client_address, priority, data in pending:
+            controller.acquire(client_address[0])
+            self.handshake_reader.add(client_socket, client_address, priority, data)
+        for session in sessions:
+            controller.acquire(session['addr'][0])
+            self.connection_queue.put((0, next(self.connection_seq), session.pop('socket'), session['addr'], session))
+            self._ensure_worker()
+        log_system_event(f'已接管 {len(pending)} 个握手中连接和 {len(sessions)} 个会话')
+    
+    def _ensure_worker(self):
+        """有空闲工作线程时由它取走新连接，否则在MAX_WORKERS以内新建工作线程"""
+        if self.idle_workers.acquire(blocking=False):
+            return
+        with self.connection_lock:
+            if len(self.workers) >= MAX_WORKERS:
+                # 已达上限，连接在队列中等待工作线程空闲
+                return
+            worker = Thread(target=self._worker_loop, name=f"NTRIP-Worker-{len(self.workers)}", daemon=True)
+            self.workers.add(worker)
+        worker.start()
+    
+    def _worker_loop(self):
+        """工作线程：从连接队列取出连接并处理"""
+        try:
+            while self.running:
+                try:
+                    _, _, client_socket, client_address, data = self.connection_queue.get(timeout=WORKER_IDLE_TIMEOUT)
+                except Empty:
+                    # 空闲超时：收回自己的空闲名额后退出；名额已被入队方占用时说明有连接正在路上
+                    if self.idle_workers.acquire(blocking=False):
+                        break
+                    continue
+                if client_socket is None:
+                    break
                 
-                client_socket, client_address = self.connection_queue.get(timeout=1.0)
-                
-                future = self.thread_pool.submit(self._handle_client_connection, client_socket, client_address)
-
                 with self.connection_lock:
                     self.active_connections += 1
-                
-                log_info(f"连接 {client_address} 已提交给线程池处理")
-                
-            except Empty:
-                
-                continue
-            except Exception as e:
-                log_error(f"连接处理器异常: {e}", exc_info=True)
+                self._handle_client_connection(client_socket, client_address, data)
+                self.idle_workers.release()
+        finally:
+            with self.connection_lock:
+                self.workers.discard(threading.current_thread())
     
-    def _handle_client_connection(self, client_socket, client_address):
+    def _handle_client_connection(self, client_socket, client_address, data=None):
         """处理单个客户端连接"""
         try:
             
-            handler = NTRIPHandler(client_socket, client_address, self.db_manager)
-            handler.handle_request()
+            if isinstance(data, dict):
+                # 平滑重启时从旧进程接管的会话
+                handler = NTRIPHandler(client_socket, client_address, self.db_manager)
+                handler.resume_session(data)
+            else:
+                handler = NTRIPHandler(client_socket, client_address, self.db_manager, data)
+                handler.handle_request()
         except Exception as e:
             log_error(f"处理客户端连接 {client_address} 时发生异常: {e}", exc_info=True)
         finally:
            
             with self.connection_lock:
                 self.active_connections -= 1
+            admission.release(client_address[0])
             
             try:
                 client_socket.close()
             except:
                 pass
             
-            log_info(f"客户端连接 {client_address} 处理完成，活跃连接: {self.active_connections}")
+            log_debug(f"客户端连接 {client_address} 处理完成，活跃连接: {self.active_connections}")
     
     def get_performance_stats(self):
         """获取性能统计信息"""
@@ -1681,7 +1932,10 @@ class NTRIPCaster:
                 'queue_size': self.connection_queue.qsize(),
                 'max_connections': MAX_CONNECTIONS,
                 'max_workers': MAX_WORKERS,
-                'connection_queue_size': CONNECTION_QUEUE_SIZE
+                'workers': len(self.workers),
+                'connection_queue_size': CONNECTION_QUEUE_SIZE,
+                'handshake': self.handshake_reader.get_stats(),
+                'admission': admission.get_admission_stats()
             }
     
     def log_performance_stats(self):
@@ -1698,6 +1952,8 @@ class NTRIPCaster:
         log_system_event('正在关闭NTRIP服务器')
         
         self.running = False
+        admission.get_controller().stop()
+        self.handshake_reader.stop()
         
         if self.server_socket:
             try:
@@ -1705,22 +1961,28 @@ class NTRIPCaster:
             except:
                 pass
         
-        if self.thread_pool:
-            logger.log_system_event("正在关闭线程池...")
-            
-            self.thread_pool.shutdown(wait=True)
-            log_system_event("线程池已关闭")
-        
         while not self.connection_queue.empty():
             try:
-                client_socket, client_address = self.connection_queue.get_nowait()
+                _, _, client_socket, client_address, _ = self.connection_queue.get_nowait()
+                if client_socket is None:
+                    continue
                 client_socket.close()
+                admission.release(client_address[0])
                 log_debug(f"清理队列中的连接: {client_address}")
             except Empty:
                 break
             except Exception as e:
                 log_error(f"清理连接队列时发生异常: {e}", exc_info=True)
         
+        # 唤醒空闲的工作线程退出，正在处理连接的线程在连接结束后退出
+        with self.connection_lock:
+            workers = list(self.workers)
+        for _ in workers:
+            try:
+                self.connection_queue.put_nowait((-1, next(self.connection_seq), None, None, None))
+            except Full:
+                break
+        log_system_event(f"工作线程已通知退出: {len(workers)} 个")
         
         log_system_event(f'NTRIP服务器已停止 - 总连接数: {self.total_connections}, 拒绝连接数: {self.rejected_connections}')
         log_system_event('NTRIP服务器已关闭')
@@ -13,7 +13,7 @@ from typing import Dict, Optional, Callable, List, Tuple
 from collections import defaultdict
 
 # 第三方库导入
-from pyrtcm import RTCMReader, RTCMMessage, parse_msm
+from pyrtcm import RTCMReader, RTCMMessage, RTCMParseError, RTCMMessageError, RTCMTypeError, parse_msm, scan_frames
 from pyproj import Transformer
 
 # 本地模块导入
@@ -150,6 +150,11 @@ CARRIER_INFO = {
     (1047, 1047): ("SBAS", "L1+L2+L5")
 }
 
+# STR修正模式只需完整解码的消息类型，其余消息只按帧头计数
+STR_FIX_MESSAGES = (1005, 1006, 1033)
+# RTCM3最长帧（3字节帧头 + 1023字节消息体 + 3字节CRC）
+RTCM3_MAX_FRAME = 1029
+
 # 数据类型枚举
 class DataType:
     MSM_SATELLITE = "msm_satellite"  # MSM卫星信号数据
@@ -208,9 +213,8 @@ class RTCMParserThread(threading.Thread):
         try:
             # 注册数据订阅
             forwarder.register_subscriber(self.mount_name, self.pipe_w)
-            stream = self.pipe_r.makefile("rb")
-            reader = RTCMReader(stream)
             self.start_time = time.time()
+            buffer = b''
 
             while self.running.is_set():
                 # STR模式超时检查
@@ -218,59 +222,31 @@ class RTCMParserThread(threading.Thread):
                     log_info(f"RTCM解析线程已完成 [挂载点: {self.mount_name}, 时长: {self.duration}s]")
                     break
 
-                # 读取并解析消息
                 try:
-                    raw, msg = next(reader)
-                    if not msg:
-                        continue
-                    
-                    # 检查是否需要启用统计（延迟5秒后开始）
-                    current_time = time.time()
-                    if not self.stats_enabled and current_time - self.start_time >= self.stats_delay:
-                        self.stats_enabled = True
-                        self.stats_start_time = current_time  # 重置统计开始时间
-                        self.last_stats_time = current_time
-                        self.total_bytes = 0  # 重置字节计数
-                        log_info(f"开始统计比特率 [挂载点: {self.mount_name}] - 延迟{self.stats_delay}秒后启用")
-                    
-                    # 更新总字节数（仅在统计启用后）
-                    if self.stats_enabled:
-                        self.total_bytes += len(raw)
-                    
-                    # 解析消息类型
-                    msg_id = self._get_msg_id(msg)
-                    if msg_id:
-                        # 调试：记录特殊消息类型
-                        # if msg_id in (1005, 1006, 1033):
-                        #     log_info(f"[RTCM解析] 接收到消息类型 {msg_id} - 挂载点: {self.mount_name}")
-                        
-                        # 通用统计更新
-                        self._update_message_stats(msg_id)
-                        
-                        # 模式分发处理
-                        if self.mode == "str_fix":
-                            self._process_str_fix(msg, msg_id, raw)
-                        else:  # realtime_web
-                            self._process_realtime_web(msg, msg_id, raw)
-                    
-                    # 10秒统计更新（仅在统计启用后）
-                    if self.stats_enabled and time.time() - self.last_stats_time >= 10:
-                        self._calculate_bitrate()
-                        self._calculate_message_frequency()
-                        self._generate_gnss_carrier_info()
-
-                except StopIteration:
-                    break
+                    data = self.pipe_r.recv(4096)
                 except socket.timeout:
                     continue
-                except Exception as e:
-                    # 对超时相关错误进行特殊处理，避免日志过多
-                    error_msg = str(e)
-                    if "timed out" in error_msg.lower() or "timeout" in error_msg.lower():
-                        # 超时错误只记录调试信息，不记录错误日志
-                        continue
-                    else:
-                        log_error(f"消息解析错误 [挂载点: {self.mount_name}]: {error_msg}")
+                if not data:
+                    break
+
+                # 按帧头切分，只有本模式需要的消息才构造RTCMMessage完整解码
+                buffer = buffer + data if buffer else data
+                pos = len(buffer)
+                for frame in scan_frames(buffer):
+                    if not frame.complete:
+                        pos = frame.offset
+                        break
+                    try:
+                        self._process_frame(buffer, frame)
+                    except Exception as e:
+                        log_error(f"消息解析错误 [挂载点: {self.mount_name}]: {e}")
+                buffer = buffer[pos:] if len(buffer) - pos < RTCM3_MAX_FRAME else b''
+
+                # 10秒统计更新（仅在统计启用后）
+                if self.stats_enabled and time.time() - self.last_stats_time >= 10:
+                    self._calculate_bitrate()
+                    self._calculate_message_frequency()
+                    self._generate_gnss_carrier_info()
 
         except Exception as e:
             log_error(f"解析线程异常 [挂载点: {self.mount_name}]: {str(e)}")
@@ -281,12 +257,43 @@ class RTCMParserThread(threading.Thread):
             self.pipe_w.close()
             log_info(f"解析线程停止 [挂载点: {self.mount_name}]")
 
-    def _get_msg_id(self, msg: RTCMMessage) -> Optional[int]:
-        """获取消息ID（安全处理）"""
+    def _process_frame(self, buffer: bytes, frame) -> None:
+        """处理一帧：按帧头统计字节数和消息类型，本模式需要的消息再完整解码"""
+        msg_id = frame.msgtype
+        if not msg_id:
+            return
+
+        # 检查是否需要启用统计（延迟5秒后开始）
+        current_time = time.time()
+        if not self.stats_enabled and current_time - self.start_time >= self.stats_delay:
+            self.stats_enabled = True
+            self.stats_start_time = current_time  # 重置统计开始时间
+            self.last_stats_time = current_time
+            self.total_bytes = 0  # 重置字节计数
+            log_info(f"开始统计比特率 [挂载点: {self.mount_name}] - 延迟{self.stats_delay}秒后启用")
+
+        # 更新总字节数（仅在统计启用后）
+        if self.stats_enabled:
+            self.total_bytes += frame.size
+
+        # 通用统计更新
+        self._update_message_stats(msg_id)
+
+        # STR修正模式只解码位置和设备信息消息
+        if self.mode == "str_fix" and msg_id not in STR_FIX_MESSAGES:
+            return
+        raw = buffer[frame.offset:frame.end]
         try:
-            return int(getattr(msg, 'identity', -1))
-        except (ValueError, TypeError):
-            return None
+            msg = RTCMReader.parse(raw, lazy=True)
+        except (RTCMParseError, RTCMMessageError, RTCMTypeError) as e:
+            log_debug(f"消息解码跳过 [挂载点: {self.mount_name}, 类型: {msg_id}]: {e}")
+            return
+
+        # 模式分发处理
+        if self.mode == "str_fix":
+            self._process_str_fix(msg, msg_id, raw)
+        else:  # realtime_web
+            self._process_realtime_web(msg, msg_id, raw)
 
     # -------------------------- 位置信息处理函数 --------------------------
     def _process_location_message(self, msg: RTCMMessage, msg_id: int) -> None:
@@ -649,9 +656,11 @@ class RTCMParserThread(threading.Thread):
                 log_error(f"数据推送失败: {str(e)}")
 
     # -------------------------- 线程控制 --------------------------
-    def stop(self) -> None:
-        """停止解析线程"""
+    def stop(self, wait: bool = True) -> None:
+        """停止解析线程；wait为False时只通知线程退出，线程在下一次读取返回或超时后自行清理"""
         self.running.clear()
+        if not wait:
+            return
         self.join(timeout=5)
         log_info(f"[挂载点: {self.mount_name}解析线程已关闭]")
 
@@ -51,12 +51,12 @@ class RTCM2ParserManager:
                 log_error(f"启动对[挂载点: {mount_name}]的RTCM数据解析失败: {str(e)}")
                 return False
 
-    def stop_parser(self, mount_name: str):
-        """停止解析器（兼容原接口）"""
+    def stop_parser(self, mount_name: str, wait: bool = True):
+        """停止解析器（兼容原接口）；wait为False时不等待解析线程退出"""
         with self.lock:
             if mount_name in self.parsers:
                 parser = self.parsers[mount_name]
-                parser.stop()
+                parser.stop(wait)
                 del self.parsers[mount_name]
                 
                 # 从对应的分类字典中删除
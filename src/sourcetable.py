@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+sourcetable.py - 源表缓存模块
+功能：预先渲染NTRIP 1.0/2.0源表响应字节，仅在挂载点上下线或STR变化时重建；
+      NTRIP 2.0支持ETag/If-None-Match条件请求和gzip压缩；
+      过滤请求（GET /?STR;...）由STR索引存储应答，常用过滤结果同样缓存
+"""
+
+import gzip
+import hashlib
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+from threading import Lock
+
+from . import config
+from . import connection
+from .logger import log_debug
+from .strstore import STRStore, parse_filter
+
+# 缓存的过滤结果数量上限
+FILTER_CACHE_SIZE = 64
+
+
+class SourcetableCache:
+    """版本化源表缓存
+
+    以ConnectionManager.sourcetable_version为版本号，版本不变时直接复用预渲染的响应字节。
+    响应中的Date头按秒刷新，只重拼头部，不重新生成正文。过滤结果按过滤串LRU缓存，版本变化时全部失效。
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+        self.cas_line = ''
+        self.net_line = ''
+        self.store = STRStore()
+        # 正文缓存(LRU): {过滤串: [正文, gzip正文或None, ETag]}，''为完整源表
+        self.bodies = OrderedDict()
+        # 预渲染的响应: {(过滤串, 变体): (日期秒, 响应字节)}
+        self.responses = {}
+        self.stats = {'hits': 0, 'rebuilds': 0, 'not_modified': 0, 'gzip': 0, 'filtered': 0}
+
+    def _refresh(self):
+        """版本变化时同步STR索引并清空正文缓存，调用方需持有self.lock"""
+        manager = connection.get_connection_manager()
+        # 版本号是整数，无需加mount_lock即可读取；版本未变时不触碰挂载点表
+        if manager.sourcetable_version == self.version:
+            return
+        version, mount_list = manager.get_sourcetable_snapshot()
+        # 复用现有配置: server_name=author, server_port=NTRIP_PORT, operator=APP_NAME, network_name=author, website_url=APP_WEBSITE, fallback_ip=HOST
+        self.cas_line = f"CAS;{config.APP_AUTHOR};{config.NTRIP_PORT};{config.APP_NAME};{config.APP_AUTHOR};0;{config.CASTER_COUNTRY};{config.CASTER_LATITUDE};{config.CASTER_LONGITUDE};{config.HOST};0;{config.APP_WEBSITE}"
+        self.net_line = f"NET;{config.APP_AUTHOR};{config.APP_AUTHOR};B;{config.CASTER_COUNTRY};{config.APP_WEBSITE};{config.APP_WEBSITE};{config.APP_CONTACT};none"
+        if config.NEAREST_MOUNT:
+            # 虚拟最近挂载点，nmea字段为1提示流动站上传GGA
+            app_author = config.APP_AUTHOR.replace(' ', '') if config.APP_AUTHOR else '2rtk'
+            mount_list = mount_list + [
+                f"STR;{config.NEAREST_MOUNT};Nearest;RTCM3.x;;0;GPS;{app_author};{config.CASTER_COUNTRY};"
+                f"{config.CASTER_LATITUDE:.4f};{config.CASTER_LONGITUDE:.4f};1;0;2RTK_NtirpCaster;N;B;N;500;NO"
+            ]
+        self.store.sync(mount_list)
+        self.version = version
+        self.bodies.clear()
+        self.responses.clear()
+        self.bodies[''] = self._make_entry([self.cas_line, self.net_line] + mount_list)
+        self.stats['rebuilds'] += 1
+        log_debug(f"源表缓存已重建: 版本 {version}, {len(mount_list)} 个挂载点, {len(self.bodies[''][0])} 字节")
+
+    def apply_config_changes(self, changed):
+        """配置热加载：虚拟最近挂载点变化时作废缓存，下次请求按新配置重建"""
+        if 'NEAREST_MOUNT' in changed:
+            with self.lock:
+                self.version = None
+
+    def _make_entry(self, lines):
+        body = ('\r\n'.join(lines) + '\r\n').encode('utf-8') if lines else b''
+        return [body, None, f'"{hashlib.sha1(body).hexdigest()[:20]}"']
+
+    def _filter_lines(self, query):
+        """按过滤串求匹配记录"""
+        record_type, filters = parse_filter(query)
+        if record_type is None:
+            return []
+        if record_type == 'CAS':
+            lines = [self.cas_line]
+        elif record_type == 'NET':
+            lines = [self.net_line]
+        else:
+            return self.store.query(filters)
+        # CAS/NET只有一条记录，直接逐字段比较
+        records = []
+        for line in lines:
+            lowered = [f.strip().lower() for f in line.split(';')]
+            if all(f.matches(lowered[f.index] if f.index < len(lowered) else '', None) for f in filters):
+                records.append(line)
+        return records
+
+    def _get_entry(self, query):
+        """获取过滤串对应的正文缓存项，调用方需持有self.lock"""
+        entry = self.bodies.get(query)
+        if entry is not None:
+            self.bodies.move_to_end(query)
+            return entry
+        entry = self._make_entry(self._filter_lines(query))
+        self.bodies[query] = entry
+        if len(self.bodies) > FILTER_CACHE_SIZE + 1:
+            # 完整源表('')常驻，淘汰最久未使用的过滤结果
+            for key in self.bodies:
+                if key:
+                    del self.bodies[key]
+                    for variant in ('1.0', '2.0', 'gzip', '304'):
+                        self.responses.pop((key, variant), None)
+                    break
+        return entry
+
+    def _render(self, query, entry, variant, now_second):
+        """渲染指定变体的完整响应字节，调用方需持有self.lock"""
+        cached = self.responses.get((query, variant))
+        if cached and cached[0] == now_second:
+            return cached[1]
+
+        body, gzip_body, etag = entry
+        date = formatdate(now_second, usegmt=True)
+        server = f"Server: NTRIP 2RTK caster {config.APP_VERSION}"
+        if variant == '1.0':
+            head = [
+                "SOURCETABLE 200 OK",
+                server,
+                f"Date: {date}",
+                "Ntrip-Version: Ntrip/1.0",
+                f"Content-Length: {len(body)}",
+                "Content-Type: text/plain",
+                "Connection: close",
+            ]
+            response = ('\r\n'.join(head) + '\r\n\r\n').encode('utf-8') + body + b"ENDSOURCETABLE"
+        elif variant == '304':
+            head = [
+                "HTTP/1.1 304 Not Modified",
+                server,
+                f"Date: {date}",
+                "Ntrip-Version: Ntrip/2.0",
+                f"ETag: {etag}",
+                "Connection: close",
+            ]
+            response = ('\r\n'.join(head) + '\r\n\r\n').encode('utf-8')
+        else:
+            if variant == 'gzip':
+                if gzip_body is None:
+                    gzip_body = entry[1] = gzip.compress(body, mtime=0)
+                body = gzip_body
+            head = [
+                "HTTP/1.1 200 OK",
+                server,
+                f"Date: {date}",
+                "Ntrip-Version: Ntrip/2.0",
+                f"Content-Length: {len(body)}",
+                "Content-Type: text/plain",
+                f"ETag: {etag}",
+                "Vary: Accept-Encoding",
+                "Connection: close",
+            ]
+            if variant == 'gzip':
+                head.append("Content-Encoding: gzip")
+            response = ('\r\n'.join(head) + '\r\n\r\n').encode('utf-8') + body
+
+        self.responses[(query, variant)] = (now_second, response)
+        return response
+
+    def get_response(self, ntrip_version, if_none_match='', accept_encoding='', query=''):
+        """获取源表响应字节
+
+        Args:
+            ntrip_version: 客户端NTRIP版本，"2.0"使用HTTP格式，其他使用SOURCETABLE格式
+            if_none_match: If-None-Match请求头
+            accept_encoding: Accept-Encoding请求头
+            query: 源表过滤串（如 'STR;;;;;;GPS+GLO'），空串为完整源表
+
+        Returns:
+            bytes: 可直接sendall的完整响应
+        """
+        now_second = int(time.time())
+        with self.lock:
+            self._refresh()
+            entry = self._get_entry(query)
+            if ntrip_version != "2.0":
+                variant = '1.0'
+            elif _etag_matches(if_none_match, entry[2]):
+                variant = '304'
+                self.stats['not_modified'] += 1
+            elif _accepts_gzip(accept_encoding):
+                variant = 'gzip'
+                self.stats['gzip'] += 1
+            else:
+                variant = '2.0'
+            self.stats['hits'] += 1
+            if query:
+                self.stats['filtered'] += 1
+            return self._render(query, entry, variant, now_second)
+
+    def get_stats(self):
+        """获取缓存统计"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats['version'] = self.version
+            stats['mounts'] = len(self.store)
+            stats['cached_filters'] = len(self.bodies) - 1 if self.bodies else 0
+            full = self.bodies.get('')
+            stats['size'] = len(full[0]) if full else 0
+            return stats
+
+
+def _etag_matches(if_none_match, etag):
+    """判断If-None-Match是否命中当前ETag（弱比较）"""
+    if not if_none_match or not etag:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return True
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def _accepts_gzip(accept_encoding):
+    """判断客户端是否接受gzip编码"""
+    for item in accept_encoding.lower().split(','):
+        parts = [p.strip() for p in item.split(';')]
+        if parts[0] not in ('gzip', 'x-gzip'):
+            continue
+        for param in parts[1:]:
+            if param.startswith('q='):
+                try:
+                    return float(param[2:]) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+_sourcetable_cache = SourcetableCache()
+config.subscribe(_sourcetable_cache.apply_config_changes)
+
+
+def get_sourcetable_response(ntrip_version, if_none_match='', accept_encoding='', query=''):
+    """获取源表响应字节"""
+    return _sourcetable_cache.get_response(ntrip_version, if_none_match, accept_encoding, query)
+
+
+def get_sourcetable_stats():
+    """获取源表缓存统计"""
+    return _sourcetable_cache.get_stats()
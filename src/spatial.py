@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+spatial.py - 基站空间索引模块
+功能：按经纬度网格索引在线基站位置，挂载点上下线时增量维护，
+      为虚拟"最近挂载点"提供最近基站查询
+"""
+
+import heapq
+import math
+from threading import RLock
+
+EARTH_RADIUS_KM = 6371.0088
+# 每度纬度对应的地面距离（km）
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180.0
+
+# 分层网格大小（度），逐层4倍嵌套：叶子层0.5度，1万个基站时每格平均不到一个点
+LEVEL_CELL_SIZES = (0.5, 2.0, 8.0, 32.0)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """两点间大圆距离（km）"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _meridian_segment_distance(lat, dlon, lat0, lat1):
+    """点到经差为dlon度、纬度范围[lat0, lat1]的经线段的最短距离（km）"""
+    candidates = [lat0, lat1]
+    cos_dlon = math.cos(math.radians(dlon))
+    if cos_dlon > 0:
+        # 整条经线大圆上距离最近点的纬度，落在线段外时取端点
+        closest = math.degrees(math.atan(math.tan(math.radians(lat)) / cos_dlon))
+        candidates.append(min(max(closest, lat0), lat1))
+    return min(haversine_km(lat, 0.0, c, dlon) for c in candidates)
+
+
+def _rect_distance(lat, lon, lat0, lat1, lon0, lon1):
+    """点到经纬度矩形的最短距离（km），作为该网格内任意基站距离的下界"""
+    west = (lon0 - lon) % 360.0
+    east = (lon - lon1) % 360.0
+    if west == 0.0 or east == 0.0 or west + east > 360.0:
+        # 查询点经度落在矩形经度范围内，只差纬度
+        if lat < lat0:
+            return (lat0 - lat) * KM_PER_DEGREE
+        if lat > lat1:
+            return (lat - lat1) * KM_PER_DEGREE
+        return 0.0
+    return _meridian_segment_distance(lat, min(west, east), lat0, lat1)
+
+
+def _lat_distance(lat, cell, size):
+    """只按纬度差估计的点到网格距离下界（km），计算代价远低于球面距离"""
+    lat0 = cell[0] * size - 90.0
+    if lat < lat0:
+        return (lat0 - lat) * KM_PER_DEGREE
+    lat1 = lat0 + size
+    if lat > lat1:
+        return (lat - lat1) * KM_PER_DEGREE
+    return 0.0
+
+
+class SpatialIndex:
+    """分层经纬度网格空间索引
+
+    叶子层: {(行, 列): {挂载点: (纬度, 经度)}}，上层只记录每个网格的基站数量。
+    最近邻查询按"点到网格矩形的最短距离"做最佳优先搜索：先展开距离下界最小的网格，
+    取出的第一个基站即为最近基站，查询代价与基站总数和所在纬度基本无关。
+    """
+
+    def __init__(self, cell_sizes=LEVEL_CELL_SIZES):
+        self.cell_sizes = cell_sizes
+        self.leaves = {}
+        self.levels = [dict() for _ in cell_sizes[1:]]  # 上层网格: {(行, 列): 基站数}
+        self.positions = {}  # {挂载点: (纬度, 经度, 叶子网格)}
+        self.lock = RLock()
+
+    def _cell(self, lat, lon, size):
+        rows = int(math.ceil(180.0 / size))
+        row = min(int((lat + 90.0) / size), rows - 1)
+        col = int(((lon + 180.0) % 360.0) / size)
+        return row, col
+
+    def _bounds(self, cell, size):
+        row, col = cell
+        lat0 = row * size - 90.0
+        lon0 = col * size - 180.0
+        return lat0, min(lat0 + size, 90.0), lon0, min(lon0 + size, 180.0)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def update(self, mount, lat, lon):
+        """新增或更新基站位置"""
+        cell = self._cell(lat, lon, self.cell_sizes[0])
+        with self.lock:
+            old = self.positions.get(mount)
+            if old is not None:
+                if old[2] == cell:
+                    self.positions[mount] = (lat, lon, cell)
+                    self.leaves[cell][mount] = (lat, lon)
+                    return
+                self._discard(mount, old)
+            self.positions[mount] = (lat, lon, cell)
+            self.leaves.setdefault(cell, {})[mount] = (lat, lon)
+            for size, level in zip(self.cell_sizes[1:], self.levels):
+                key = self._cell(lat, lon, size)
+                level[key] = level.get(key, 0) + 1
+
+    def remove(self, mount):
+        """移除基站"""
+        with self.lock:
+            old = self.positions.pop(mount, None)
+            if old is not None:
+                self._discard(mount, old)
+                return True
+            return False
+
+    def _discard(self, mount, position):
+        lat, lon, cell = position
+        bucket = self.leaves.get(cell)
+        if bucket is not None:
+            bucket.pop(mount, None)
+            if not bucket:
+                del self.leaves[cell]
+        for size, level in zip(self.cell_sizes[1:], self.levels):
+            key = self._cell(lat, lon, size)
+            count = level.get(key, 0) - 1
+            if count > 0:
+                level[key] = count
+            else:
+                level.pop(key, None)
+
+    def get_position(self, mount):
+        """获取基站位置 (纬度, 经度)，未索引时返回None"""
+        with self.lock:
+            position = self.positions.get(mount)
+            return (position[0], position[1]) if position else None
+
+    def _children(self, depth, cell):
+        """depth层网格在下一层中的非空子网格"""
+        ratio = int(round(self.cell_sizes[depth] / self.cell_sizes[depth - 1]))
+        lower = self.leaves if depth == 1 else self.levels[depth - 2]
+        row, col = cell
+        for r in range(row * ratio, row * ratio + ratio):
+            for c in range(col * ratio, col * ratio + ratio):
+                if (r, c) in lower:
+                    yield r, c
+
+    def nearest(self, lat, lon, k=1, max_distance_km=None):
+        """查询最近的k个基站
+
+        Returns:
+            list: [(距离km, 挂载点), ...]，按距离升序
+        """
+        lat = min(max(lat, -89.9999), 89.9999)
+        with self.lock:
+            if not self.positions:
+                return []
+            top = len(self.cell_sizes) - 1
+            top_size = self.cell_sizes[top]
+            # 网格先按只看纬度差的廉价下界入堆，弹出时再计算精确下界并重新入堆，
+            # 大部分远处网格无需计算球面距离
+            heap = []
+            seq = 0
+            for cell in self.levels[-1]:
+                heap.append((_lat_distance(lat, cell, top_size), seq, top, cell, False))
+                seq += 1
+            heapq.heapify(heap)
+
+            result = []
+            while heap:
+                distance, _, depth, item, tight = heapq.heappop(heap)
+                if max_distance_km is not None and distance > max_distance_km:
+                    break
+                if depth < 0:
+                    result.append((distance, item))
+                    if len(result) >= k:
+                        break
+                    continue
+                if not tight:
+                    # 浮点误差可能让下界略大于真实距离，留出微小余量
+                    bound = _rect_distance(lat, lon, *self._bounds(item, self.cell_sizes[depth])) - 1e-6
+                    if bound > distance:
+                        heapq.heappush(heap, (bound, seq, depth, item, True))
+                        seq += 1
+                        continue
+                if depth == 0:
+                    for mount, (mlat, mlon) in self.leaves[item].items():
+                        heapq.heappush(heap, (haversine_km(lat, lon, mlat, mlon), seq, -1, mount, True))
+                        seq += 1
+                else:
+                    size = self.cell_sizes[depth - 1]
+                    for child in self._children(depth, item):
+                        heapq.heappush(heap, (max(distance, _lat_distance(lat, child, size)), seq, depth - 1, child, False))
+                        seq += 1
+            return result
+
+    def snapshot(self):
+        """获取全部基站位置 {挂载点: (纬度, 经度)}"""
+        with self.lock:
+            return {mount: (p[0], p[1]) for mount, p in self.positions.items()}
+
+
+# 在线基站空间索引
+mount_index = SpatialIndex()
+
+
+def update_mount_position(mount, lat, lon):
+    """更新在线基站位置"""
+    mount_index.update(mount, lat, lon)
+
+
+def remove_mount_position(mount):
+    """移除下线基站"""
+    return mount_index.remove(mount)
+
+
+def find_nearest_mount(lat, lon, max_distance_km=None, exclude=None):
+    """查找最近的在线基站
+
+    Returns:
+        tuple: (挂载点, 距离km)，没有满足条件的基站时返回 (None, None)
+    """
+    k = 1 + (1 if exclude else 0)
+    for distance, mount in mount_index.nearest(lat, lon, k, max_distance_km):
+        if mount != exclude:
+            return mount, distance
+    return None, None
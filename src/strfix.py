@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+strfix.py - STR修正调度模块
+功能：挂载点上线后的STR修正解析（RTCM解析线程 + 订阅socketpair）统一排队，最多同时运行
+      STR_FIX_CONCURRENCY个；空出名额时优先解析正在被流动站订阅的挂载点。
+      解析得到的元数据按挂载点持久化到mount_metadata表，重连或重启后立即套用，
+      再用帧头统计（基准站ID和各消息类型的帧率）在后台复核，指纹变化时才重新解析；
+      STR校验后按接收统计中的帧头计数定期维护消息类型、星座、载波和比特率字段，不再解析消息体
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, NamedTuple, Optional
+
+from . import config
+from . import connection
+from . import database
+from . import timerwheel
+from .logger import log_debug, log_info, log_warning
+from .rtcm2_manager import parser_manager as rtcm_manager
+
+# 解析结束后等待多久收取结果（秒），解析线程按自身计时结束，留出退出时间
+RESULT_GRACE = 5
+# 复核时一个消息类型按原帧率在窗口内应至少出现的帧数，达到才要求本次也出现（低频消息不参与）
+EXPECTED_FRAMES = 3
+# STR维护的统计窗口为最近几次维护间隔
+MAINTAIN_WINDOW_TICKS = 5
+# STR format-details中的消息更新间隔取最接近的常用值（秒），避免计数抖动导致STR反复变化
+UPDATE_PERIODS = (1, 2, 5, 10, 15, 30, 60, 120, 300, 600)
+# 比特率相对变化超过该比例才更新STR
+BITRATE_TOLERANCE = 0.2
+
+
+class MountMetadata(NamedTuple):
+    """挂载点元数据：STR修正解析结果及解析时的帧头指纹"""
+    station_id: Optional[int]
+    fingerprint: Dict[int, float]  # {消息类型: 每秒帧数}
+    result: Dict[str, Any]  # rtcm_manager.get_result()的解析结果
+    verified_at: float
+
+
+def header_fingerprint(stats):
+    """由挂载点帧头统计（MountStats）得到各消息类型的每秒帧数"""
+    first, last = stats.first_data_time, stats.last_data_time
+    duration = max(1.0, (last - first) if first is not None and last is not None else 0.0)
+    return {message_type: count / duration for message_type, count in stats.message_types.items()}
+
+
+def fingerprint_changed(metadata, stats):
+    """比较帧头统计与保存的指纹，返回变化说明，未变化时返回None
+
+    出现新的消息类型、基准站ID不同，或原来按帧率在本次统计时长内应出现至少EXPECTED_FRAMES帧的
+    消息类型没有出现，都视为数据流已变化
+    """
+    if metadata.station_id is not None and stats.station_id is not None and stats.station_id != metadata.station_id:
+        return f"基准站ID {metadata.station_id} -> {stats.station_id}"
+    observed = stats.message_types
+    added = sorted(set(observed) - set(metadata.fingerprint))
+    if added:
+        return f"新增消息类型 {added}"
+    first, last = stats.first_data_time, stats.last_data_time
+    duration = (last - first) if first is not None and last is not None else 0.0
+    missing = sorted(message_type for message_type, rate in metadata.fingerprint.items()
+                     if rate * duration >= EXPECTED_FRAMES and message_type not in observed)
+    if missing:
+        return f"缺少消息类型 {missing}"
+    return None
+
+
+def _quantize_period(seconds):
+    return min(UPDATE_PERIODS, key=lambda period: abs(period - seconds))
+
+
+_carrier_lookup = None
+
+
+def _carrier_info(message_type):
+    """消息类型对应的 (星座, 载波组合)，非MSM消息返回None"""
+    global _carrier_lookup
+    if _carrier_lookup is None:
+        # 动态导入，避免加载解析依赖
+        from .rtcm2 import CARRIER_INFO
+        _carrier_lookup = {message_type: info for (start, end), info in CARRIER_INFO.items()
+                           for message_type in range(start, end + 1)}
+    return _carrier_lookup.get(message_type)
+
+
+def header_str_fields(type_counts, byte_count, elapsed):
+    """由窗口内的帧头计数得到STR字段，键与解析结果相同（message_types_str、gnss_combined等）"""
+    periods = {message_type: _quantize_period(elapsed / count)
+               for message_type, count in sorted(type_counts.items()) if count > 0}
+    gnss, carriers = set(), set()
+    for message_type in periods:
+        info = _carrier_info(message_type)
+        if info is not None:
+            gnss.add(info[0])
+            carriers.update(info[1].split('+'))
+    fields = {
+        'message_types_str': ','.join(f"{message_type}({period})" for message_type, period in periods.items()),
+        'bitrate': round(byte_count * 8 / elapsed, 2),
+    }
+    if gnss:
+        fields['gnss_combined'] = '+'.join(sorted(gnss))
+        fields['carrier_combined'] = '+'.join(sorted(carriers))
+    return fields
+
+
+def str_fields_changed(str_data, fields):
+    """判断帧头统计得到的字段与当前STR是否不同（比特率按BITRATE_TOLERANCE比较）"""
+    parts = str_data.split(';')
+    if len(parts) < 19:
+        return True
+    if fields['message_types_str'] != parts[4]:
+        return True
+    if 'gnss_combined' in fields and (fields['gnss_combined'] != parts[6] or fields['carrier_combined'] != parts[5]):
+        return True
+    try:
+        current = float(parts[17])
+    except ValueError:
+        return True
+    return abs(fields['bitrate'] - current) > current * BITRATE_TOLERANCE
+
+
+class StrMaintainer:
+    """STR持续维护
+
+    每STR_MAINTAIN_INTERVAL秒对所有已校验STR的在线挂载点取一次接收统计（MountStats）的
+    累计字节数和各消息类型帧数，用最近MAINTAIN_WINDOW_TICKS个间隔的差值计算消息类型及更新间隔、
+    星座、载波和比特率，与当前STR不同时更新。接收路径上没有额外开销：帧头计数本来就在进行。
+    """
+
+    def __init__(self):
+        self.samples = {}  # {挂载点: (MountInfo, deque[(时间, 累计字节数, {消息类型: 累计帧数})])}
+        self.timer = None
+        self.lock = threading.Lock()
+        self.stats = {'ticks': 0, 'updated': 0}
+
+    def start(self):
+        with self.lock:
+            if self.timer is None and config.STR_MAINTAIN_INTERVAL > 0:
+                self.timer = timerwheel.schedule(config.STR_MAINTAIN_INTERVAL, self._tick)
+
+    def _tick(self):
+        with self.lock:
+            self.timer = None
+        try:
+            self.maintain()
+        finally:
+            self.start()
+
+    def maintain(self, now=None):
+        """对所有在线挂载点做一次STR维护，返回更新的挂载点数"""
+        if now is None:
+            now = time.time()
+        manager = connection.get_connection_manager()
+        with manager.mount_lock:
+            mounts = [(name, info) for name, info in manager.online_mounts.items() if info.final_str_generated]
+        samples = {}
+        updated = 0
+        for mount_name, mount_info in mounts:
+            previous = self.samples.get(mount_name)
+            window = previous[1] if previous is not None and previous[0] is mount_info else \
+                deque(maxlen=MAINTAIN_WINDOW_TICKS + 1)
+            stats = mount_info.stats
+            window.append((now, stats.total_bytes, stats.message_types.copy()))
+            samples[mount_name] = (mount_info, window)
+            if len(window) < 2:
+                continue
+            start_time, start_bytes, start_types = window[0]
+            elapsed = now - start_time
+            type_counts = {message_type: count - start_types.get(message_type, 0)
+                           for message_type, count in window[-1][2].items()}
+            if elapsed <= 0 or not any(type_counts.values()):
+                continue
+            fields = header_str_fields(type_counts, stats.total_bytes - start_bytes, elapsed)
+            if str_fields_changed(mount_info.str_data, fields):
+                log_info(f"挂载点 {mount_name} 按帧头统计更新STR: 消息类型 {fields['message_types_str']}, "
+                         f"比特率 {fields['bitrate']:.0f} bps")
+                manager._process_str_data(mount_name, fields, mode="regenerate")
+                updated += 1
+        self.samples = samples
+        self.stats['ticks'] += 1
+        self.stats['updated'] += updated
+        return updated
+
+    def apply_config_changes(self, changed):
+        """配置热加载：维护间隔变化后按新间隔重新定时"""
+        if 'STR_MAINTAIN_INTERVAL' in changed:
+            with self.lock:
+                timerwheel.cancel(self.timer)
+                self.timer = None
+            self.start()
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['interval'] = config.STR_MAINTAIN_INTERVAL
+        return stats
+
+
+class StrCorrectionScheduler:
+    """STR修正调度器
+
+    pending、running和verifying都以挂载点名为键，值中保存提交时的MountInfo：挂载点重连后
+    旧连接的排队、解析或复核作废，由新连接重新提交。排队数不超过在线挂载点数，每次空出名额时按
+    (订阅的流动站数, 提交顺序) 线性选出下一个，优先级随流动站上下线实时变化。
+    已有元数据的挂载点上线时立即套用，RTCM_PARSE_DURATION秒后按帧头统计复核，不占解析名额；
+    元数据超过STR_VERIFIED_TTL时仍先套用，同时排队重新解析。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}  # {挂载点: (MountInfo, 序号)}
+        self.running = {}  # {挂载点: (MountInfo, 定时器)}
+        self.verifying = {}  # {挂载点: (MountInfo, 定时器)}
+        self.metadata = {}  # {挂载点: MountMetadata}
+        self.loaded = False
+        self.load_lock = threading.Lock()
+        self.seq = 0
+        self.stats = {'submitted': 0, 'started': 0, 'completed': 0, 'failed': 0, 'cached': 0, 'cancelled': 0,
+                      'verified': 0, 'changed': 0}
+
+    def _ensure_loaded(self):
+        """首次提交时从数据库加载元数据"""
+        if self.loaded:
+            return
+        with self.load_lock:
+            if self.loaded:
+                return
+            try:
+                rows = database.load_mount_metadata()
+            except Exception as e:
+                log_warning(f"加载挂载点元数据失败: {e}")
+                rows = []
+            metadata = {}
+            for mount_name, station_id, fingerprint, result, verified_at in rows:
+                try:
+                    rates = {int(message_type): rate for message_type, rate in json.loads(fingerprint).items()}
+                    metadata[mount_name] = MountMetadata(station_id, rates, json.loads(result), verified_at)
+                except (ValueError, TypeError, AttributeError) as e:
+                    log_warning(f"忽略无效的挂载点元数据 [挂载点: {mount_name}]: {e}")
+            with self.lock:
+                # 加载期间新解析得到的元数据优先
+                metadata.update(self.metadata)
+                self.metadata = metadata
+            self.loaded = True
+            log_info(f"已加载 {len(metadata)} 个挂载点的元数据")
+
+    def submit(self, mount_info):
+        """挂载点上线时提交STR修正"""
+        self._ensure_loaded()
+        mount_name = mount_info.mount_name
+        with self.lock:
+            self._cancel_locked(mount_name)
+            self.stats['submitted'] += 1
+            metadata = self.metadata.get(mount_name)
+            fresh = metadata is not None and time.time() - metadata.verified_at < config.STR_VERIFIED_TTL
+            if metadata is not None:
+                self.stats['cached'] += 1
+            if fresh:
+                timer = timerwheel.schedule(config.RTCM_PARSE_DURATION, self._verify, mount_info)
+                self.verifying[mount_name] = (mount_info, timer)
+            else:
+                self.seq += 1
+                self.pending[mount_name] = (mount_info, self.seq)
+        if metadata is not None:
+            log_info(f"挂载点 {mount_name} 使用 {time.time() - metadata.verified_at:.0f} 秒前保存的元数据生成STR，"
+                     f"{'稍后按帧头统计复核' if fresh else '已过期，排队重新解析'}")
+            connection.get_connection_manager()._process_str_data(mount_name, metadata.result, mode="correct")
+        if not fresh:
+            log_debug(f"STR修正已排队 [挂载点: {mount_name}]，排队数: {len(self.pending)}")
+            self._dispatch()
+
+    def cancel(self, mount_info):
+        """挂载点下线时取消其排队、解析或复核"""
+        mount_name = mount_info.mount_name
+        with self.lock:
+            entry = self.pending.get(mount_name) or self.running.get(mount_name) or self.verifying.get(mount_name)
+            if entry is None or entry[0] is not mount_info:
+                return
+            self._cancel_locked(mount_name)
+        self._dispatch()
+
+    def _cancel_locked(self, mount_name):
+        if self.pending.pop(mount_name, None) is not None:
+            self.stats['cancelled'] += 1
+        entry = self.verifying.pop(mount_name, None)
+        if entry is not None:
+            timerwheel.cancel(entry[1])
+        entry = self.running.pop(mount_name, None)
+        if entry is not None:
+            timerwheel.cancel(entry[1])
+            # 调用方可能持有挂载点锁，不等待解析线程退出（已下线的挂载点没有数据，读取要等到超时）
+            rtcm_manager.stop_parser(mount_name, wait=False)
+            self.stats['cancelled'] += 1
+
+    def _dispatch(self):
+        """按空出的名额启动排队中的STR修正"""
+        manager = connection.get_connection_manager()
+        started = []
+        with self.lock:
+            while self.pending and len(self.running) < config.STR_FIX_CONCURRENCY:
+                mount_name = max(self.pending, key=lambda name: (manager.get_mount_connection_count(name),
+                                                                  -self.pending[name][1]))
+                mount_info, _ = self.pending.pop(mount_name)
+                if manager.online_mounts.get(mount_name) is not mount_info:
+                    continue
+                if not rtcm_manager.start_parser(mount_name=mount_name, mode="str_fix",
+                                                 duration=config.RTCM_PARSE_DURATION):
+                    self.stats['failed'] += 1
+                    continue
+                timer = timerwheel.schedule(config.RTCM_PARSE_DURATION + RESULT_GRACE, self._finish, mount_info)
+                self.running[mount_name] = (mount_info, timer)
+                self.stats['started'] += 1
+                started.append(mount_name)
+            waiting = len(self.pending)
+        for mount_name in started:
+            log_info(f"已启动STR修正解析 [挂载点: {mount_name}]，将在{config.RTCM_PARSE_DURATION}秒后修正STR表，"
+                     f"仍在排队: {waiting}")
+
+    def _verify(self, mount_info):
+        """按帧头统计复核已套用的元数据，数据流变化时排队重新解析（在时间轮线程中执行）"""
+        mount_name = mount_info.mount_name
+        manager = connection.get_connection_manager()
+        with self.lock:
+            entry = self.verifying.get(mount_name)
+            if entry is None or entry[0] is not mount_info:
+                return
+            del self.verifying[mount_name]
+            if manager.online_mounts.get(mount_name) is not mount_info:
+                return
+            stats = mount_info.stats
+            if not stats.total_messages:
+                log_debug(f"挂载点 {mount_name} 尚未收到RTCM帧，跳过元数据复核")
+                return
+            change = fingerprint_changed(self.metadata[mount_name], stats)
+            if change is None:
+                self.stats['verified'] += 1
+            else:
+                self.stats['changed'] += 1
+                self.seq += 1
+                self.pending[mount_name] = (mount_info, self.seq)
+        if change is None:
+            log_debug(f"挂载点 {mount_name} 帧头指纹未变化，保留已保存的元数据")
+            return
+        log_info(f"挂载点 {mount_name} 数据流已变化（{change}），排队重新解析STR")
+        self._dispatch()
+
+    def _finish(self, mount_info):
+        """解析结束后收取结果并修正STR（在时间轮线程中执行）"""
+        mount_name = mount_info.mount_name
+        metadata = None
+        with self.lock:
+            entry = self.running.get(mount_name)
+            if entry is None or entry[0] is not mount_info:
+                return
+            del self.running[mount_name]
+            parse_result = rtcm_manager.get_result(mount_name)
+            rtcm_manager.stop_parser(mount_name)
+            if parse_result and parse_result.get('total_messages'):
+                stats = mount_info.stats
+                station_id = parse_result.get('station_id')
+                metadata = MountMetadata(station_id if station_id is not None else stats.station_id,
+                                         header_fingerprint(stats), parse_result, time.time())
+                self.metadata[mount_name] = metadata
+                self.stats['completed'] += 1
+            else:
+                self.stats['failed'] += 1
+
+        if metadata is not None:
+            # 写库不占用时间轮线程
+            threading.Thread(target=self._save, args=(mount_name, metadata), name='MountMetadataSave',
+                             daemon=True).start()
+        manager = connection.get_connection_manager()
+        if manager.online_mounts.get(mount_name) is not mount_info:
+            log_debug(f"挂载点 {mount_name} 已下线或重连，跳过本次STR修正")
+        elif parse_result:
+            log_debug(f"解析结果内容 [挂载点: {mount_name}]: {parse_result}")
+            manager._process_str_data(mount_name, parse_result, mode="correct")
+        else:
+            log_warning(f"未获取到STR修正解析结果 [挂载点: {mount_name}]")
+            log_debug(f"STR修正失败 - 挂载点: {mount_name}, 可能原因: 解析超时、数据不足或解析器异常")
+        self._dispatch()
+
+    def _save(self, mount_name, metadata):
+        try:
+            database.save_mount_metadata(mount_name, metadata.station_id,
+                                         json.dumps(metadata.fingerprint),
+                                         json.dumps(metadata.result, ensure_ascii=False),
+                                         metadata.verified_at)
+        except Exception as e:
+            log_warning(f"保存挂载点元数据失败 [挂载点: {mount_name}]: {e}")
+
+    def apply_config_changes(self, changed):
+        """配置热加载：并发数调大时立即启动排队中的修正"""
+        if 'STR_FIX_CONCURRENCY' in changed:
+            self._dispatch()
+
+    def get_metadata(self, mount_name):
+        """获取挂载点已保存的元数据"""
+        return self.metadata.get(mount_name)
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['pending'] = len(self.pending)
+            stats['running'] = sorted(self.running)
+            stats['verifying'] = len(self.verifying)
+            stats['known_mounts'] = len(self.metadata)
+        stats['concurrency'] = config.STR_FIX_CONCURRENCY
+        return stats
+
+
+_scheduler = StrCorrectionScheduler()
+config.subscribe(_scheduler.apply_config_changes)
+_maintainer = StrMaintainer()
+config.subscribe(_maintainer.apply_config_changes)
+
+
+def submit(mount_info):
+    """提交挂载点的STR修正，并确保STR维护已启动"""
+    _scheduler.submit(mount_info)
+    _maintainer.start()
+
+
+def cancel(mount_info):
+    """取消挂载点的STR修正"""
+    _scheduler.cancel(mount_info)
+
+
+def get_mount_metadata(mount_name):
+    """获取挂载点已保存的元数据"""
+    return _scheduler.get_metadata(mount_name)
+
+
+def get_str_fix_stats():
+    """获取STR修正调度和维护统计"""
+    stats = _scheduler.get_stats()
+    stats['maintain'] = _maintainer.get_stats()
+    return stats
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+strstore.py - STR记录索引存储模块
+功能：把源表STR记录解析为结构化数据，按格式、导航系统、国家和经纬度网格建立索引，
+      支持NTRIP 2.0源表过滤请求（如 GET /?STR;;;;;;GPS+GLO）
+"""
+
+import math
+import re
+from collections import defaultdict
+
+# STR记录字段位置（0为记录类型"STR"）
+STR_FIELD_MOUNT = 1
+STR_FIELD_IDENTIFIER = 2
+STR_FIELD_FORMAT = 3
+STR_FIELD_FORMAT_DETAILS = 4
+STR_FIELD_CARRIER = 5
+STR_FIELD_NAV_SYSTEM = 6
+STR_FIELD_NETWORK = 7
+STR_FIELD_COUNTRY = 8
+STR_FIELD_LATITUDE = 9
+STR_FIELD_LONGITUDE = 10
+
+# 地理网格大小（度）
+GRID_SIZE = 1.0
+
+
+class FilterTerm:
+    """单个过滤条件：字符串通配、数值比较或近似匹配，可取反"""
+
+    __slots__ = ('negate', 'op', 'value', 'pattern', 'text')
+
+    def __init__(self, text):
+        self.negate = text.startswith('!')
+        if self.negate:
+            text = text[1:]
+        self.text = text.lower()
+        self.op = None
+        self.value = None
+        self.pattern = None
+
+        for op in ('<=', '>=', '<', '>', '=', '~'):
+            if text.startswith(op):
+                try:
+                    self.value = float(text[len(op):])
+                    self.op = op
+                except ValueError:
+                    pass
+                break
+
+        if self.op is None and '*' in text:
+            self.pattern = re.compile('^' + '.*'.join(re.escape(p) for p in text.lower().split('*')) + '$')
+
+    @property
+    def is_exact(self):
+        """是否为可直接查索引的精确字符串匹配"""
+        return not self.negate and self.op is None and self.pattern is None
+
+    def matches(self, raw, number):
+        """判断字段值是否满足条件（近似条件在此处视为满足，由排序阶段处理）"""
+        if self.op is not None:
+            if self.op == '~':
+                result = True
+            elif number is None:
+                result = False
+            elif self.op == '<':
+                result = number < self.value
+            elif self.op == '>':
+                result = number > self.value
+            elif self.op == '<=':
+                result = number <= self.value
+            elif self.op == '>=':
+                result = number >= self.value
+            else:
+                result = number == self.value
+        elif self.pattern is not None:
+            result = self.pattern.match(raw) is not None
+        else:
+            result = raw == self.text
+        return result != self.negate
+
+
+class FieldFilter:
+    """单个字段的过滤表达式：'|' 分隔的或条件，每个或条件内 '&' 分隔的与条件"""
+
+    __slots__ = ('index', 'alternatives')
+
+    def __init__(self, index, expression):
+        self.index = index
+        self.alternatives = [
+            [FilterTerm(term) for term in alternative.split('&') if term]
+            for alternative in expression.split('|')
+        ]
+        self.alternatives = [alt for alt in self.alternatives if alt]
+
+    def approximate_targets(self):
+        """近似匹配目标值列表"""
+        return [term.value for alt in self.alternatives for term in alt if term.op == '~']
+
+    def matches(self, raw, number):
+        return any(all(term.matches(raw, number) for term in alt) for alt in self.alternatives)
+
+
+def parse_filter(query):
+    """解析源表过滤串，如 'STR;;;;;;GPS+GLO'
+
+    Returns:
+        tuple: (记录类型, [FieldFilter, ...])，过滤串无效时返回 (None, [])
+    """
+    fields = query.split(';')
+    record_type = fields[0].strip().upper() or 'STR'
+    if record_type not in ('STR', 'CAS', 'NET'):
+        return None, []
+    filters = []
+    for index, expression in enumerate(fields[1:], 1):
+        expression = expression.strip()
+        if expression:
+            field_filter = FieldFilter(index, expression)
+            if field_filter.alternatives:
+                filters.append(field_filter)
+    return record_type, filters
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _grid_cell(lat, lon):
+    return int(math.floor(lat / GRID_SIZE)), int(math.floor(lon / GRID_SIZE))
+
+
+class STRRecord:
+    """结构化STR记录"""
+
+    __slots__ = ('mount', 'line', 'fields', 'lowered', 'lat', 'lon', 'nav_systems')
+
+    def __init__(self, line):
+        self.line = line
+        self.fields = line.split(';')
+        self.lowered = [f.strip().lower() for f in self.fields]
+        self.mount = self.fields[STR_FIELD_MOUNT] if len(self.fields) > STR_FIELD_MOUNT else ''
+        self.lat = _to_float(self._field(STR_FIELD_LATITUDE))
+        self.lon = _to_float(self._field(STR_FIELD_LONGITUDE))
+        self.nav_systems = frozenset(t for t in self._lowered(STR_FIELD_NAV_SYSTEM).split('+') if t)
+
+    def _field(self, index):
+        return self.fields[index] if index < len(self.fields) else ''
+
+    def _lowered(self, index):
+        return self.lowered[index] if index < len(self.lowered) else ''
+
+    def number(self, index):
+        if index == STR_FIELD_LATITUDE:
+            return self.lat
+        if index == STR_FIELD_LONGITUDE:
+            return self.lon
+        return _to_float(self._field(index))
+
+    def matches(self, field_filter):
+        index = field_filter.index
+        raw = self._lowered(index)
+        if index == STR_FIELD_NAV_SYSTEM:
+            # 导航系统按集合匹配：GPS+GLO 表示同时包含GPS和GLO
+            return any(all(self._match_nav(term) for term in alt) for alt in field_filter.alternatives)
+        return field_filter.matches(raw, self.number(index))
+
+    def _match_nav(self, term):
+        if term.op is not None or term.pattern is not None:
+            return term.matches(self._lowered(STR_FIELD_NAV_SYSTEM), None)
+        wanted = [t for t in term.text.split('+') if t]
+        return all(t in self.nav_systems for t in wanted) != term.negate
+
+
+class STRStore:
+    """STR记录索引存储
+
+    索引: 格式 -> 挂载点集合，导航系统 -> 挂载点集合，国家 -> 挂载点集合，经纬度网格 -> 挂载点集合。
+    过滤时先用索引求候选集，再在候选集上校验全部条件。
+    """
+
+    def __init__(self):
+        self.records = {}
+        self.by_format = defaultdict(set)
+        self.by_nav = defaultdict(set)
+        self.by_country = defaultdict(set)
+        self.by_cell = defaultdict(set)
+
+    def __len__(self):
+        return len(self.records)
+
+    def sync(self, lines):
+        """与当前STR列表同步，只更新变化的记录"""
+        current = {}
+        for line in lines:
+            parts = line.split(';', 2)
+            if len(parts) > 1:
+                current[parts[1]] = line
+
+        for mount in [m for m in self.records if m not in current]:
+            self._remove(mount)
+        for mount, line in current.items():
+            record = self.records.get(mount)
+            if record is None or record.line != line:
+                if record is not None:
+                    self._remove(mount)
+                self._add(STRRecord(line))
+
+    def _index_keys(self, record):
+        keys = [
+            (self.by_format, record._lowered(STR_FIELD_FORMAT)),
+            (self.by_country, record._lowered(STR_FIELD_COUNTRY)),
+        ]
+        keys.extend((self.by_nav, nav) for nav in record.nav_systems)
+        if record.lat is not None and record.lon is not None:
+            keys.append((self.by_cell, _grid_cell(record.lat, record.lon)))
+        return keys
+
+    def _add(self, record):
+        self.records[record.mount] = record
+        for index, key in self._index_keys(record):
+            index[key].add(record.mount)
+
+    def _remove(self, mount):
+        record = self.records.pop(mount)
+        for index, key in self._index_keys(record):
+            bucket = index.get(key)
+            if bucket is not None:
+                bucket.discard(mount)
+                if not bucket:
+                    del index[key]
+
+    def _candidates_for(self, field_filter):
+        """用索引求单个字段条件的候选集，无法用索引时返回None"""
+        index = field_filter.index
+        if index == STR_FIELD_FORMAT:
+            lookup = self.by_format
+        elif index == STR_FIELD_COUNTRY:
+            lookup = self.by_country
+        elif index == STR_FIELD_NAV_SYSTEM:
+            lookup = self.by_nav
+        elif index in (STR_FIELD_LATITUDE, STR_FIELD_LONGITUDE):
+            return self._grid_candidates(field_filter)
+        else:
+            return None
+
+        result = set()
+        for alternative in field_filter.alternatives:
+            exact = [term for term in alternative if term.is_exact]
+            if not exact:
+                return None
+            sets = []
+            for term in exact:
+                keys = term.text.split('+') if index == STR_FIELD_NAV_SYSTEM else [term.text]
+                sets.extend(lookup.get(key, set()) for key in keys if key)
+            if sets:
+                result |= set.intersection(*sets)
+        return result
+
+    def _grid_candidates(self, field_filter):
+        """经纬度范围条件按网格行/列筛选候选集"""
+        is_lat = field_filter.index == STR_FIELD_LATITUDE
+        result = set()
+        for alternative in field_filter.alternatives:
+            low, high = -math.inf, math.inf
+            for term in alternative:
+                if term.negate or term.op in (None, '~'):
+                    return None
+                if term.op in ('<', '<='):
+                    high = min(high, term.value)
+                elif term.op in ('>', '>='):
+                    low = max(low, term.value)
+                else:
+                    low, high = max(low, term.value), min(high, term.value)
+            low_cell = math.floor(low / GRID_SIZE) if low != -math.inf else -math.inf
+            high_cell = math.floor(high / GRID_SIZE) if high != math.inf else math.inf
+            for cell, mounts in self.by_cell.items():
+                coord = cell[0] if is_lat else cell[1]
+                if low_cell <= coord <= high_cell:
+                    result |= mounts
+        return result
+
+    def query(self, filters):
+        """按字段条件过滤STR记录
+
+        Returns:
+            list: 匹配的STR记录原文
+        """
+        candidates = None
+        for field_filter in filters:
+            subset = self._candidates_for(field_filter)
+            if subset is not None:
+                candidates = subset if candidates is None else candidates & subset
+                if not candidates:
+                    return []
+
+        if candidates is None:
+            records = self.records.values()
+        else:
+            # 索引候选集无序，按挂载点名称排序保证输出稳定
+            records = [self.records[mount] for mount in sorted(candidates)]
+        matched = [r for r in records if all(r.matches(f) for f in filters)]
+
+        approximate = [(f.index, f.approximate_targets()[0]) for f in filters if f.approximate_targets()]
+        if approximate and matched:
+            matched = self._nearest(matched, approximate)
+        return [r.line for r in matched]
+
+    def _nearest(self, records, approximate):
+        """近似匹配：返回与目标值距离最小的记录"""
+        def distance(record):
+            total = 0.0
+            for index, target in approximate:
+                value = record.number(index)
+                if value is None:
+                    return math.inf
+                diff = value - target
+                if index == STR_FIELD_LONGITUDE and record.lat is not None:
+                    diff *= math.cos(math.radians(record.lat))
+                total += diff * diff
+            return total
+
+        scored = [(distance(r), r) for r in records]
+        best = min(score for score, _ in scored)
+        if best == math.inf:
+            return []
+        return [r for score, r in scored if score == best]
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+timerwheel.py - 分层时间轮调度模块
+功能：用一个调度线程驱动分层哈希时间轮，统一执行延迟清理、STR修正、挂载点和客户端超时等延时任务，
+      添加和取消定时器均为O(1)，不为每个任务创建线程
+"""
+
+import math
+import threading
+import time
+
+from .logger import log_error, log_system_event
+
+# 时间轮精度（秒）和每层槽数：4层64槽，覆盖 0.1 * 64^4 秒（约19天）
+TICK = 0.1
+SLOT_BITS = 6
+SLOTS = 1 << SLOT_BITS
+SLOT_MASK = SLOTS - 1
+LEVELS = 4
+
+
+class Timer:
+    """定时器句柄，cancel()后回调不再执行"""
+
+    __slots__ = ('wheel', 'expires', 'callback', 'args', 'bucket')
+
+    def __init__(self, wheel, expires, callback, args):
+        self.wheel = wheel
+        self.expires = expires  # 到期的tick序号
+        self.callback = callback
+        self.args = args
+        self.bucket = None  # 所在的槽（set），已执行或已取消时为None
+
+    @property
+    def active(self):
+        return self.bucket is not None
+
+    def cancel(self):
+        return self.wheel.cancel(self)
+
+
+class TimerWheel:
+    """分层哈希时间轮
+
+    第L层每个槽跨度为 64^L 个tick。定时器按剩余tick数放入能容纳它的最低层，
+    高层槽在时间走到该槽起点时整体下沉（cascade）到低层，到第0层时执行回调。
+    回调在调度线程中执行，必须是短小、不阻塞的操作。
+    """
+
+    def __init__(self, tick=TICK):
+        self.tick = tick
+        self.wheels = [[set() for _ in range(SLOTS)] for _ in range(LEVELS)]
+        self.origin = time.monotonic()
+        self.current = 0  # 已处理到的tick序号
+        self.count = 0
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.running = False
+        self.stats = {'scheduled': 0, 'cancelled': 0, 'fired': 0, 'errors': 0, 'cascaded': 0}
+
+    def start(self):
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name='TimerWheel', daemon=True)
+        self.thread.start()
+        log_system_event('定时调度线程已启动')
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+
+    def _now_tick(self):
+        return int((time.monotonic() - self.origin) / self.tick)
+
+    def schedule(self, delay, callback, *args):
+        """delay秒后在调度线程中执行callback(*args)，返回Timer"""
+        if not self.running:
+            self.start()
+        expires = int(math.ceil((time.monotonic() - self.origin + max(delay, 0.0)) / self.tick))
+        with self.lock:
+            timer = Timer(self, max(expires, self.current + 1), callback, args)
+            self._place(timer)
+            self.count += 1
+            self.stats['scheduled'] += 1
+            idle = self.count == 1
+        if idle:
+            # 调度线程空闲时在等待唤醒
+            self.wakeup.set()
+        return timer
+
+    def cancel(self, timer):
+        """取消定时器，返回是否取消成功（已执行或已取消时返回False）"""
+        with self.lock:
+            bucket = timer.bucket
+            if bucket is None:
+                return False
+            bucket.discard(timer)
+            timer.bucket = None
+            self.count -= 1
+            self.stats['cancelled'] += 1
+            return True
+
+    def _place(self, timer):
+        """把定时器放入对应层的槽，调用方需持有self.lock"""
+        delta = timer.expires - self.current
+        for level in range(LEVELS):
+            if delta < 1 << (SLOT_BITS * (level + 1)):
+                index = (timer.expires >> (SLOT_BITS * level)) & SLOT_MASK
+                break
+        else:
+            # 超出时间轮范围：先放在最高层能到达的最远槽，下沉时重新计算
+            level = LEVELS - 1
+            farthest = self.current + (1 << (SLOT_BITS * LEVELS)) - 1
+            index = (farthest >> (SLOT_BITS * level)) & SLOT_MASK
+        bucket = self.wheels[level][index]
+        bucket.add(timer)
+        timer.bucket = bucket
+
+    def _advance(self):
+        """前进一个tick，返回到期的定时器，调用方需持有self.lock"""
+        self.current += 1
+        tick = self.current
+        # 低层走完一圈时，上层对应槽下沉
+        for level in range(1, LEVELS):
+            if tick & ((1 << (SLOT_BITS * level)) - 1):
+                break
+            bucket = self.wheels[level][(tick >> (SLOT_BITS * level)) & SLOT_MASK]
+            if bucket:
+                timers = list(bucket)
+                bucket.clear()
+                self.stats['cascaded'] += len(timers)
+                for timer in timers:
+                    self._place(timer)
+
+        bucket = self.wheels[0][tick & SLOT_MASK]
+        if not bucket:
+            return ()
+        expired = list(bucket)
+        bucket.clear()
+        for timer in expired:
+            timer.bucket = None
+        self.count -= len(expired)
+        return expired
+
+    def _run(self):
+        while self.running:
+            with self.lock:
+                if self.count == 0:
+                    # 没有定时器时直接对齐到当前时间，不需要逐tick下沉
+                    self.current = max(self.current, self._now_tick())
+                    idle = True
+                else:
+                    idle = False
+                    expired = []
+                    target = self._now_tick()
+                    while self.current < target:
+                        expired.extend(self._advance())
+            if idle:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+
+            for timer in expired:
+                try:
+                    timer.callback(*timer.args)
+                    self.stats['fired'] += 1
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    log_error(f"定时任务执行异常 ({getattr(timer.callback, '__name__', timer.callback)}): {e}", exc_info=True)
+
+            next_tick = self.origin + (self.current + 1) * self.tick
+            self.wakeup.wait(max(0.0, next_tick - time.monotonic()))
+            self.wakeup.clear()
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['pending'] = self.count
+        stats['tick'] = self.tick
+        return stats
+
+
+_wheel = TimerWheel()
+
+
+def schedule(delay, callback, *args):
+    """delay秒后执行callback(*args)，返回可取消的Timer"""
+    return _wheel.schedule(delay, callback, *args)
+
+
+def cancel(timer):
+    """取消定时器"""
+    return timer is not None and _wheel.cancel(timer)
+
+
+def stop():
+    """停止调度线程"""
+    _wheel.stop()
+
+
+def get_timer_stats():
+    """获取调度统计"""
+    return _wheel.get_stats()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+timeseries.py - 挂载点时间序列存储模块
+功能：按RRD方式为每个挂载点保存接收字节速率、帧速率、流动站数和分发延迟的历史：
+      1秒精度保留1小时、1分钟精度保留1天、15分钟精度保留30天，每个精度是固定大小的
+      float32环形数组，粗精度由细精度实时平均得到。采样每秒一次，读取接收统计（MountStats）
+      和分发统计（FanoutStats）的累计值求差，接收和分发路径上没有额外开销。
+      配置了persist_dir时每个挂载点的数组映射到一个文件（mmap），重启后历史仍在
+"""
+
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+
+from . import config
+from . import connection
+from . import forwarder
+from . import handoff
+from . import timerwheel
+from .logger import log_debug, log_info, log_warning, log_error
+
+# 指标顺序即存储顺序
+METRICS = ('bytes_per_sec', 'frames_per_sec', 'rovers', 'latency_ms')
+# 各精度: (步长秒, 行数)
+ARCHIVES = ((1, 3600), (60, 1440), (900, 2880))
+# 单次查询最多返回的点数，超过时改用更粗的精度
+MAX_POINTS = 4000
+
+FILE_MAGIC = b'NRRD'
+FILE_VERSION = 1
+_FILE_HEADER = struct.Struct('<4sHHHxx')  # 标记, 版本, 指标数, 精度数（补齐到4字节对齐）
+_ARCHIVE_HEADER = struct.Struct('<IIq')  # 步长, 行数, 最后写入的时间槽
+_NAN = float('nan')
+
+
+def _nan_row():
+    return array('f', [_NAN]) * len(METRICS)
+
+
+class _Archive:
+    """单个精度的环形数组，第 slot 个时间槽（时间 // 步长）存放在第 slot % 行数 行"""
+
+    __slots__ = ('step', 'rows', 'values', 'last_slot', 'header_offset', 'sums', 'counts', 'acc_slot')
+
+    def __init__(self, step, rows, values, last_slot, header_offset):
+        self.step = step
+        self.rows = rows
+        self.values = values  # memoryview('f')，rows * len(METRICS)
+        self.last_slot = last_slot
+        self.header_offset = header_offset
+        # 当前时间槽内的累加值，用于粗精度的实时平均
+        self.sums = [0.0] * len(METRICS)
+        self.counts = [0] * len(METRICS)
+        self.acc_slot = None
+
+
+class SeriesStore:
+    """单个挂载点的时间序列
+
+    存储区为 文件头 + 各精度头 + 各精度数据，内存模式用bytearray，持久化模式用mmap映射的文件，
+    两种模式的读写代码相同。只由采样线程写入；查询不加锁，可能读到正在写入的一行，对图表无影响。
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.file = None
+        self.buffer = None
+        self.archives = []
+        size = self._layout_size()
+        if path is None:
+            self.buffer = bytearray(size)
+            self._init_buffer()
+            return
+        exists = os.path.exists(path)
+        self.file = open(path, 'r+b' if exists else 'w+b')
+        try:
+            fresh = not exists or os.fstat(self.file.fileno()).st_size != size
+            if fresh:
+                self.file.truncate(size)
+            self.buffer = mmap.mmap(self.file.fileno(), size)
+            if fresh or not self._load_buffer():
+                self._init_buffer()
+        except Exception:
+            self.close()
+            raise
+
+    @staticmethod
+    def _layout_size():
+        return (_FILE_HEADER.size + _ARCHIVE_HEADER.size * len(ARCHIVES)
+                + sum(rows for _, rows in ARCHIVES) * len(METRICS) * 4)
+
+    def _bind(self, last_slots):
+        view = memoryview(self.buffer)
+        offset = _FILE_HEADER.size + _ARCHIVE_HEADER.size * len(ARCHIVES)
+        self.archives = []
+        for index, ((step, rows), last_slot) in enumerate(zip(ARCHIVES, last_slots)):
+            length = rows * len(METRICS) * 4
+            values = view[offset:offset + length].cast('f')
+            self.archives.append(_Archive(step, rows, values, last_slot,
+                                          _FILE_HEADER.size + _ARCHIVE_HEADER.size * index))
+            offset += length
+
+    def _init_buffer(self):
+        _FILE_HEADER.pack_into(self.buffer, 0, FILE_MAGIC, FILE_VERSION, len(METRICS), len(ARCHIVES))
+        self._bind([-1] * len(ARCHIVES))
+        for archive in self.archives:
+            archive.values[:] = _nan_row() * archive.rows
+            self._save_header(archive)
+
+    def _load_buffer(self):
+        """校验已有文件的格式，匹配时沿用其中的历史"""
+        magic, version, metrics, archives = _FILE_HEADER.unpack_from(self.buffer, 0)
+        if (magic, version, metrics, archives) != (FILE_MAGIC, FILE_VERSION, len(METRICS), len(ARCHIVES)):
+            return False
+        last_slots = []
+        for index, (step, rows) in enumerate(ARCHIVES):
+            stored_step, stored_rows, last_slot = _ARCHIVE_HEADER.unpack_from(
+                self.buffer, _FILE_HEADER.size + _ARCHIVE_HEADER.size * index)
+            if (stored_step, stored_rows) != (step, rows):
+                return False
+            last_slots.append(last_slot)
+        self._bind(last_slots)
+        return True
+
+    def _save_header(self, archive):
+        _ARCHIVE_HEADER.pack_into(self.buffer, archive.header_offset, archive.step, archive.rows, archive.last_slot)
+
+    def _write(self, archive, slot, row):
+        last = archive.last_slot
+        if slot < last:
+            return
+        width = len(METRICS)
+        # 跳过的时间槽（采样中断、挂载点离线）填NaN
+        for gap in range(max(last + 1, slot - archive.rows + 1), slot):
+            base = (gap % archive.rows) * width
+            archive.values[base:base + width] = _nan_row()
+        base = (slot % archive.rows) * width
+        archive.values[base:base + width] = row
+        if slot != last:
+            archive.last_slot = slot
+            self._save_header(archive)
+
+    def update(self, timestamp, values):
+        """写入一个1秒采样，粗精度写入所在时间槽的当前平均值"""
+        for archive in self.archives:
+            slot = int(timestamp // archive.step)
+            if archive.step == 1:
+                self._write(archive, slot, array('f', values))
+                continue
+            if archive.acc_slot != slot:
+                archive.acc_slot = slot
+                archive.sums = [0.0] * len(METRICS)
+                archive.counts = [0] * len(METRICS)
+            for index, value in enumerate(values):
+                if not math.isnan(value):
+                    archive.sums[index] += value
+                    archive.counts[index] += 1
+            self._write(archive, slot, array('f', [total / count if count else _NAN
+                                                    for total, count in zip(archive.sums, archive.counts)]))
+
+    def query(self, start, end, step=None):
+        """查询[start, end]内的数据点
+
+        step为空时选最细的、覆盖start且点数不超过MAX_POINTS的精度；指定step时选步长不小于step的最细精度。
+
+        Returns:
+            tuple: (步长, [(时间, [各指标值，无数据为None])])
+        """
+        archive = self._select(start, end, step)
+        width = len(METRICS)
+        first = max(int(start // archive.step), archive.last_slot - archive.rows + 1)
+        last = min(int(end // archive.step), archive.last_slot)
+        points = []
+        for slot in range(first, last + 1):
+            base = (slot % archive.rows) * width
+            row = archive.values[base:base + width].tolist()
+            if all(math.isnan(value) for value in row):
+                continue
+            points.append((slot * archive.step, [None if math.isnan(value) else value for value in row]))
+        return archive.step, points
+
+    def _select(self, start, end, step):
+        for archive in self.archives:
+            if step is not None:
+                if archive.step >= step:
+                    return archive
+                continue
+            oldest = (archive.last_slot - archive.rows + 1) * archive.step
+            if oldest <= start and (end - start) / archive.step <= MAX_POINTS:
+                return archive
+        return self.archives[-1]
+
+    def close(self):
+        for archive in self.archives:
+            archive.values.release()
+        self.archives = []
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.flush()
+            self.buffer.close()
+        self.buffer = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def _file_name(mount_name):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', mount_name) + '.rrd'
+
+
+class TimeSeriesRecorder:
+    """每秒采样所有在线挂载点，写入各自的SeriesStore"""
+
+    def __init__(self):
+        self.stores = {}  # {挂载点: SeriesStore}
+        self.previous = {}  # {挂载点: (MountInfo, FanoutStats, 时间, 接收字节, 接收帧数, 分发次数, 延迟累计)}
+        self.lock = threading.Lock()
+        self.timer = None
+        self.running = False
+        self.stats = {'samples': 0, 'last_sample_ms': 0.0, 'errors': 0}
+
+    def start(self):
+        if not config.TIMESERIES_ENABLED or self.running:
+            return
+        if config.TIMESERIES_PERSIST_DIR:
+            os.makedirs(config.TIMESERIES_PERSIST_DIR, exist_ok=True)
+        self.running = True
+        self._schedule()
+        log_info(f"挂载点时间序列采样已启动，持久化目录: {config.TIMESERIES_PERSIST_DIR or '无（仅内存）'}")
+
+    def stop(self):
+        self.running = False
+        timerwheel.cancel(self.timer)
+        self.timer = None
+        with self.lock:
+            for store in self.stores.values():
+                store.close()
+            self.stores.clear()
+
+    def _schedule(self):
+        # 对齐到整秒，每个1秒时间槽恰好一个采样
+        self.timer = timerwheel.schedule(1.0 - time.time() % 1.0, self._tick)
+
+    def _tick(self):
+        if not self.running:
+            return
+        try:
+            self.sample(time.time())
+        except Exception as e:
+            self.stats['errors'] += 1
+            log_error(f"时间序列采样失败: {e}", exc_info=True)
+        finally:
+            if self.running:
+                self._schedule()
+
+    def sample(self, now):
+        """采样一次：按与上一次采样的累计值之差计算每秒值"""
+        if handoff.is_frozen():
+            # 已交给新进程，新进程接着写同一批文件
+            return
+        start = time.perf_counter()
+        manager = connection.get_connection_manager()
+        with manager.mount_lock:
+            mounts = list(manager.online_mounts.items())
+        previous = {}
+        for mount_name, mount_info in mounts:
+            stats = mount_info.stats
+            fanout = forwarder.get_fanout_stats(mount_name)
+            deliveries, latency_sum = (fanout.deliveries, fanout.latency_sum) if fanout is not None else (0, 0.0)
+            current = (mount_info, fanout, now, stats.total_bytes, stats.total_messages, deliveries, latency_sum)
+            previous[mount_name] = current
+            last = self.previous.get(mount_name)
+            if last is None or last[0] is not mount_info or now <= last[2]:
+                continue
+            elapsed = now - last[2]
+            latency = _NAN
+            if fanout is not None and fanout is last[1] and deliveries > last[5]:
+                latency = (latency_sum - last[6]) / (deliveries - last[5]) * 1000
+            store = self.get_store(mount_name, create=True)
+            if store is None:
+                continue
+            store.update(now, ((current[3] - last[3]) / elapsed,
+                               (current[4] - last[4]) / elapsed,
+                               float(manager.get_mount_connection_count(mount_name)),
+                               latency))
+        self.previous = previous
+        self.stats['samples'] += 1
+        self.stats['last_sample_ms'] = (time.perf_counter() - start) * 1000
+
+    def get_store(self, mount_name, create=False):
+        """获取挂载点的SeriesStore；持久化模式下按需打开已有文件，create为True时不存在则新建"""
+        store = self.stores.get(mount_name)
+        if store is not None:
+            return store
+        path = None
+        if config.TIMESERIES_PERSIST_DIR:
+            path = os.path.join(config.TIMESERIES_PERSIST_DIR, _file_name(mount_name))
+            if not create and not os.path.exists(path):
+                return None
+        elif not create:
+            return None
+        with self.lock:
+            store = self.stores.get(mount_name)
+            if store is None:
+                try:
+                    store = SeriesStore(path)
+                except OSError as e:
+                    log_warning(f"打开挂载点 {mount_name} 的时间序列文件失败: {e}")
+                    return None
+                self.stores[mount_name] = store
+                log_debug(f"已创建挂载点 {mount_name} 的时间序列存储")
+        return store
+
+    def query(self, mount_name, start=None, end=None, step=None):
+        """查询挂载点历史，默认最近1小时"""
+        if end is None:
+            end = time.time()
+        if start is None:
+            start = end - 3600
+        store = self.get_store(mount_name)
+        if store is None:
+            return None
+        resolution, points = store.query(start, end, step)
+        return {
+            'mount': mount_name,
+            'start': start,
+            'end': end,
+            'step': resolution,
+            'metrics': list(METRICS),
+            'points': [[timestamp] + values for timestamp, values in points],
+        }
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['mounts'] = len(self.stores)
+        stats['bytes_per_mount'] = SeriesStore._layout_size()
+        return stats
+
+
+_recorder = TimeSeriesRecorder()
+
+
+def start_recorder():
+    """启动时间序列采样"""
+    _recorder.start()
+
+
+def stop_recorder():
+    """停止采样并关闭存储（持久化模式下刷新到文件）"""
+    _recorder.stop()
+
+
+def query(mount_name, start=None, end=None, step=None):
+    """查询挂载点历史，挂载点没有历史时返回None"""
+    return _recorder.query(mount_name, start, end, step)
+
+
+def get_timeseries_stats():
+    """获取时间序列采样统计"""
+    return _recorder.get_stats()
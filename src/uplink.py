@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+uplink.py - 流动站上行数据读取模块
+功能：用一个selector线程统一读取所有下载连接上的上行数据（GGA等NMEA语句），
+      及时排空接收缓冲区，增量解析并记录每个客户端的最新位置和定位质量
+"""
+
+import socket
+import selectors
+import threading
+import time
+from collections import deque
+
+from . import logger
+from .nmea import NMEALineBuffer, parse_gga
+
+# 单次读取上限：一次就绪事件尽量读完当前所有上行数据
+UPLINK_READ_SIZE = 4096
+# 下载socket在广播线程中以阻塞方式发送，读取时按次指定非阻塞，不改变socket模式
+RECV_FLAGS = getattr(socket, 'MSG_DONTWAIT', 0)
+
+
+class RoverPosition:
+    """流动站最新位置（每个客户端一个，原地更新）"""
+
+    __slots__ = ('lat', 'lon', 'quality', 'satellites', 'updated_at')
+
+    def __init__(self):
+        self.lat = 0.0
+        self.lon = 0.0
+        self.quality = 0
+        self.satellites = 0
+        self.updated_at = 0.0
+
+    def update(self, fix, now):
+        self.lat = fix.lat
+        self.lon = fix.lon
+        self.quality = fix.quality
+        self.satellites = fix.satellites
+        self.updated_at = now
+
+    def to_dict(self, now=None):
+        now = now or time.time()
+        return {
+            'lat': round(self.lat, 8),
+            'lon': round(self.lon, 8),
+            'quality': self.quality,
+            'satellites': self.satellites,
+            'age': round(now - self.updated_at, 1),
+        }
+
+
+class _UplinkState:
+    """单个连接的读取状态"""
+
+    __slots__ = ('client_info', 'buffer', 'bytes_received')
+
+    def __init__(self, client_info):
+        self.client_info = client_info
+        self.buffer = NMEALineBuffer()
+        self.bytes_received = 0
+
+
+class UplinkReader:
+    """下载连接上行数据读取线程
+
+    所有下载socket注册到同一个selector，socket可读时只做一次recv，读到的数据增量切分NMEA语句，
+    不影响广播线程的发送路径。注册/注销请求先放入队列，再通过唤醒socket通知读取线程处理，
+    避免跨线程直接修改selector。
+    """
+
+    def __init__(self, on_disconnect=None):
+        self.on_disconnect = on_disconnect  # 读到EOF或读取出错时回调 on_disconnect(client_info)
+        self.selector = None
+        self.pending = deque()  # [(操作, client_info)]
+        self.pending_lock = threading.Lock()
+        self.wakeup_r = None
+        self.wakeup_w = None
+        self.thread = None
+        self.running = False
+        self.stats = {'registered': 0, 'events': 0, 'bytes': 0, 'sentences': 0, 'gga': 0}
+
+    def start(self):
+        if self.running:
+            return
+        self.selector = selectors.DefaultSelector()
+        self.wakeup_r, self.wakeup_w = socket.socketpair()
+        self.wakeup_r.setblocking(False)
+        self.wakeup_w.setblocking(False)
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ, None)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='UplinkReader', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self._wakeup()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=5)
+        for sock in (self.wakeup_r, self.wakeup_w):
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self.selector.close()
+
+    def register(self, client_info):
+        """注册下载连接，开始读取其上行数据"""
+        self._submit('add', client_info)
+
+    def unregister(self, client_info):
+        """注销下载连接"""
+        self._submit('remove', client_info)
+
+    def _submit(self, operation, client_info):
+        if not self.running:
+            return
+        with self.pending_lock:
+            self.pending.append((operation, client_info))
+        self._wakeup()
+
+    def _wakeup(self):
+        try:
+            self.wakeup_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            # 唤醒缓冲区已满说明读取线程马上会处理队列
+            pass
+
+    def _apply_pending(self):
+        with self.pending_lock:
+            changes = list(self.pending)
+            self.pending.clear()
+        for operation, client_info in changes:
+            sock = client_info.socket
+            try:
+                if operation == 'add':
+                    if sock.fileno() != -1:
+                        self.selector.register(sock, selectors.EVENT_READ, _UplinkState(client_info))
+                        self.stats['registered'] += 1
+                else:
+                    self.selector.unregister(sock)
+                    self.stats['registered'] -= 1
+            except (KeyError, ValueError, OSError):
+                pass
+
+    def _drop(self, key, closed):
+        try:
+            self.selector.unregister(key.fileobj)
+            self.stats['registered'] -= 1
+        except (KeyError, ValueError, OSError):
+            return
+        if closed and self.on_disconnect:
+            try:
+                self.on_disconnect(key.data.client_info)
+            except Exception as e:
+                logger.log_error(f"处理流动站断开失败: {e}", exc_info=True)
+
+    def _run(self):
+        while self.running:
+            try:
+                events = self.selector.select(timeout=1.0)
+            except (OSError, ValueError):
+                # 有socket在注册期间被关闭，清理后重试
+                self._purge_closed()
+                continue
+            for key, _ in events:
+                if key.data is None:
+                    try:
+                        while self.wakeup_r.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+                self._read(key)
+            self._apply_pending()
+
+    def _purge_closed(self):
+        for key in list(self.selector.get_map().values()):
+            if key.data is not None and key.fileobj.fileno() == -1:
+                self._drop(key, closed=False)
+        self._apply_pending()
+
+    def _read(self, key):
+        state = key.data
+        try:
+            data = key.fileobj.recv(UPLINK_READ_SIZE, RECV_FLAGS)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            # socket已被其他线程关闭（客户端被移除），或连接被重置
+            self._drop(key, closed=key.fileobj.fileno() != -1)
+            return
+        if not data:
+            self._drop(key, closed=True)
+            return
+
+        self.stats['events'] += 1
+        self.stats['bytes'] += len(data)
+        state.bytes_received += len(data)
+        fix = None
+        for sentence in state.buffer.feed(data):
+            self.stats['sentences'] += 1
+            parsed = parse_gga(sentence)
+            if parsed is not None:
+                fix = parsed
+        if fix is not None:
+            self.stats['gga'] += 1
+            client_info = state.client_info
+            position = client_info.position
+            if position is None:
+                position = client_info.position = RoverPosition()
+            position.update(fix, time.time())
+
+    def get_stats(self):
+        return dict(self.stats)
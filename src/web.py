@@ -9,11 +9,12 @@ import json
 import logging
 import psutil
 import re
+import io
 from datetime import datetime
 from functools import wraps
 from threading import Thread
 
-from flask import Flask, render_template_string, request, redirect, url_for, session, jsonify, send_from_directory
+from flask import Flask, render_template_string, request, redirect, url_for, session, jsonify, send_from_directory, Response, stream_with_context
 # from flask_cors import CORS  # 已移除，不需要CORS功能
 import os
 from flask_socketio import SocketIO, emit, join_room
@@ -24,6 +25,9 @@ from . import logger
 from .logger import log_debug, log_info, log_warning, log_error, log_critical, log_web_request, log_system_event
 from . import connection
 from . import forwarder
+from . import bulk
+from . import timeseries
+from . import accounting
 from .rtcm2_manager import parser_manager as rtcm_manager
 
 # 全局服务器实例引用
@@ -293,6 +297,25 @@ class WebManager:
         
 
         
+        @self.app.route('/api/system/reload-config', methods=['GET', 'POST'])
+        @self.require_login
+        def reload_config():
+            """配置热加载API：POST重新加载配置文件，GET返回最近的热加载记录"""
+            if request.method == 'GET':
+                return jsonify({'success': True, 'history': config.get_reload_history()})
+            try:
+                server = get_server_instance()
+                if server is not None:
+                    success, message, result = server.reload_config('api')
+                else:
+                    success, message, result = config.reload_config('api')
+                if not success:
+                    return jsonify({'success': False, 'error': message}), 400
+                return jsonify({'success': True, 'message': message, **result})
+            except Exception as e:
+                log_error(f"配置热加载失败: {e}", exc_info=True)
+                return jsonify({'success': False, 'error': str(e)}), 500
+        
         @self.app.route('/api/system/restart', methods=['POST'])
         @self.require_login
         def restart_system():
@@ -306,6 +329,11 @@ class WebManager:
                     """延迟重启程序"""
                     time.sleep(1)  # 给响应时间返回
                     log_info("管理员请求重启程序")
+                    server = get_server_instance()
+                    if server is not None and config.HANDOFF_ENABLED:
+                        # 平滑重启：新进程接管所有连接后本进程退出，失败时回退为直接退出
+                        success, message = server.graceful_restart()
+                        log_warning(f"平滑重启失败，改为直接重启: {message}")
                     os._exit(0)  # 强制退出程序
                 
                 # 在新线程中执行重启
@@ -645,6 +673,29 @@ class WebManager:
                     log_error(f"添加用户失败: {e}")
                     return jsonify({'error': str(e)}), 500
         
+        @self.app.route('/api/users/bulk', methods=['POST'])
+        @self.require_login
+        def api_users_bulk():
+            """批量导入用户API，接受CSV/JSON/JSON Lines文件上传或请求体"""
+            try:
+                stream, fmt = self._bulk_request_stream()
+                report = bulk.import_users(stream, fmt)
+                return jsonify(report), 200 if report['failed'] == 0 else 207
+            except ValueError as e:
+                return jsonify({'error': f'导入数据格式错误: {e}'}), 400
+            except Exception as e:
+                log_error(f"批量导入用户失败: {e}")
+                return jsonify({'error': str(e)}), 500
+        
+        @self.app.route('/api/users/export')
+        @self.require_login
+        def api_users_export():
+            """流式导出用户API"""
+            fmt = request.args.get('format', 'csv')
+            if fmt not in bulk.SUPPORTED_FORMATS:
+                return jsonify({'error': f'不支持的格式: {fmt}'}), 400
+            return self._bulk_export_response(bulk.export_users(fmt), 'users', fmt)
+        
         @self.app.route('/api/users/<username>', methods=['PUT', 'DELETE'])
         @self.require_login
         def api_user_detail(username):
@@ -856,6 +907,29 @@ class WebManager:
                     log_error(f"添加挂载点失败: {e}")
                     return jsonify({'error': str(e)}), 500
         
+        @self.app.route('/api/mounts/bulk', methods=['POST'])
+        @self.require_login
+        def api_mounts_bulk():
+            """批量导入挂载点API，接受CSV/JSON/JSON Lines文件上传或请求体"""
+            try:
+                stream, fmt = self._bulk_request_stream()
+                report = bulk.import_mounts(stream, fmt)
+                return jsonify(report), 200 if report['failed'] == 0 else 207
+            except ValueError as e:
+                return jsonify({'error': f'导入数据格式错误: {e}'}), 400
+            except Exception as e:
+                log_error(f"批量导入挂载点失败: {e}")
+                return jsonify({'error': str(e)}), 500
+        
+        @self.app.route('/api/mounts/export')
+        @self.require_login
+        def api_mounts_export():
+            """流式导出挂载点API"""
+            fmt = request.args.get('format', 'csv')
+            if fmt not in bulk.SUPPORTED_FORMATS:
+                return jsonify({'error': f'不支持的格式: {fmt}'}), 400
+            return self._bulk_export_response(bulk.export_mounts(fmt), 'mounts', fmt)
+        
         @self.app.route('/api/mounts/<mount_name>', methods=['PUT', 'DELETE'])
         @self.require_login
         def api_mount_detail(mount_name):
@@ -1030,7 +1104,73 @@ class WebManager:
             except Exception as e:
                 log_error(f"检查挂载点在线状态失败: {e}")
                 return jsonify({'error': str(e)}), 500
-        
+
+        @self.app.route('/api/mount/<mount_name>/timeseries')
+        @self.require_login
+        def api_mount_timeseries(mount_name):
+            """获取挂载点历史（接收速率、帧速率、流动站数、分发延迟），参数start/end为Unix时间，step为最小步长（秒）"""
+            try:
+                start = request.args.get('start', type=float)
+                end = request.args.get('end', type=float)
+                step = request.args.get('step', type=int)
+                if start is not None and end is not None and start > end:
+                    return jsonify({'success': False, 'error': 'start不能大于end'}), 400
+                history = timeseries.query(mount_name, start, end, step)
+                if history is None:
+                    return jsonify({'success': False, 'error': f'挂载点 {mount_name} 没有历史数据'}), 404
+                return jsonify({'success': True, 'data': history})
+            except Exception as e:
+                log_error(f"获取挂载点{mount_name}历史数据失败: {e}")
+                return jsonify({'success': False, 'error': str(e)}), 500
+
+        @self.app.route('/api/usage')
+        @self.require_login
+        def api_usage():
+            """用量报表：参数username/mount过滤，start/end为Unix时间，group为hour/day/month/total"""
+            try:
+                group = request.args.get('group', 'day')
+                if group not in accounting.REPORT_GROUPS:
+                    return jsonify({'success': False, 'error': f'不支持的分组方式: {group}'}), 400
+                usage = accounting.get_usage(request.args.get('username') or None, request.args.get('mount') or None,
+                                             request.args.get('start', type=float), request.args.get('end', type=float),
+                                             group)
+                return jsonify({'success': True, 'data': usage})
+            except Exception as e:
+                log_error(f"获取用量报表失败: {e}")
+                return jsonify({'success': False, 'error': str(e)}), 500
+
+        @self.app.route('/api/usage/sessions')
+        @self.require_login
+        def api_usage_sessions():
+            """流动站会话记录：参数同/api/usage，limit为最多返回条数"""
+            try:
+                limit = min(max(request.args.get('limit', 1000, type=int), 1), 10000)
+                sessions = accounting.get_usage_sessions(request.args.get('username') or None,
+                                                         request.args.get('mount') or None,
+                                                         request.args.get('start', type=float),
+                                                         request.args.get('end', type=float), limit)
+                return jsonify({'success': True, 'data': sessions})
+            except Exception as e:
+                log_error(f"获取会话记录失败: {e}")
+                return jsonify({'success': False, 'error': str(e)}), 500
+
+        @self.app.route('/api/rovers')
+        @self.app.route('/api/mount/<mount_name>/rovers')
+        @self.require_login
+        def api_rover_positions(mount_name=None):
+            """获取流动站上传的最新位置（按挂载点汇总）"""
+            try:
+                rovers = forwarder.get_rover_positions(mount_name)
+                return jsonify({
+                    'success': True,
+                    'rovers': rovers,
+                    'total_count': sum(len(items) for items in rovers.values()),
+                    'timestamp': time.time()
+                })
+            except Exception as e:
+                log_error(f"获取流动站位置失败: {e}")
+                return jsonify({'success': False, 'error': str(e)}), 500
+
         @self.app.route('/api/system/stats')
         def api_system_stats():
             """获取系统统计数据"""
@@ -1208,6 +1348,33 @@ class WebManager:
                 log_error(f"处理系统统计数据请求失败: {e}")
                 emit('error', {'message': str(e)})
     
+    def _bulk_request_stream(self):
+        """从批量导入请求中取出文本流和格式，优先使用上传文件，其次为请求体"""
+        upload = request.files.get('file')
+        if upload:
+            fmt = request.args.get('format') or bulk.guess_format(upload.filename)
+            return io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''), fmt
+        
+        fmt = request.args.get('format')
+        if not fmt:
+            content_type = request.mimetype or ''
+            if 'ndjson' in content_type or 'jsonl' in content_type:
+                fmt = 'jsonl'
+            elif 'json' in content_type:
+                fmt = 'json'
+            else:
+                fmt = 'csv'
+        return io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline=''), fmt
+    
+    def _bulk_export_response(self, blocks, name, fmt):
+        """构造流式下载响应"""
+        mimetypes = {'csv': 'text/csv', 'json': 'application/json', 'jsonl': 'application/x-ndjson'}
+        return Response(
+            stream_with_context(blocks),
+            mimetype=mimetypes[fmt],
+            headers={'Content-Disposition': f'attachment; filename={name}.{fmt}'}
+        )
+    
     def require_login(self, f):
         """登录装饰器"""
         @wraps(f)
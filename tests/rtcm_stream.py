@@ -0,0 +1,70 @@
+"""
+RTCM3模拟数据流构造工具
+功能：供RTCM相关基准测试脚本共用，按比特拼接构造1005、1033和MSM7消息，
+      生成模拟基准站输出的RTCM3数据流
+"""
+
+import random
+
+from pyrtcm import crc2bytes
+
+STATION_ID = 1234
+MSM7_TYPES = (1077, 1087, 1097, 1127)
+SIGNALS = 2  # 每颗卫星的信号数
+
+
+def pack(fields):
+    """按(位数, 值)依次拼接比特并补齐到整字节"""
+    value = 0
+    width = 0
+    for bits, field in fields:
+        value = (value << bits) | (field & ((1 << bits) - 1))
+        width += bits
+    pad = -width % 8
+    return (value << pad).to_bytes((width + pad) // 8, 'big')
+
+
+def frame(payload):
+    header = bytes([0xD3, len(payload) >> 8, len(payload) & 0xFF]) + payload
+    return header + crc2bytes(header)
+
+
+def chars(text):
+    return [(8, len(text))] + [(8, c) for c in text]
+
+
+def msg_1005():
+    return frame(pack([(12, 1005), (12, STATION_ID), (6, 0), (1, 1), (1, 0), (1, 0), (1, 0),
+                       (38, -22670000000), (1, 0), (1, 0), (38, 50090000000), (2, 0), (38, 32210000000)]))
+
+
+def msg_1033():
+    return frame(pack([(12, 1033), (12, STATION_ID)] + chars(b'TRM59800.00     NONE') + [(8, 0)]
+                      + chars(b'5311354') + chars(b'TRIMBLE ALLOY') + chars(b'6.10') + chars(b'6013R40087')))
+
+
+def msg_msm7(rng, message_type, epoch, multiple):
+    sats = rng.randint(8, 12)
+    sat_mask = sum(1 << (63 - prn) for prn in rng.sample(range(32), sats))
+    sig_mask = (1 << 31) | (1 << 20)
+    cells = sats * SIGNALS
+    header = [(12, message_type), (12, STATION_ID), (30, epoch), (1, multiple), (3, 0), (7, 0), (2, 0), (2, 0),
+              (1, 0), (3, 0), (64, sat_mask), (32, sig_mask), (cells, (1 << cells) - 1)]
+    # 卫星数据36位/颗，信号数据80位/个
+    data = [(36, rng.getrandbits(36)) for _ in range(sats)] + [(80, rng.getrandbits(80)) for _ in range(cells)]
+    return frame(pack(header + data))
+
+
+def build_stream(epochs, seed=2024, device_every=None, garbage_every=None):
+    """每个历元1005 + MSM7_TYPES各一条；device_every个历元插一条1033，garbage_every个历元插40字节垃圾"""
+    rng = random.Random(seed)
+    parts = []
+    for i in range(epochs):
+        parts.append(msg_1005())
+        if device_every and i % device_every == 0:
+            parts.append(msg_1033())
+        for index, message_type in enumerate(MSM7_TYPES):
+            parts.append(msg_msm7(rng, message_type, i * 1000, int(index < len(MSM7_TYPES) - 1)))
+        if garbage_every and i % garbage_every == 0:
+            parts.append(rng.randbytes(40).replace(b'\xd3', b'\x00'))
+    return b''.join(parts)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+连接接入基准测试脚本
+功能：在子进程中启动NTRIP Caster，由多个客户端线程持续新建连接并请求源表，
+      统计每秒完成的连接数和握手延迟（发起连接到收到响应首字节）的分位数
+用法：python tests/test_accept_benchmark.py [客户端线程数] [测试时长(秒)]
+"""
+
+import os
+import sys
+import time
+import socket
+import threading
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# 基准测试配置
+CLIENT_THREADS = 16
+DURATION = 10
+WARMUP = 1.0  # 预热时长（秒），不计入统计
+
+SOURCETABLE_REQUEST = (
+    b"GET / HTTP/1.1\r\n"
+    b"Host: localhost\r\n"
+    b"Ntrip-Version: Ntrip/2.0\r\n"
+    b"User-Agent: NTRIP AcceptBenchmark/1.0\r\n"
+    b"\r\n"
+)
+
+
+def run_caster(port):
+    """子进程：启动Caster"""
+    from src import ntrip
+    ntrip.NTRIP_PORT = port
+    ntrip.NTRIPCaster(None).start()
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def client_loop(port, stop_at, measure_from, latencies, errors, lock):
+    """持续新建连接请求源表，记录握手延迟"""
+    local = []
+    failed = 0
+    while True:
+        start = time.perf_counter()
+        if start >= stop_at:
+            break
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=10) as sock:
+                sock.sendall(SOURCETABLE_REQUEST)
+                first = sock.recv(65536)
+                latency = time.perf_counter() - start
+                while sock.recv(65536):
+                    pass
+            if not first:
+                raise ConnectionError("空响应")
+            if start >= measure_from:
+                local.append(latency)
+        except OSError:
+            if start >= measure_from:
+                failed += 1
+    with lock:
+        latencies.extend(local)
+        errors[0] += failed
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else CLIENT_THREADS
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else DURATION
+
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+
+    server = multiprocessing.Process(target=run_caster, args=(port,), daemon=True)
+    server.start()
+    if not wait_for_port(port):
+        print("Caster启动失败")
+        server.terminate()
+        return 1
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    measure_from = time.perf_counter() + WARMUP
+    stop_at = measure_from + duration
+    workers = [threading.Thread(target=client_loop, args=(port, stop_at, measure_from, latencies, errors, lock))
+               for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    server.terminate()
+    server.join()
+
+    if not latencies:
+        print("没有完成的连接")
+        return 1
+    print(f"客户端线程: {threads}, 测试时长: {duration:.0f} 秒")
+    print(f"完成连接: {len(latencies)}, 失败: {errors[0]}, 接入速率: {len(latencies) / duration:.0f} conn/s")
+    print(f"握手延迟: 平均 {sum(latencies) / len(latencies) * 1000:.2f} ms, "
+          f"P50 {percentile(latencies, 0.5) * 1000:.2f} ms, "
+          f"P99 {percentile(latencies, 0.99) * 1000:.2f} ms, "
+          f"最大 {max(latencies) * 1000:.2f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
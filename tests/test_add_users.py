@@ -2,6 +2,7 @@
 """
 用户批量添加测试脚本
 功能：通过Web API添加500个测试用户
+用法：python test_add_users.py [--bulk]   --bulk 使用批量导入接口一次性提交
 """
 
 import requests
@@ -57,6 +58,19 @@ def add_user(cookies, username, password):
     except Exception as e:
         return False, str(e)
 
+def bulk_add_users(cookies, users):
+    """通过批量导入接口一次性添加用户"""
+    bulk_url = f"{WEB_SERVER_URL}/api/users/bulk"
+    
+    try:
+        response = requests.post(bulk_url, json=users, cookies=cookies, timeout=600)
+        if response.status_code in [200, 207]:
+            return response.json()
+        else:
+            return {'added': 0, 'failed': len(users), 'errors': [{'row': 0, 'name': '', 'error': f"HTTP {response.status_code}"}]}
+    except Exception as e:
+        return {'added': 0, 'failed': len(users), 'errors': [{'row': 0, 'name': '', 'error': str(e)}]}
+
 def main():
     """主函数"""
     print("开始批量添加用户测试...")
@@ -78,23 +92,31 @@ def main():
     print(f"开始添加 {total_users} 个用户...")
     start_time = time.time()
     
-    for i in range(1, total_users + 1):
-        # 生成有规律的用户名和密码
-        username = f"testuser{i:03d}"  # testuser001, testuser002, ..., testuser500
-        password = f"pass{i:03d}"      # pass001, pass002, ..., pass500
+    if '--bulk' in sys.argv:
+        users = [{"username": f"testuser{i:03d}", "password": f"pass{i:03d}"} for i in range(1, total_users + 1)]
+        report = bulk_add_users(cookies, users)
+        success_count = report.get('added', 0)
+        failed_count = report.get('failed', 0)
+        for error in report.get('errors', []):
+            print(f"添加用户 {error['name']} 失败: {error['error']}")
+    else:
+        for i in range(1, total_users + 1):
+            # 生成有规律的用户名和密码
+            username = f"testuser{i:03d}"  # testuser001, testuser002, ..., testuser500
+            password = f"pass{i:03d}"      # pass001, pass002, ..., pass500
         
-        success, message = add_user(cookies, username, password)
+            success, message = add_user(cookies, username, password)
         
-        if success:
-            success_count += 1
-            if i % 50 == 0:  # 每50个用户显示一次进度
-                print(f"已成功添加 {success_count} 个用户 (进度: {i}/{total_users})")
-        else:
-            failed_count += 1
-            print(f"添加用户 {username} 失败: {message}")
+            if success:
+                success_count += 1
+                if i % 50 == 0:  # 每50个用户显示一次进度
+                    print(f"已成功添加 {success_count} 个用户 (进度: {i}/{total_users})")
+            else:
+                failed_count += 1
+                print(f"添加用户 {username} 失败: {message}")
         
-        # 避免请求过于频繁
-        time.sleep(0.01)
+            # 避免请求过于频繁
+            time.sleep(0.01)
     
     end_time = time.time()
     elapsed_time = end_time - start_time
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+连接ID基准测试脚本
+功能：向连接管理器登记5000个流动站会话，统计原来按“用户名_挂载点_秒级时间戳”生成的连接ID的重复数，
+      并测量按递增连接ID查字典更新用户活动和移除会话的耗时
+      （原来线性查找的活动更新耗时见test_session_memory.py）
+用法：python tests/test_connection_id_benchmark.py [会话数] [用户数]
+"""
+
+import os
+import sys
+import time
+import logging
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.connection import ClientSession, ConnectionManager
+
+# 基准测试配置
+SESSION_COUNT = 5000
+USER_COUNT = 20
+MOUNT_COUNT = 10
+UPDATE_ROUNDS = 20  # 每个会话模拟的活动更新次数
+
+
+def build_sessions(count, user_count):
+    sessions = []
+    for i in range(count):
+        addr = (f"10.0.{i // 256 % 256}.{i % 256}", 40000 + i % 20000)
+        sessions.append(ClientSession(None, f"user{i % user_count:03d}", f"MOUNT{i % MOUNT_COUNT:02d}",
+                                      'NTRIP RoverClient/1.0', addr, 'ntrip2_0'))
+    return sessions
+
+
+def legacy_ids(sessions):
+    """原来的连接ID：用户名_挂载点_秒级时间戳"""
+    return [f"{session.user}_{session.mount}_{int(session.connected_at)}" for session in sessions]
+
+
+def time_indexed(manager, connection_ids):
+    start = time.perf_counter()
+    for _ in range(UPDATE_ROUNDS):
+        for connection_id in connection_ids:
+            session = manager.get_session(connection_id)
+            session.last_seen = time.time()
+            session.bytes_sent += 200
+    return time.perf_counter() - start, len(connection_ids) * UPDATE_ROUNDS
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else SESSION_COUNT
+    user_count = int(sys.argv[2]) if len(sys.argv) > 2 else USER_COUNT
+    logging.disable(logging.INFO)  # 登记会话时的逐条日志不计入测试
+
+    print(f"连接ID基准测试: {count} 个会话, {user_count} 个用户, {MOUNT_COUNT} 个挂载点")
+    print("=" * 60)
+    sessions = build_sessions(count, user_count)
+
+    legacy_counts = Counter(legacy_ids(sessions))
+    collisions = sum(n - 1 for n in legacy_counts.values())
+    print(f"原连接ID: {len(legacy_counts)} 个不同ID, {collisions} 个会话与其他会话重复")
+
+    manager = ConnectionManager()
+    connection_ids = [manager.add_user_connection(session) for session in sessions]
+    unique = len(set(connection_ids))
+    print(f"递增连接ID: {unique} 个不同ID, {count - unique} 个重复")
+
+    indexed_elapsed, indexed_updates = time_indexed(manager, connection_ids)
+    print(f"活动更新 ({indexed_updates} 次): 连接ID字典 {indexed_updates / indexed_elapsed:,.0f} 次/秒 "
+          f"({indexed_elapsed / indexed_updates * 1e6:.2f} us/次)")
+
+    start = time.perf_counter()
+    removed = sum(manager.remove_user_connection(session) for session in sessions)
+    remove_elapsed = time.perf_counter() - start
+    print(f"移除 {removed} 个会话: {remove_elapsed / count * 1e6:.2f} us/个, 剩余 {len(manager.sessions)} 个")
+
+    passed = unique == count and removed == count and not manager.sessions
+    print(f"结论: {'通过' if passed else '未通过'}")
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+CRC-24Q基准测试脚本
+功能：构造一段模拟基准站输出的RTCM3帧流（1005/1033和MSM7混合，帧尾附带正确的CRC），
+      比较原来逐位计算的calc_crc24q、查表实现的calc_crc24q和NumPy批量校验calc_crc24q_batch
+      的吞吐量（MB/s），并确认三者对每一帧的结果一致且校验均通过
+用法：python tests/test_crc24q_benchmark.py [帧数]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyrtcm import rtcmhelpers
+
+# 基准测试配置
+FRAME_COUNT = 3000
+# (消息类型, 消息体长度范围)，MSM7按卫星数不同长度从几百字节到上千字节
+FRAME_MIX = [
+    (1005, (19, 19)),
+    (1033, (40, 80)),
+    (1077, (300, 1000)),
+    (1087, (200, 700)),
+    (1097, (200, 800)),
+    (1127, (300, 900)),
+]
+
+
+def legacy_crc24q(message):
+    """原来的逐位实现：每字节8次Python循环"""
+    poly = 0x1864CFB
+    crc = 0
+    for octet in message:
+        crc ^= octet << 16
+        for _ in range(8):
+            crc <<= 1
+            if crc & 0x1000000:
+                crc ^= poly
+    return crc & 0xFFFFFF
+
+
+def build_frames(count, seed=2024):
+    rng = random.Random(seed)
+    frames = []
+    for _ in range(count):
+        message_type, (low, high) = rng.choice(FRAME_MIX)
+        length = rng.randint(low, high)
+        payload = bytes([message_type >> 4, (message_type & 0x0F) << 4]) + rng.randbytes(length - 2)
+        frame = bytes([0xD3, length >> 8, length & 0xFF]) + payload
+        frames.append(frame + rtcmhelpers.crc2bytes(frame))
+    return frames
+
+
+def timed(func, frames):
+    start = time.perf_counter()
+    results = func(frames)
+    return time.perf_counter() - start, results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else FRAME_COUNT
+    frames = build_frames(count)
+    total = sum(len(frame) for frame in frames)
+
+    print(f"CRC-24Q基准测试: {count} 帧, {total / 1024 / 1024:.2f} MB, "
+          f"NumPy {'可用' if rtcmhelpers._np is not None else '不可用（批量校验退回逐帧查表）'}")
+    print("=" * 60)
+    legacy_elapsed, legacy = timed(lambda items: [legacy_crc24q(frame) for frame in items], frames)
+    table_elapsed, table = timed(lambda items: [rtcmhelpers.calc_crc24q(frame) for frame in items], frames)
+    batch_elapsed, batch = timed(rtcmhelpers.calc_crc24q_batch, frames)
+
+    for name, elapsed in (('逐位计算', legacy_elapsed), ('查表', table_elapsed), ('NumPy批量', batch_elapsed)):
+        print(f"{name:<8} {total / elapsed / 1024 / 1024:8.2f} MB/s, 每帧 {elapsed / count * 1e6:8.2f} us, "
+              f"相对逐位计算 {legacy_elapsed / elapsed:6.1f}x")
+
+    corrupted = bytearray(frames[0])
+    corrupted[len(corrupted) // 2] ^= 0x01
+    detected = rtcmhelpers.calc_crc24q(corrupted) != 0 and rtcmhelpers.calc_crc24q_batch([corrupted, frames[0]])[0] != 0
+    print(f"结果一致: {legacy == table == batch}, 全部校验通过: {not any(batch)}, 篡改检出: {detected}")
+
+    passed = legacy == table == batch and not any(batch) and detected and table_elapsed < legacy_elapsed
+    print(f"结论: {'通过' if passed else '未通过'}")
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
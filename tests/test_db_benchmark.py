@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+数据库索引基准测试脚本
+功能：生成10万用户的临时数据库，对比mounts.user_id索引建立前后
+      删除用户解绑挂载点、按名称查找用户等操作的耗时，并输出查询计划
+用法：python tests/test_db_benchmark.py [用户数] [挂载点数]
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src import config
+from src import database
+
+# 基准测试配置
+USER_COUNT = 100000
+MOUNT_COUNT = 20000
+ROUNDS = 500  # 每项测试的重复次数
+
+
+def build_fixture(db_path, user_count, mount_count, with_migrations):
+    """生成基准测试数据库"""
+    config.DATABASE_PATH = db_path
+    database._schema_caps['loaded'] = False
+    if with_migrations:
+        database.init_db()
+    else:
+        # 仅建表，不执行迁移，模拟旧版数据库
+        original = database.SCHEMA_MIGRATIONS
+        database.SCHEMA_MIGRATIONS = []
+        try:
+            database.init_db()
+        finally:
+            database.SCHEMA_MIGRATIONS = original
+
+    # 所有用户共用一个预先计算的密码哈希，避免PBKDF2主导准备时间
+    hashed = database.hash_password('benchmark')
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.executemany("INSERT INTO users (username, password) VALUES (?, ?)",
+                  ((f'user{i:06d}', hashed) for i in range(user_count)))
+    c.executemany("INSERT INTO mounts (mount, password, user_id) VALUES (?, ?, ?)",
+                  ((f'MNT{i:06d}', 'pw', (i * 7) % user_count + 1) for i in range(mount_count)))
+    conn.commit()
+    conn.close()
+
+
+def explain(db_path, sql, params):
+    """输出查询计划"""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        return '; '.join(row[-1] for row in rows)
+    finally:
+        conn.close()
+
+
+def time_unbind(db_path, user_count, rounds):
+    """测量 UPDATE mounts SET user_id = NULL WHERE user_id = ? 的耗时（事务回滚，不改变数据）"""
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    start = time.perf_counter()
+    for i in range(rounds):
+        c.execute("UPDATE mounts SET user_id = NULL WHERE user_id = ?", ((i * 131) % user_count + 1,))
+        conn.rollback()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed
+
+
+def time_lookup_scan(user_count, rounds):
+    """测量旧实现：遍历get_all_users()按用户名查找ID"""
+    start = time.perf_counter()
+    for i in range(rounds):
+        target = f'user{(i * 131) % user_count:06d}'
+        for user in database.get_all_users():
+            if user[1] == target:
+                break
+    return time.perf_counter() - start
+
+
+def time_lookup_index(user_count, rounds):
+    """测量新实现：get_user_id()走唯一索引"""
+    start = time.perf_counter()
+    for i in range(rounds):
+        database.get_user_id(f'user{(i * 131) % user_count:06d}')
+    return time.perf_counter() - start
+
+
+def main():
+    user_count = int(sys.argv[1]) if len(sys.argv) > 1 else USER_COUNT
+    mount_count = int(sys.argv[2]) if len(sys.argv) > 2 else MOUNT_COUNT
+    unbind_sql = "UPDATE mounts SET user_id = NULL WHERE user_id = ?"
+
+    print(f"数据库基准测试: {user_count} 用户, {mount_count} 挂载点")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        legacy_db = os.path.join(tmpdir, 'legacy.db')
+        migrated_db = os.path.join(tmpdir, 'migrated.db')
+
+        t0 = time.perf_counter()
+        build_fixture(legacy_db, user_count, mount_count, with_migrations=False)
+        build_fixture(migrated_db, user_count, mount_count, with_migrations=True)
+        print(f"数据准备耗时: {time.perf_counter() - t0:.2f}s")
+        print(f"结构版本: {database.get_schema_version()}")
+        print()
+
+        print("解绑挂载点 (delete_user)")
+        print(f"  无索引查询计划: {explain(legacy_db, unbind_sql, (1,))}")
+        print(f"  有索引查询计划: {explain(migrated_db, unbind_sql, (1,))}")
+        legacy = time_unbind(legacy_db, user_count, ROUNDS)
+        migrated = time_unbind(migrated_db, user_count, ROUNDS)
+        print(f"  无索引: {legacy / ROUNDS * 1000:.3f} ms/次")
+        print(f"  有索引: {migrated / ROUNDS * 1000:.3f} ms/次")
+        print(f"  提升: {legacy / max(migrated, 1e-9):.1f}x")
+        print()
+
+        # 旧实现每次都读取全部用户，轮数过多会耗时很久
+        lookup_rounds = max(1, ROUNDS // 50)
+        print("按用户名查找用户ID (DatabaseManager.delete_user)")
+        config.DATABASE_PATH = migrated_db
+        scan = time_lookup_scan(user_count, lookup_rounds)
+        index = time_lookup_index(user_count, lookup_rounds)
+        print(f"  遍历get_all_users: {scan / lookup_rounds * 1000:.3f} ms/次")
+        print(f"  get_user_id索引查找: {index / lookup_rounds * 1000:.3f} ms/次")
+        print(f"  提升: {scan / max(index, 1e-9):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
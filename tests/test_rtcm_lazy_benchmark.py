@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+RTCMMessage按需解码基准测试脚本
+功能：对一段RTCM3混合数据流（默认构造模拟基准站输出：每个历元1005 + GPS/GLONASS/Galileo/北斗MSM7，
+      每10个历元一条1033；也可以指定录制的RTCM3原始数据文件），比较RTCMMessage完整解码和
+      按需解码（lazy=True）在三种用法下的耗时：只构造消息、只读报头字段（DF002/DF003）、
+      按RTCM解析线程的用法读取字段（1005/1006坐标、1033设备信息字符、MSM用parse_msm取全部卫星和信号），
+      并核对两种方式得到的字段值和str()输出完全一致
+用法：python tests/test_rtcm_lazy_benchmark.py [历元数 | 录制文件路径]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyrtcm import RTCMReader, parse_msm, scan_frames
+from rtcm_stream import build_stream
+
+# 基准测试配置
+EPOCH_COUNT = 300
+REPEAT = 3
+DEVICE_FIELDS = (('DF030', 20), ('DF228', 30), ('DF230', 20))  # 与rtcm2读取1033的字段一致
+
+
+def load_frames(stream):
+    """按帧切分，去掉完整解码失败的帧（未实现的消息类型、录制文件中的损坏帧等）"""
+    frames = []
+    for f in scan_frames(stream, validate=True):
+        if not f.complete:
+            break
+        raw = stream[f.offset:f.end]
+        try:
+            RTCMReader.parse(raw)
+        except Exception:
+            continue
+        frames.append(raw)
+    return frames
+
+
+def device_info(msg):
+    """与rtcm2读取1033设备信息的方式一致：逐个字符字段hasattr/getattr"""
+    values = []
+    for base, count in DEVICE_FIELDS:
+        for i in range(1, count + 1):
+            name = f"{base}_{i:02d}"
+            if hasattr(msg, name):
+                values.append(getattr(msg, name))
+    return values
+
+
+def read_header(frames, lazy):
+    return [(msg.DF002, getattr(msg, 'DF003', None))
+            for msg in (RTCMReader.parse(raw, lazy=lazy) for raw in frames)]
+
+
+def read_rtcm2(frames, lazy):
+    results = []
+    for raw in frames:
+        msg = RTCMReader.parse(raw, lazy=lazy)
+        identity = msg.identity
+        if identity in ('1005', '1006'):
+            results.append((msg.DF025, msg.DF026, msg.DF027))
+        elif identity == '1033':
+            results.append(device_info(msg))
+        elif msg.ismsm:
+            results.append(parse_msm(msg))
+    return results
+
+
+def timed(func, *args):
+    best = None
+    result = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else str(EPOCH_COUNT)
+    if source.isdigit():
+        stream = build_stream(int(source), device_every=10)
+        label = f"模拟数据 {source} 个历元"
+    else:
+        with open(source, 'rb') as f:
+            stream = f.read()
+        label = f"录制文件 {source}"
+    frames = load_frames(stream)
+    if not frames:
+        print(f"{label} 中没有可解码的RTCM3帧")
+        return 1
+    size_mb = sum(len(raw) for raw in frames) / 1024 / 1024
+
+    print(f"RTCMMessage按需解码基准测试: {label}, {len(frames)} 帧, {size_mb:.2f} MB")
+    print("=" * 60)
+    cases = (
+        ('只构造消息', lambda lazy: [RTCMReader.parse(raw, lazy=lazy) for raw in frames]),
+        ('只读报头字段', lambda lazy: read_header(frames, lazy)),
+        ('解析线程用法', lambda lazy: read_rtcm2(frames, lazy)),
+    )
+    speedups = {}
+    consistent = True
+    for name, func in cases:
+        eager_elapsed, eager_result = timed(func, False)
+        lazy_elapsed, lazy_result = timed(func, True)
+        speedups[name] = eager_elapsed / lazy_elapsed
+        if name != '只构造消息':
+            consistent = consistent and eager_result == lazy_result
+        print(f"{name:<8} 完整解码 {size_mb / eager_elapsed:7.2f} MB/s, 按需解码 {size_mb / lazy_elapsed:7.2f} MB/s, "
+              f"加速 {speedups[name]:5.1f}x")
+
+    same_str = all(str(RTCMReader.parse(raw)) == str(RTCMReader.parse(raw, lazy=True)) for raw in frames)
+    print(f"字段值一致: {consistent}, str()输出一致: {same_str}")
+
+    passed = (consistent and same_str and speedups['只构造消息'] > 1 and speedups['只读报头字段'] > 1
+              and speedups['解析线程用法'] >= 0.9)
+    print(f"结论: {'通过' if passed else '未通过'}")
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
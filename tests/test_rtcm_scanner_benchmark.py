@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+RTCM3帧头扫描基准测试脚本
+功能：构造一段模拟基准站输出的RTCM3数据流（每个历元1005 + GPS/GLONASS/Galileo/北斗MSM7，
+      穿插少量垃圾字节），比较RTCMReader逐条构造RTCMMessage完整解码与scan_frames只读帧头
+      （消息类型、基准站ID、历元、多消息标志）的吞吐量，并核对两者得到的帧数、消息类型和基准站ID一致；
+      另外统计STR修正解析线程的用法（扫描全部帧、只完整解码1005）的吞吐量，
+      扫描吞吐量低于目标时判为未通过
+用法：python tests/test_rtcm_scanner_benchmark.py [历元数] [--no-target]
+      --no-target 不把吞吐量目标计入结论（在较慢的机器上只核对一致性）
+"""
+
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyrtcm import RTCMReader, scan_frames
+from rtcm_stream import build_stream
+
+# 基准测试配置
+EPOCH_COUNT = 600
+TARGET_MBPS = 100
+
+
+def run_reader(stream):
+    frames = []
+    for raw, msg in RTCMReader(io.BytesIO(stream)):
+        frames.append((msg.identity, msg.DF003))
+    return frames
+
+
+def run_scanner(stream):
+    count = 0
+    for _ in scan_frames(stream):
+        count += 1
+    return count
+
+
+def scanner_frames(stream):
+    return [(str(f.msgtype), f.station) for f in scan_frames(stream)]
+
+
+def run_str_fix(stream):
+    """STR修正解析线程的用法：帧头计数，只完整解码1005"""
+    types = {}
+    position = None
+    for f in scan_frames(stream):
+        types[f.msgtype] = types.get(f.msgtype, 0) + 1
+        if f.msgtype == 1005:
+            position = RTCMReader.parse(stream[f.offset:f.end])
+    return types, position
+
+
+def timed(func, stream, repeat=1):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(stream)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    epochs = int(args[0]) if args else EPOCH_COUNT
+    check_target = '--no-target' not in sys.argv
+    stream = build_stream(epochs, garbage_every=50)
+    size_mb = len(stream) / 1024 / 1024
+
+    print(f"RTCM3帧头扫描基准测试: {epochs} 个历元, {size_mb:.2f} MB")
+    print("=" * 60)
+    reader_elapsed, reader_frames = timed(run_reader, stream)
+    scan_elapsed, _ = timed(run_scanner, stream, repeat=5)
+    scan_frames_list = scanner_frames(stream)
+    str_elapsed, (types, position) = timed(run_str_fix, stream, repeat=5)
+
+    for name, elapsed in (('RTCMReader完整解码', reader_elapsed), ('scan_frames', scan_elapsed),
+                          ('帧头计数+只解码1005', str_elapsed)):
+        print(f"{name:<14} {size_mb / elapsed:8.2f} MB/s, 每帧 {elapsed / len(reader_frames) * 1e6:7.2f} us, "
+              f"相对完整解码 {reader_elapsed / elapsed:6.1f}x")
+
+    consistent = reader_frames == scan_frames_list
+    print(f"帧数: 完整解码 {len(reader_frames)}, 扫描 {len(scan_frames_list)}, 消息类型和基准站ID一致: {consistent}")
+    print(f"消息类型计数: {dict(sorted(types.items()))}, 1005位置: {position.DF025 if position else None}")
+    reached = size_mb / scan_elapsed >= TARGET_MBPS
+    print(f"扫描吞吐量目标 {TARGET_MBPS} MB/s: {'达到' if reached else '未达到'}"
+          f"{'' if check_target else ' (不计入结论)'}")
+
+    passed = (consistent and scan_elapsed < reader_elapsed and position is not None
+              and (reached or not check_target))
+    print(f"结论: {'通过' if passed else '未通过'}")
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
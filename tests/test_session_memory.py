@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+流动站会话内存基准测试脚本
+功能：分别用原来的两份字典记录（转发器client_info + 连接管理器connection_info）和共用的
+      ClientSession对象表示1万个流动站连接，用tracemalloc统计内存占用，
+      并比较每次发送后更新用户活动（按连接ID线性查找）与直接更新会话属性的耗时
+用法：python tests/test_session_memory.py [连接数] [用户数]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.connection import ClientSession
+
+# 基准测试配置
+CONNECTION_COUNT = 10000
+USER_COUNT = 100  # 多个流动站共用一个账号的情况很常见
+MOUNT_COUNT = 50
+SEND_ROUNDS = 20  # 每个连接模拟的发送次数
+
+
+def request_fields(i, user_count):
+    """模拟从请求头解析出的字段：每个连接的用户名和挂载点都是新解码的字符串对象"""
+    user = f"user{i % user_count:04d}".encode('ascii').decode('ascii')
+    mount = f"MOUNT{i % MOUNT_COUNT:03d}".encode('ascii').decode('ascii')
+    addr = (f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}", 40000 + i % 20000)
+    return user, mount, addr
+
+
+def build_dicts(count, user_count):
+    """原来的表示：转发器和连接管理器各保存一份字典"""
+    clients = {}
+    online_users = defaultdict(list)
+    for i in range(count):
+        user, mount, addr = request_fields(i, user_count)
+        now = time.time()
+        connection_id = f"{user}_{mount}_{int(now)}_{i}"
+        online_users[user].append({
+            'connection_id': connection_id,
+            'username': user,
+            'mount_name': mount,
+            'ip_address': addr[0],
+            'user_agent': 'NTRIP RoverClient/1.0',
+            'protocol_version': 'ntrip2_0',
+            'connect_time': now,
+            'connect_datetime': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'last_activity': now,
+            'bytes_sent': 0,
+            'client_socket': None
+        })
+        clients.setdefault(mount, []).append({
+            'socket': None,
+            'user': user,
+            'mount': mount,
+            'agent': 'NTRIP RoverClient/1.0',
+            'addr': addr,
+            'protocol_version': 'ntrip2_0',
+            'connection_id': connection_id,
+            'connected_at': now,
+            'last_seen': now,
+            'last_sent_timestamp': now,
+            'bytes_sent': 0,
+            'messages_sent': 0,
+            'send_errors': 0,
+            'position': None,
+            'timeout_timer': None
+        })
+    return clients, online_users
+
+
+def build_sessions(count, user_count):
+    """现在的表示：转发器和连接管理器引用同一个ClientSession"""
+    clients = {}
+    online_users = defaultdict(list)
+    for i in range(count):
+        user, mount, addr = request_fields(i, user_count)
+        session = ClientSession(None, user, mount, 'NTRIP RoverClient/1.0', addr, 'ntrip2_0')
+        session.connection_id = f"{session.user}_{session.mount}_{int(session.connected_at)}_{i}"
+        online_users[session.user].append(session)
+        clients.setdefault(session.mount, []).append(session)
+    return clients, online_users
+
+
+def measure(builder, count, user_count):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = builder(count, user_count)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def update_user_activity(online_users, username, connection_id, bytes_sent):
+    """原来每次发送后的用户活动更新：在用户的连接列表中按连接ID线性查找"""
+    for conn in online_users[username]:
+        if conn['connection_id'] == connection_id:
+            conn['last_activity'] = time.time()
+            conn['bytes_sent'] += bytes_sent
+            return True
+    return False
+
+
+def time_dict_sends(clients, online_users):
+    start = time.perf_counter()
+    for _ in range(SEND_ROUNDS):
+        for mount_clients in clients.values():
+            for client_info in mount_clients:
+                now = time.time()
+                client_info['last_seen'] = now
+                client_info['last_sent_timestamp'] = now
+                client_info['bytes_sent'] += 200
+                client_info['messages_sent'] += 1
+                update_user_activity(online_users, client_info['user'], client_info['connection_id'], 200)
+    return time.perf_counter() - start
+
+
+def time_session_sends(clients):
+    start = time.perf_counter()
+    for _ in range(SEND_ROUNDS):
+        for mount_clients in clients.values():
+            for session in mount_clients:
+                now = time.time()
+                session.last_seen = now
+                session.last_sent_timestamp = now
+                session.bytes_sent += 200
+                session.messages_sent += 1
+    return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else CONNECTION_COUNT
+    user_count = int(sys.argv[2]) if len(sys.argv) > 2 else USER_COUNT
+
+    print(f"流动站会话内存基准测试: {count} 个连接, {user_count} 个用户, {MOUNT_COUNT} 个挂载点")
+    print("=" * 60)
+    (dict_clients, dict_users), dict_bytes = measure(build_dicts, count, user_count)
+    (session_clients, session_users), session_bytes = measure(build_sessions, count, user_count)
+    print(f"两份字典:     {dict_bytes / 1024 / 1024:7.2f} MB, 每连接 {dict_bytes / count:6.0f} 字节")
+    print(f"ClientSession: {session_bytes / 1024 / 1024:7.2f} MB, 每连接 {session_bytes / count:6.0f} 字节")
+    print(f"内存减少: {(1 - session_bytes / dict_bytes) * 100:.1f}%")
+
+    sends = count * SEND_ROUNDS
+    dict_elapsed = time_dict_sends(dict_clients, dict_users)
+    session_elapsed = time_session_sends(session_clients)
+    print(f"发送后更新统计 ({sends} 次): 字典+线性查找 {dict_elapsed / sends * 1e6:.2f} us/次, "
+          f"会话属性 {session_elapsed / sends * 1e6:.2f} us/次")
+
+    passed = session_bytes < dict_bytes and session_elapsed < dict_elapsed
+    print(f"结论: {'通过' if passed else '未通过'}")
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
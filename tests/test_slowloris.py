@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+握手期限（slowloris防护）测试脚本
+功能：向NTRIP Caster建立数千个只连接不发送的空闲连接和一批逐字节慢速发送请求头的连接，
+      同时以正常客户端反复请求源表，测量其响应延迟是否在预算之内，
+      并在握手期限过后检查空闲连接是否已被服务端关闭
+用法：python tests/test_slowloris.py [空闲连接数] [主机:端口]
+      不指定主机时在本进程内启动一个使用小线程池的Caster进行测试
+"""
+
+import os
+import sys
+import time
+import socket
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# 测试配置
+IDLE_CONNECTIONS = 3000  # 只连接不发送的连接数
+TRICKLE_CONNECTIONS = 200  # 逐字节慢速发送请求头的连接数
+TRICKLE_INTERVAL = 0.5  # 慢速连接每次发送1字节的间隔（秒）
+LEGIT_REQUESTS = 200  # 正常客户端的源表请求次数
+LATENCY_BUDGET = 0.5  # 正常客户端P99延迟预算（秒）
+LOCAL_WORKERS = 32  # 本地Caster的工作线程数，远小于空闲连接数
+LOCAL_HANDSHAKE_TIMEOUT = 3  # 本地Caster的握手期限（秒）
+
+SOURCETABLE_REQUEST = (
+    b"GET / HTTP/1.1\r\n"
+    b"Host: localhost\r\n"
+    b"Ntrip-Version: Ntrip/2.0\r\n"
+    b"User-Agent: NTRIP SlowlorisTest/1.0\r\n"
+    b"\r\n"
+)
+
+
+def start_local_caster():
+    """在本进程内启动Caster，返回(端口, 握手期限)"""
+    from src import config
+    from src import ntrip
+
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+
+    config.HANDSHAKE_TIMEOUT = LOCAL_HANDSHAKE_TIMEOUT
+    ntrip.NTRIP_PORT = port
+    ntrip.MAX_WORKERS = LOCAL_WORKERS
+
+    caster = ntrip.NTRIPCaster(None)
+    threading.Thread(target=caster.start, daemon=True).start()
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    print(f"本地Caster已启动: 端口 {port}, 工作线程 {LOCAL_WORKERS}, 握手期限 {LOCAL_HANDSHAKE_TIMEOUT} 秒")
+    return port, LOCAL_HANDSHAKE_TIMEOUT
+
+
+def open_idle(host, port, count):
+    """建立只连接不发送的空闲连接"""
+    sockets = []
+    failed = 0
+    for _ in range(count):
+        try:
+            sockets.append(socket.create_connection((host, port), timeout=5))
+        except OSError:
+            failed += 1
+    return sockets, failed
+
+
+def trickle(sockets, stop_event):
+    """慢速连接每隔TRICKLE_INTERVAL秒发送请求头的下一个字节，永远不发送结束空行"""
+    payload = SOURCETABLE_REQUEST[:-2]
+    offset = 0
+    while not stop_event.wait(TRICKLE_INTERVAL):
+        byte = payload[offset % len(payload):offset % len(payload) + 1]
+        offset += 1
+        for sock in sockets:
+            try:
+                sock.send(byte)
+            except OSError:
+                pass
+
+
+def request_sourcetable(host, port):
+    """正常客户端请求一次源表，返回(耗时, 是否成功)"""
+    start = time.perf_counter()
+    try:
+        with socket.create_connection((host, port), timeout=10) as sock:
+            sock.sendall(SOURCETABLE_REQUEST)
+            response = b''
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                response += chunk
+        ok = response.startswith(b'HTTP/1.1 200') or response.startswith(b'SOURCETABLE 200')
+    except OSError:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def count_closed(sockets):
+    """统计已被服务端关闭的连接"""
+    closed = 0
+    for sock in sockets:
+        try:
+            sock.setblocking(False)
+            if sock.recv(1) == b'':
+                closed += 1
+        except BlockingIOError:
+            pass
+        except OSError:
+            closed += 1
+    return closed
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def main():
+    idle_count = int(sys.argv[1]) if len(sys.argv) > 1 else IDLE_CONNECTIONS
+    if len(sys.argv) > 2:
+        host, _, port = sys.argv[2].rpartition(':')
+        port = int(port)
+        from src import config
+        handshake_timeout = config.HANDSHAKE_TIMEOUT
+        print(f"测试远程Caster {host}:{port}，按本地配置的握手期限 {handshake_timeout} 秒检查")
+    else:
+        host = '127.0.0.1'
+        port, handshake_timeout = start_local_caster()
+
+    start = time.time()
+    idle, idle_failed = open_idle(host, port, idle_count)
+    slow, slow_failed = open_idle(host, port, TRICKLE_CONNECTIONS)
+    print(f"已建立空闲连接 {len(idle)} 个（失败 {idle_failed}），慢速连接 {len(slow)} 个（失败 {slow_failed}），"
+          f"耗时 {time.time() - start:.2f} 秒")
+
+    stop_event = threading.Event()
+    threading.Thread(target=trickle, args=(slow, stop_event), daemon=True).start()
+
+    latencies = []
+    failures = 0
+    for _ in range(LEGIT_REQUESTS):
+        elapsed, ok = request_sourcetable(host, port)
+        latencies.append(elapsed)
+        if not ok:
+            failures += 1
+
+    avg = sum(latencies) / len(latencies)
+    p99 = percentile(latencies, 0.99)
+    print(f"正常客户端源表请求 {LEGIT_REQUESTS} 次: 失败 {failures}, "
+          f"平均 {avg * 1000:.1f} ms, P50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+          f"P99 {p99 * 1000:.1f} ms, 最大 {max(latencies) * 1000:.1f} ms（预算 {LATENCY_BUDGET * 1000:.0f} ms）")
+
+    # 等待握手期限过去，空闲连接和慢速连接都应已被服务端关闭
+    wait = max(0.0, start + handshake_timeout + 2 - time.time())
+    time.sleep(wait)
+    stop_event.set()
+    idle_closed = count_closed(idle)
+    slow_closed = count_closed(slow)
+    print(f"握手期限后: 空闲连接已关闭 {idle_closed}/{len(idle)}，慢速连接已关闭 {slow_closed}/{len(slow)}")
+
+    for sock in idle + slow:
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+    passed = (failures == 0 and p99 <= LATENCY_BUDGET
+              and idle_closed == len(idle) and slow_closed == len(slow))
+    print(f"结论: {'通过' if passed else '未通过'}")
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+基站空间索引基准测试脚本
+功能：向空间索引写入1万个基站，测量最近基站查询、位置更新和下线移除的耗时，
+      并与线性扫描结果逐一比对，验证查询结果正确
+用法：python tests/test_spatial_benchmark.py [基站数] [查询次数]
+"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.spatial import SpatialIndex, haversine_km
+
+# 基准测试配置
+MOUNT_COUNT = 10000
+QUERY_COUNT = 20000
+VERIFY_COUNT = 500  # 与线性扫描比对的查询次数
+
+
+def random_position(rng, clustered):
+    """生成基站位置：clustered为True时集中在中国东部区域，模拟真实的基站分布"""
+    if clustered:
+        return rng.uniform(20.0, 42.0), rng.uniform(100.0, 122.0)
+    return rng.uniform(-70.0, 70.0), rng.uniform(-180.0, 180.0)
+
+
+def linear_nearest(positions, lat, lon):
+    """线性扫描求最近基站"""
+    return min(positions.items(), key=lambda item: haversine_km(lat, lon, item[1][0], item[1][1]))[0]
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def run_case(name, mount_count, query_count, clustered):
+    rng = random.Random(2101)
+    index = SpatialIndex()
+    positions = {f"BASE{i:05d}": random_position(rng, clustered) for i in range(mount_count)}
+
+    start = time.perf_counter()
+    for mount, (lat, lon) in positions.items():
+        index.update(mount, lat, lon)
+    build = time.perf_counter() - start
+
+    queries = [random_position(rng, clustered) for _ in range(query_count)]
+    latencies = []
+    for lat, lon in queries:
+        t0 = time.perf_counter()
+        index.nearest(lat, lon)
+        latencies.append(time.perf_counter() - t0)
+
+    mismatches = 0
+    scan_time = 0.0
+    for lat, lon in queries[:VERIFY_COUNT]:
+        t0 = time.perf_counter()
+        expected = linear_nearest(positions, lat, lon)
+        scan_time += time.perf_counter() - t0
+        if index.nearest(lat, lon)[0][1] != expected:
+            mismatches += 1
+
+    # 基站上下线：移动10%的基站位置，再移除10%的基站
+    movers = rng.sample(list(positions), mount_count // 10)
+    t0 = time.perf_counter()
+    for mount in movers:
+        index.update(mount, *random_position(rng, clustered))
+    update = (time.perf_counter() - t0) / len(movers)
+    t0 = time.perf_counter()
+    for mount in movers:
+        index.remove(mount)
+    remove = (time.perf_counter() - t0) / len(movers)
+
+    print(f"[{name}] {mount_count} 个基站")
+    print(f"  建立索引: {build * 1000:.1f} ms")
+    print(f"  最近基站查询: 平均 {sum(latencies) / len(latencies) * 1e6:.1f} us, "
+          f"P50 {percentile(latencies, 0.5) * 1e6:.1f} us, P99 {percentile(latencies, 0.99) * 1e6:.1f} us, "
+          f"最大 {max(latencies) * 1e6:.1f} us")
+    print(f"  线性扫描: 平均 {scan_time / VERIFY_COUNT * 1e6:.1f} us")
+    print(f"  位置更新: {update * 1e6:.1f} us/次, 下线移除: {remove * 1e6:.1f} us/次")
+    print(f"  结果比对: {VERIFY_COUNT - mismatches}/{VERIFY_COUNT} 与线性扫描一致")
+    print()
+    return mismatches == 0 and percentile(latencies, 0.99) < 0.001
+
+
+def main():
+    mount_count = int(sys.argv[1]) if len(sys.argv) > 1 else MOUNT_COUNT
+    query_count = int(sys.argv[2]) if len(sys.argv) > 2 else QUERY_COUNT
+
+    print("基站空间索引基准测试")
+    print("=" * 60)
+    ok = run_case("全球均匀分布", mount_count, query_count, clustered=False)
+    ok = run_case("区域集中分布", mount_count, query_count, clustered=True) and ok
+    print("结论: " + ("通过（结果一致且P99低于1ms）" if ok else "未通过"))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()